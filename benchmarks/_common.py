@@ -0,0 +1,47 @@
+"""各 benchmark 共用的模擬記錄與計時輸出"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = ['食', '衣', '住', '行', '育', '樂']
+ATTRIBUTES = ['必要花費', '娛樂', '投資']
+PERSONS = ['廷', '雰', '共同']
+
+
+def make_record(i: int) -> dict:
+    """產生與本地賬本格式相同的模擬記錄"""
+    event = i % 40
+    month = i % 24
+    return {
+        'page_id': f'page-{i}',
+        '品項': f'item {i}',
+        '支出NTD': float(i % 500),
+        '類別': CATEGORIES[i % len(CATEGORIES)] if i % 97 else '其他',
+        '屬性': ATTRIBUTES[i % len(ATTRIBUTES)],
+        '廷 | 雰': PERSONS[i % len(PERSONS)],
+        '日期': f'2025_{i % 12 + 1:02d}{i % 28 + 1:02d}',
+        '💥 重大事件支出列表': {'id': f'event-{event}', 'title': f'事件 {event}'} if i % 5 else None,
+        '💵 單月支出列表': {'id': f'month-{month}', 'title': f'{2024 + month // 12}, {month % 12 + 1:02d}月'},
+    }
+
+
+def count_arg(default: int) -> int:
+    """命令列第一個參數為數量，沒有時使用 default"""
+    return int(sys.argv[1]) if len(sys.argv) > 1 else default
+
+
+def timed(func, *args) -> tuple:
+    """執行 func(*args)，返回 (結果, 秒數)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def report(name: str, elapsed: float, count: int, unit: str = '條記錄'):
+    print(f"{name:<12} {elapsed:.3f} 秒，每秒 {count / elapsed:,.1f} {unit}")
+
+
+def report_speedup(before: float, after: float, label: str = '加速'):
+    print(f"{label}: {before / after:.2f}x")
@@ -0,0 +1,56 @@
+"""比較字典逐條累加與 numpy bincount 兩種圖表彙總方式
+
+執行方式：
+    python benchmarks/bench_aggregation.py [記錄數]
+"""
+import json
+import os
+import tempfile
+
+from _common import ATTRIBUTES, CATEGORIES, PERSONS, count_arg, make_record, report, report_speedup, timed
+from draw_graph import ChartManager, Config
+
+
+def normalize(group_data: dict) -> dict:
+    """去掉零值並四捨五入，方便比較兩種方式的結果"""
+    return {
+        kind: {
+            title: {person: {dimension: {k: round(v, 6) for k, v in values.items() if round(v, 6)}
+                             for dimension, values in group[person].items()}
+                    for person in ('total', 'ting', 'feng')}
+            for title, group in groups.items()
+        }
+        for kind, groups in group_data.items()
+    }
+
+
+def main():
+    count = count_arg(100_000)
+    records = [make_record(i) for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        manager = ChartManager(Config(RENDER_MODE='memory', SAVE_DISK_COPY=False))
+        with open(manager.paths.SELECT_COLOR_PATH, 'w', encoding='utf-8') as f:
+            json.dump({
+                '類別': {'options': [{'name': name} for name in CATEGORIES]},
+                '屬性': {'options': [{'name': name} for name in ATTRIBUTES]},
+                '廷 | 雰': {'options': [{'name': name} for name in PERSONS]},
+            }, f, ensure_ascii=False)
+        valid_attributes, valid_categories = manager._load_valid_options()
+
+        print(f"記錄數: {count}")
+        by_dict, dict_time = timed(manager.aggregate_records, records, valid_attributes, valid_categories)
+        report('dict', dict_time, count)
+        columns, encode_time = timed(manager.encode_records, records)
+        report('numpy 編碼', encode_time, count)
+        by_numpy, numpy_time = timed(manager.aggregate_columns, columns, valid_attributes, valid_categories)
+        report('numpy 彙總', numpy_time, count)
+
+    assert normalize(by_dict) == normalize(by_numpy), "兩種彙總方式的結果不一致"
+    report_speedup(dict_time, numpy_time, '加速（只計彙總）')
+    report_speedup(dict_time, encode_time + numpy_time, '加速（含編碼）')
+
+
+if __name__ == '__main__':
+    main()
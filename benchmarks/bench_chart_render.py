@@ -0,0 +1,75 @@
+"""比較每張圖表重新建立 figure 與重用模板 figure 的渲染速度（每秒圖表數）
+
+執行方式：
+    python benchmarks/bench_chart_render.py [圖表數]
+"""
+import os
+import sys
+import tempfile
+import time
+import warnings
+from io import BytesIO
+
+from _common import ATTRIBUTES, CATEGORIES, count_arg, report, report_speedup
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.image as mpimg
+import numpy as np
+
+from draw_graph import ChartGenerator, Config, Paths
+
+
+def make_expenses(i: int) -> tuple:
+    """產生各圖表不同的屬性與類別支出，包含會被合併的小額項目"""
+    attributes = {name: float((i * 37 + k * 101) % 900 + 50) for k, name in enumerate(ATTRIBUTES)}
+    categories = {name: float((i * 53 + k * 71) % 700 + 10) for k, name in enumerate(CATEGORIES)}
+    categories['其他'] = 1.0
+    return attributes, categories
+
+
+def render(reuse: bool, count: int) -> tuple:
+    generator = ChartGenerator(Config(RENDER_MODE='memory', SAVE_DISK_COPY=False, REUSE_FIGURE=reuse), Paths())
+    start = time.perf_counter()
+    for i in range(count):
+        attributes, categories = make_expenses(i)
+        generator.create_combined_pie_charts(attributes, categories, {}, {}, f"圖表 {i}", 'data')
+    return generator.rendered, time.perf_counter() - start
+
+
+def pixels(data: bytes) -> np.ndarray:
+    return mpimg.imread(BytesIO(data), format='png')
+
+
+def main():
+    count = count_arg(50)
+    # 沒有安裝中文字體時每個字都會警告，避免警告輸出影響計時
+    warnings.filterwarnings('ignore', message='Glyph .* missing from font')
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        # 進度輸出會影響計時，暫時關閉
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            # 先各渲染幾張，讓字體快取與文字排版快取就緒
+            render(False, 3)
+            render(True, 3)
+            fresh, fresh_time = render(False, count)
+            reused, reused_time = render(True, count)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    # 重用模板的輸出必須與每次重新建立 figure 的輸出相同
+    for name, chart in fresh.items():
+        expected, actual = pixels(chart['data']), pixels(reused[name]['data'])
+        assert expected.shape == actual.shape, f"{name} 的尺寸不同: {expected.shape} != {actual.shape}"
+        assert np.array_equal(expected, actual), f"{name} 的像素不同"
+
+    print(f"圖表數: {count}")
+    report('新建 figure', fresh_time, count, '張')
+    report('重用模板', reused_time, count, '張')
+    report_speedup(fresh_time, reused_time)
+
+
+if __name__ == '__main__':
+    main()
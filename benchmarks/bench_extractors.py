@@ -0,0 +1,162 @@
+"""比較改寫前逐條屬性提取與預編譯提取的每條記錄成本
+
+執行方式：
+    python benchmarks/bench_extractors.py [記錄數]
+"""
+from _common import count_arg, report, report_speedup, timed
+from notion.config import NotionConfig
+from notion.extractors import PropertyValueExtractor
+
+SPECIFIC_PROPS = ['品項', '支出NTD', '類別', '日期', '廷 | 雰', '屬性',
+                  '💥 重大事件支出列表', '💵 單月支出列表', '折扣/抵']
+
+PROPERTY_TYPES = {
+    '品項': 'title',
+    '支出NTD': 'number',
+    '類別': 'select',
+    '日期': 'date',
+    '廷 | 雰': 'select',
+    '屬性': 'select',
+    '💥 重大事件支出列表': 'relation',
+    '💵 單月支出列表': 'relation',
+    '折扣/抵': 'checkbox',
+    '備註': 'rich_text',
+    '標籤': 'multi_select',
+    '連結': 'url',
+}
+
+
+def make_page(i: int) -> dict:
+    """產生與賬戶數據庫結構相同的模擬頁面"""
+    return {
+        'id': f'page-{i}',
+        'properties': {
+            '品項': {'type': 'title', 'title': [{'text': {'content': f'item {i}'}}]},
+            '支出NTD': {'type': 'number', 'number': float(i % 500)},
+            '類別': {'type': 'select', 'select': {'name': ['食', '衣', '住', '行'][i % 4]}},
+            '日期': {'type': 'date', 'date': {'start': f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}', 'end': None}},
+            '廷 | 雰': {'type': 'select', 'select': {'name': ['廷', '雰', '共同'][i % 3]}},
+            '屬性': {'type': 'select', 'select': {'name': '必要花費'}},
+            '💥 重大事件支出列表': {'type': 'relation', 'relation': [{'id': f'event-{i % 30}'}]},
+            '💵 單月支出列表': {'type': 'relation', 'relation': [{'id': f'month-{i % 12}'}]},
+            '折扣/抵': {'type': 'checkbox', 'checkbox': False},
+            '備註': {'type': 'rich_text', 'rich_text': []},
+            '標籤': {'type': 'multi_select', 'multi_select': [{'name': 'a'}]},
+            '連結': {'type': 'url', 'url': None},
+        }
+    }
+
+
+# 以下為改寫前（23e7ea7）的 PropertyValueExtractor 與 get_formatted_page_properties，原樣保留作為比較基準
+def baseline_rollup_value(rollup_data: dict) -> any:
+    rollup_type = rollup_data.get('type')
+    if not rollup_type:
+        return None
+
+    value = rollup_data.get(rollup_type)
+    if not value:
+        return None
+
+    if rollup_type in ['number', 'date']:
+        return value
+    elif rollup_type == 'array':
+        return [baseline_extract_value(item) for item in value]
+    elif rollup_type == 'unsupported':
+        return None
+
+    return value
+
+
+def baseline_date_range(date_value):
+    if not date_value:
+        return None
+
+    start = date_value.get('start')
+    end = date_value.get('end')
+
+    if not start:
+        return None
+
+    start_parts = start.split('-')
+    start_year = start_parts[0]
+    start_month = start_parts[1].zfill(2)
+    start_day = start_parts[2].zfill(2)
+
+    if not end:
+        return f"{start_year}_{start_month}{start_day}"
+
+    end_parts = end.split('-')
+    end_year = end_parts[0]
+    end_month = end_parts[1].zfill(2)
+    end_day = end_parts[2].zfill(2)
+
+    if start_year == end_year:
+        if start_month == end_month and int(end_day) < 10:
+            return f"{start_year}_{start_month}{start_day}-{end_day}"
+        return f"{start_year}_{start_month}{start_day}-{end_month}{end_day}"
+    else:
+        return f"{start_year}_{start_month}{start_day}-{end_year}_{end_month}{end_day}"
+
+
+def baseline_extract_value(property_data: dict) -> any:
+    prop_type = property_data.get('type')
+    if not prop_type:
+        return None
+
+    extractors = {
+        NotionConfig.PropertyType.TITLE: lambda x: x['title'][0]['text']['content'] if x['title'] else '',
+        NotionConfig.PropertyType.RICH_TEXT: lambda x: x['rich_text'][0]['text']['content'] if x['rich_text'] else '',
+        NotionConfig.PropertyType.NUMBER: lambda x: x['number'],
+        NotionConfig.PropertyType.SELECT: lambda x: x['select']['name'] if x['select'] else '',
+        NotionConfig.PropertyType.MULTI_SELECT: lambda x: [option['name'] for option in x['multi_select']],
+        NotionConfig.PropertyType.DATE: lambda x: baseline_date_range(x['date']),
+        NotionConfig.PropertyType.CHECKBOX: lambda x: x['checkbox'],
+        NotionConfig.PropertyType.URL: lambda x: x['url'],
+        NotionConfig.PropertyType.EMAIL: lambda x: x['email'],
+        NotionConfig.PropertyType.PHONE: lambda x: x['phone_number'],
+        NotionConfig.PropertyType.RELATION: lambda x: [rel['id'] for rel in x['relation']],
+        NotionConfig.PropertyType.ROLLUP: lambda x: baseline_rollup_value(x['rollup'])
+    }
+
+    extractor = extractors.get(prop_type)
+    return extractor(property_data) if extractor else property_data[prop_type]
+
+
+def baseline(page: dict) -> dict:
+    """改寫前 get_formatted_page_properties 傳入 raw_page_data 時的路徑"""
+    raw_properties = page.get("properties", {})
+    raw_properties = {prop: raw_properties.get(prop) for prop in SPECIFIC_PROPS if prop in raw_properties}
+
+    formatted_properties = {}
+    for prop_name, prop_data in raw_properties.items():
+        value = baseline_extract_value(prop_data)
+        if isinstance(value, list) and prop_data.get('type') == 'relation':
+            value = value[0] if value else None
+        formatted_properties[prop_name] = value
+    return formatted_properties
+
+
+def run(func, pages: list):
+    for page in pages:
+        func(page)
+
+
+def main():
+    count = count_arg(100_000)
+    pages = [make_page(i) for i in range(count)]
+    compiled = PropertyValueExtractor.compile(PROPERTY_TYPES, SPECIFIC_PROPS)
+
+    # 先確認兩條路徑的結果一致
+    for page in pages[:1000]:
+        assert baseline(page) == compiled(page)
+
+    print(f"記錄數: {count}")
+    _, baseline_time = timed(run, baseline, pages)
+    report('改寫前', baseline_time, count)
+    _, compiled_time = timed(run, compiled, pages)
+    report('預編譯', compiled_time, count)
+    report_speedup(baseline_time, compiled_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""比較改寫前逐條建立容器的個人支出分配與目前直接累加的方式
+
+共同支出的分配結果由 tests/test_chart_data_processor.py 檢查。
+
+執行方式：
+    python benchmarks/bench_person_split.py [記錄數]
+"""
+from collections import defaultdict
+
+from _common import ATTRIBUTES, CATEGORIES, count_arg, make_record, report, report_speedup, timed
+from draw_graph import ChartDataProcessor
+
+
+def empty_group() -> dict:
+    return {person: {'attribute': defaultdict(float), 'category': defaultdict(float)}
+            for person in ('total', 'ting', 'feng')}
+
+
+def nonzero(group: dict) -> dict:
+    """去掉零值，改寫前的路徑會為金額為零的記錄留下值為 0 的鍵"""
+    return {person: {dimension: {k: v for k, v in values.items() if v}
+                     for dimension, values in group[person].items()}
+            for person in group}
+
+
+def baseline_expenses_by_person(processor: ChartDataProcessor, record: dict) -> tuple:
+    """改寫前（23e7ea7）的 ChartDataProcessor.process_expenses_by_person，原樣保留作為比較基準
+
+    共同支出返回以 default factory 表示一半金額的空字典，合併時不會被計入。
+    """
+    ting_expenses = {'attribute': defaultdict(float), 'category': defaultdict(float)}
+    feng_expenses = {'attribute': defaultdict(float), 'category': defaultdict(float)}
+
+    expense = processor.get_expense_amount(record)
+    if not expense:
+        return ting_expenses, feng_expenses
+
+    share_info = record.get('廷 | 雰')
+    if isinstance(share_info, dict):
+        share_info = share_info.get('title', '')
+
+    if share_info == '廷':
+        target_dict = ting_expenses
+    elif share_info == '雰':
+        target_dict = feng_expenses
+    else:
+        half_expense = expense / 2
+        ting_expenses['attribute'] = defaultdict(lambda: half_expense)
+        ting_expenses['category'] = defaultdict(lambda: half_expense)
+        feng_expenses['attribute'] = defaultdict(lambda: half_expense)
+        feng_expenses['category'] = defaultdict(lambda: half_expense)
+        return ting_expenses, feng_expenses
+
+    attribute = record.get('屬性')
+    if attribute and attribute in processor.valid_attributes:
+        target_dict['attribute'][attribute] = expense
+
+    category = record.get('類別')
+    if category and category in processor.valid_categories:
+        target_dict['category'][category] = expense
+
+    return ting_expenses, feng_expenses
+
+
+def with_containers(processor: ChartDataProcessor, records: list) -> dict:
+    """改寫前 ChartManager._process_record_expenses 的路徑：每條記錄先建立兩人的字典，再合併到分組"""
+    group = empty_group()
+    for record in records:
+        expense = processor.get_expense_amount(record)
+        for dimension, value, valid in (('attribute', record.get('屬性'), processor.valid_attributes),
+                                        ('category', record.get('類別'), processor.valid_categories)):
+            if value and value in valid:
+                group['total'][dimension][value] += expense
+        ting_exp, feng_exp = baseline_expenses_by_person(processor, record)
+        for person, expenses in (('ting', ting_exp), ('feng', feng_exp)):
+            for dimension in ('attribute', 'category'):
+                for value, amount in expenses[dimension].items():
+                    group[person][dimension][value] += amount
+    return group
+
+
+def accumulated(processor: ChartDataProcessor, records: list) -> dict:
+    """目前的路徑：直接累加到預先建立的分組累加器"""
+    group = empty_group()
+    for record in records:
+        processor.accumulate(record, group)
+    return group
+
+
+def main():
+    count = count_arg(100_000)
+    records = [make_record(i) for i in range(count)]
+    processor = ChartDataProcessor(records, set(ATTRIBUTES), set(CATEGORIES))
+
+    # 兩條路徑只在單人支出上結果相同（改寫前共同支出沒有分給兩人）
+    single_payer = [record for record in records if record['廷 | 雰'] in ('廷', '雰')]
+    assert nonzero(with_containers(processor, single_payer)) == nonzero(accumulated(processor, single_payer)), \
+        "單人支出的分配結果不一致"
+
+    print(f"記錄數: {count}")
+    _, old_time = timed(with_containers, processor, records)
+    report('逐條容器', old_time, count)
+    _, new_time = timed(accumulated, processor, records)
+    report('直接累加', new_time, count)
+    report_speedup(old_time, new_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,20 @@
 import os
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
 from collections import defaultdict
 import json
-from typing import Dict, List, Tuple, Set, Any
+from typing import Dict, List, Optional, Tuple, Set, Any
 from dataclasses import dataclass
+from ledger_store import (SqliteLedgerStore, SegmentLedgerStore, JsonLedgerStore, ChartDataProcessor, ChartRollups,
+                          valid_chart_options, SHARED_SPLIT_WEIGHTS)
+from notion.extractors import ColumnarBatchExtractor, LedgerSnapshot
 
 # 禁止顯示 macOS 輸入法警告
 os.environ['TK_SILENCE_DEPRECATION'] = '1'
@@ -12,9 +22,12 @@ os.environ['TK_SILENCE_DEPRECATION'] = '1'
 os.environ['PYTHON_ENABLE_TKINTER'] = '0'
 os.environ['PYTHONUTF8'] = '1'
 
-# 設置中文字體
-plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'SimSun', 'Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False
+def configure_fonts():
+    """設置中文字體"""
+    plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'SimSun', 'Arial Unicode MS']
+    plt.rcParams['axes.unicode_minus'] = False
+
+configure_fonts()
 
 # 配置常量
 @dataclass
@@ -24,6 +37,27 @@ class Config:
     DPI: int = 300
     FIGSIZE: Tuple[int, int] = (15, 10)
     SMALL_PORTION_THRESHOLD: float = 0.03
+    # 'disk'：圖表保存為 PNG 文件；'memory'：渲染到記憶體，供直接上傳
+    RENDER_MODE: str = 'disk'
+    # memory 模式下是否同時保存一份到磁碟
+    SAVE_DISK_COPY: bool = True
+    # 存在彙總表時直接讀取各分組的總和繪圖，不掃描記錄
+    USE_ROLLUPS: bool = True
+    # 逐條記錄的彙總方式：'dict' 逐條累加到字典；'numpy' 先編碼為整數列再以 bincount 計算。
+    # 編碼的成本與字典累加相當，只有在已經是列式資料（快照）時 numpy 才划算，因此預設 'dict'
+    AGGREGATION_BACKEND: str = 'dict'
+    # 共同支出分配給 (廷, 雰) 的權重
+    SHARED_SPLIT: Tuple[float, float] = SHARED_SPLIT_WEIGHTS
+    # 並行渲染的進程數，0 或 1 表示在目前進程中依序渲染
+    RENDER_WORKERS: int = 0
+    # 圖表數少於此值時依序渲染，啟動進程與載入 matplotlib 的成本高於並行的收益
+    RENDER_POOL_MIN_JOBS: int = 8
+    # 'full' 數據源使用的本地賬本：'sqlite'、'segments' 或 'json'（與 money.LEDGER_BACKEND 相同），
+    # None 時依序尋找已存在的 ledger.db 與 ledger_segments
+    LEDGER_BACKEND: Optional[str] = None
+    # 重用同一個模板圖表，每張圖只清除並重繪子圖內容
+    # 實測與每張新建 figure 幾乎沒有差別（見 benchmarks/bench_chart_render.py），預設關閉
+    REUSE_FIGURE: bool = False
 
 # 目錄常量
 @dataclass
@@ -35,6 +69,10 @@ class Paths:
     SELECT_COLOR_PATH: str = os.path.join(BASE_DATA_DIR, 'select_color.json')
     AFFECTED_CHARTS_DATA_PATH: str = os.path.join(BASE_DATA_DIR, 'affected_charts_data.json')
     FULL_ACCOUNT_DATA_PATH: str = os.path.join(BASE_DATA_DIR, 'full_account_data.json')
+    LEDGER_DB_PATH: str = os.path.join(BASE_DATA_DIR, 'ledger.db')
+    LEDGER_SEGMENT_DIR: str = os.path.join(BASE_DATA_DIR, 'ledger_segments')
+    LEDGER_SNAPSHOT_DIR: str = os.path.join(BASE_DATA_DIR, 'ledger_snapshot')
+    CHART_ROLLUP_PATH: str = os.path.join(BASE_DATA_DIR, 'chart_rollups.json')
 
 # Notion 顏色映射
 NOTION_TO_MPL_COLORS = {
@@ -50,69 +88,30 @@ NOTION_TO_MPL_COLORS = {
     'red': '#D44C47'
 }
 
-class ChartDataProcessor:
-    """處理圖表數據的類"""
-    
-    def __init__(self, data: List[Dict], valid_attributes: Set[str], valid_categories: Set[str]):
-        self.data = data
-        self.valid_attributes = valid_attributes
-        self.valid_categories = valid_categories
-        
-    def get_expense_amount(self, record: Dict) -> float:
-        """從記錄中獲取支出金額"""
-        expense = record.get('支出NTD')
-        if isinstance(expense, dict):
-            return expense.get('number', 0)
-        return float(expense) if isinstance(expense, (int, float)) else 0
-    
-    def process_expenses_by_person(self, record: Dict) -> Tuple[Dict, Dict]:
-        """處理單條記錄的支出數據，根據記錄的 '廷 | 雰' 欄位進行分類"""
-        ting_expenses = {'attribute': defaultdict(float), 'category': defaultdict(float)}
-        feng_expenses = {'attribute': defaultdict(float), 'category': defaultdict(float)}
-        
-        expense = self.get_expense_amount(record)
-        if not expense:
-            return ting_expenses, feng_expenses
-        
-        share_info = record.get('廷 | 雰')
-        if isinstance(share_info, dict):
-            share_info = share_info.get('title', '')
-        
-        if share_info == '廷':
-            target_dict = ting_expenses
-        elif share_info == '雰':
-            target_dict = feng_expenses
-        else:
-            half_expense = expense / 2
-            ting_expenses['attribute'] = defaultdict(lambda: half_expense)
-            ting_expenses['category'] = defaultdict(lambda: half_expense)
-            feng_expenses['attribute'] = defaultdict(lambda: half_expense)
-            feng_expenses['category'] = defaultdict(lambda: half_expense)
-            return ting_expenses, feng_expenses
-        
-        attribute = record.get('屬性')
-        if attribute and attribute in self.valid_attributes:
-            target_dict['attribute'][attribute] = expense
-        
-        category = record.get('類別')
-        if category and category in self.valid_categories:
-            target_dict['category'][category] = expense
-        
-        return ting_expenses, feng_expenses
-
 class ChartGenerator:
     """生成圖表的類"""
     
     def __init__(self, config: Config, paths: Paths):
         self.config = config
         self.paths = paths
+        # memory 模式下渲染的圖表：{文件名: {'data': PNG bytes, 'path': 磁碟副本路徑或 None}}
+        self.rendered = {}
+        # disk 模式下保存的圖表路徑
+        self.saved_paths = []
+        # REUSE_FIGURE 時的模板 (figure, (屬性子圖, 類別子圖), 總標題)，第一次繪圖時建立
+        self._template = None
         self._ensure_directories()
     
+    @property
+    def writes_to_disk(self) -> bool:
+        return self.config.RENDER_MODE != 'memory' or self.config.SAVE_DISK_COPY
+    
     def _ensure_directories(self):
-        """確保所需的目錄存在"""
+        """確保所需的目錄存在（不寫入磁碟時不建立圖片目錄）"""
         os.makedirs(self.paths.BASE_DATA_DIR, exist_ok=True)
-        os.makedirs(self.paths.EVENT_DIR, exist_ok=True)
-        os.makedirs(self.paths.MONTH_DIR, exist_ok=True)
+        if self.writes_to_disk:
+            os.makedirs(self.paths.EVENT_DIR, exist_ok=True)
+            os.makedirs(self.paths.MONTH_DIR, exist_ok=True)
     
     def load_notion_colors(self, property_type: str) -> Dict[str, str]:
         """載入 Notion 顏色配置"""
@@ -175,10 +174,25 @@ class ChartGenerator:
             print(f"沒有支出數據，跳過生成圖表：{title}")
             return
         
-        plt.figure(figsize=(16, 8), facecolor='black')
-        
         total_amount = sum(v['value'] if isinstance(v, dict) else v for v in attribute_expenses.values())
-        plt.suptitle(f"{title}\n總計：{total_amount:,.0f}", color='white', size=16, y=0.95)
+        heading = f"{title}\n總計：{total_amount:,.0f}"
+        file_name = f"{title}.png"
+        save_path = os.path.join(save_dir, file_name)
+        
+        if self.config.REUSE_FIGURE:
+            figure, (attribute_ax, category_ax), suptitle = self._template_figure()
+            suptitle.set_text(heading)
+            attribute_ax.clear()
+            category_ax.clear()
+            self._draw_pie(attribute_ax, attribute_expenses, attribute_colors, "支出屬性分布")
+            self._draw_pie(category_ax, category_expenses, category_colors, "支出類別分布")
+            # 直接以畫布的 renderer 計算緊湊邊界，savefig 不需要再為 bbox_inches='tight' 試畫一次
+            bbox = figure.get_tightbbox(figure.canvas.get_renderer()).padded(plt.rcParams['savefig.pad_inches'])
+            self._save_figure(figure, file_name, save_path, bbox)
+            return
+        
+        figure = plt.figure(figsize=(16, 8), facecolor='black')
+        plt.suptitle(heading, color='white', size=16, y=0.95)
         
         # 屬性圓餅圖
         self._create_pie_chart(attribute_expenses, attribute_colors, 121, "支出屬性分布")
@@ -186,15 +200,66 @@ class ChartGenerator:
         # 類別圓餅圖
         self._create_pie_chart(category_expenses, category_colors, 122, "支出類別分布")
         
-        save_path = os.path.join(save_dir, f"{title}.png")
-        plt.savefig(save_path, facecolor='black', bbox_inches='tight')
-        print(f"已保存圖表：{save_path}")
-        plt.close()
+        self._save_figure(figure, file_name, save_path, 'tight')
+        plt.close(figure)
+    
+    def _template_figure(self) -> Tuple[Figure, Tuple[Any, Any], Any]:
+        """建立或返回重用的模板圖表：Agg 畫布、兩個子圖與總標題只建立一次"""
+        if self._template is None:
+            figure = Figure(figsize=(16, 8), facecolor='black')
+            FigureCanvasAgg(figure)
+            axes = (figure.add_subplot(121), figure.add_subplot(122))
+            suptitle = figure.suptitle('', color='white', size=16, y=0.95)
+            self._template = (figure, axes, suptitle)
+        return self._template
+    
+    def _save_figure(self, figure: Figure, file_name: str, save_path: str, bbox_inches):
+        """依 RENDER_MODE 保存圖表到磁碟或渲染到記憶體"""
+        if self.config.RENDER_MODE == 'memory':
+            self._render_to_memory(figure, file_name, save_path, bbox_inches)
+        else:
+            figure.savefig(save_path, facecolor='black', bbox_inches=bbox_inches)
+            self.saved_paths.append(save_path)
+            print(f"已保存圖表：{save_path}")
+    
+    def create_group_charts(self, job: Dict, attribute_colors: Dict[str, str], category_colors: Dict[str, str]):
+        """為一個事件或月份創建三種圓餅圖（總計、廷、雰）
+        
+        job 為 {'title': 標題（同時是文件名）, 'save_dir': 目錄, 'total' / 'ting' / 'feng': 支出}，
+        見 ChartManager._chart_job。
+        """
+        for key, suffix in (('total', ''), ('ting', ' (廷)'), ('feng', ' (雰)')):
+            self.create_combined_pie_charts(
+                job[key]['attribute'],
+                job[key]['category'],
+                attribute_colors,
+                category_colors,
+                f"{job['title']}{suffix}",
+                job['save_dir']
+            )
+    
+    def _render_to_memory(self, figure: Figure, file_name: str, save_path: str, bbox_inches='tight'):
+        """將圖表渲染為 PNG bytes，需要時再把同一份內容寫入磁碟"""
+        buffer = BytesIO()
+        figure.savefig(buffer, format='png', facecolor='black', bbox_inches=bbox_inches)
+        data = buffer.getvalue()
+        
+        path = None
+        if self.config.SAVE_DISK_COPY:
+            with open(save_path, 'wb') as f:
+                f.write(data)
+            path = save_path
+        
+        self.rendered[file_name] = {'data': data, 'path': path}
+        print(f"已渲染圖表：{file_name}（{len(data) / 1024:.0f} KB）")
     
     def _create_pie_chart(self, expenses: Dict[str, Any], colors: Dict[str, str], 
                          subplot: int, title: str):
         """創建單個圓餅圖"""
-        ax = plt.subplot(subplot)
+        self._draw_pie(plt.subplot(subplot), expenses, colors, title)
+    
+    def _draw_pie(self, ax, expenses: Dict[str, Any], colors: Dict[str, str], title: str):
+        """在指定的子圖上繪製圓餅圖"""
         ax.set_facecolor('black')
         
         labels = []
@@ -221,32 +286,63 @@ class ChartGenerator:
         
         ax.set_title(title, color='white', size=14, pad=20)
 
+# 渲染進程中的圖表生成器與顏色，由 _init_render_worker 建立
+_worker_state = {}
+
+
+def _init_render_worker(config: Config, paths: Paths, attribute_colors: Dict[str, str],
+                        category_colors: Dict[str, str]):
+    """渲染進程的初始化：只載入一次 matplotlib，設定 Agg 後端與字體"""
+    matplotlib.use('Agg')
+    configure_fonts()
+    _worker_state['generator'] = ChartGenerator(config, paths)
+    _worker_state['colors'] = (attribute_colors, category_colors)
+
+
+def _render_chart_job(job: Dict) -> Tuple[Dict[str, Dict], List[str]]:
+    """在渲染進程中繪製一個分組的圖表，返回 (memory 模式的渲染結果, disk 模式的文件路徑)"""
+    generator = _worker_state['generator']
+    generator.rendered, generator.saved_paths = {}, []
+    generator.create_group_charts(job, *_worker_state['colors'])
+    return generator.rendered, generator.saved_paths
+
+
 class ChartManager:
     """管理圖表生成的主要類"""
     
-    def __init__(self):
-        self.config = Config()
+    def __init__(self, config: Config = None):
+        self.config = config or Config()
         self.paths = Paths()
         self.chart_generator = ChartGenerator(self.config, self.paths)
         self.data = None  # 添加 data 作為實例變量
+        # 本次指定重繪、但已經沒有支出記錄的事件與月份，圖表已從磁碟移除
+        self.emptied_groups = set()
+    
+    @property
+    def rendered_charts(self) -> Dict[str, Dict]:
+        """memory 模式下本次渲染的圖表 {文件名: {'data': bytes, 'path': str 或 None}}"""
+        return self.chart_generator.rendered
     
     def load_data(self, source: str = 'affected') -> Tuple[List[Dict], Set[str], Set[str]]:
         """載入數據和配置
         
         Args:
             source: 數據源，可以是 'affected' 或 'full'
+                （'full' 優先從 SQLite 賬本或 JSONL 分段賬本串流讀取）
             
         Returns:
             Tuple[List[Dict], Set[str], Set[str]]: (數據, 有效屬性集合, 有效類別集合)
         """
         try:
-            with open(self.paths.SELECT_COLOR_PATH, 'r', encoding='utf-8') as f:
-                color_config = json.load(f)
-            
-            valid_attributes = {opt['name'] for opt in color_config.get('屬性', {}).get('options', [])}
-            valid_categories = {opt['name'] for opt in color_config.get('類別', {}).get('options', [])}
+            valid_attributes, valid_categories = self._load_valid_options()
             
             # 根據 source 選擇數據文件
+            store = self._open_ledger_store() if source == 'full' else None
+            if store is not None:
+                with store:
+                    self.data = list(store.iter_records())
+                return self.data, valid_attributes, valid_categories
+            
             if source == 'affected':
                 data_path = self.paths.AFFECTED_CHARTS_DATA_PATH
                 print(f"使用受影響的數據源：{data_path}")
@@ -264,207 +360,327 @@ class ChartManager:
             print(f"載入數據時發生錯誤: {e}")
             raise
     
-    def process_events(self, data: List[Dict], valid_attributes: Set[str], 
-                      valid_categories: Set[str], target_events: Set[str] = None):
-        """處理事件圖表"""
-        print("\n開始處理事件圖表...")
-        
-        processor = ChartDataProcessor(data, valid_attributes, valid_categories)
-        event_data = defaultdict(lambda: {
-            'total': {'attribute': defaultdict(float), 'category': defaultdict(float)},
-            'ting': {'attribute': defaultdict(float), 'category': defaultdict(float)},
-            'feng': {'attribute': defaultdict(float), 'category': defaultdict(float)}
-        })
-        
-        for record in data:
-            event_info = record.get('💥 重大事件支出列表')
-            if not event_info:
-                continue
-            
-            event_name = event_info.get('title') if isinstance(event_info, dict) else str(event_info)
-            if not event_name:
+    def _load_valid_options(self) -> Tuple[Set[str], Set[str]]:
+        """從 select_color.json 讀取有效的屬性與類別"""
+        with open(self.paths.SELECT_COLOR_PATH, 'r', encoding='utf-8') as f:
+            return valid_chart_options(json.load(f))
+    
+    def load_snapshot(self) -> LedgerSnapshot:
+        """以 mmap 開啟同步時寫出的列式快照，不存在時返回 None"""
+        snapshot = LedgerSnapshot.load(self.paths.LEDGER_SNAPSHOT_DIR)
+        if snapshot is not None:
+            print(f"使用列式快照：{self.paths.LEDGER_SNAPSHOT_DIR}（{len(snapshot)} 條記錄）")
+        return snapshot
+    
+    def encode_records(self, data: List[Dict]) -> LedgerSnapshot:
+        """把逐條記錄編碼為記憶體中的列（結構與列式快照相同），供 numpy 彙總使用"""
+        with open(self.paths.SELECT_COLOR_PATH, 'r', encoding='utf-8') as f:
+            select_options = json.load(f)
+        extractor = ColumnarBatchExtractor(select_options, capacity=max(len(data), 1))
+        extractor.append_records(data)
+        return LedgerSnapshot(extractor.columns, extractor.dictionaries, extractor.relation_titles())
+    
+    def aggregate_columns(self, snapshot: LedgerSnapshot, valid_attributes: Set[str], valid_categories: Set[str],
+                          target_events: Set[str] = None, target_months: Set[str] = None) -> Dict[str, Dict]:
+        """aggregate_records 的向量化版本，輸入為列式快照或 encode_records 的結果"""
+        group_data = {}
+        for kind, targets in (('event', target_events), ('month', target_months)):
+            if targets is not None and not targets:
+                group_data[kind] = {}
                 continue
-                
-            # 如果指定了 target_events，只處理這些事件
-            if target_events is not None and event_name not in target_events:
+            group_data[kind] = self.aggregate_snapshot(snapshot, kind, valid_attributes, valid_categories, targets)
+        return group_data
+    
+    def aggregate_snapshot(self, snapshot: LedgerSnapshot, group_column: str,
+                           valid_attributes: Set[str], valid_categories: Set[str],
+                           target_groups: Set[str] = None) -> Dict:
+        """直接在列上彙總各事件或月份的支出，結構與 aggregate_records 的單一類別相同
+        
+        以 (分組代碼, 選項代碼) 組合鍵對金額做 bincount，每個維度只需三次
+        （總計、廷、雰），不需要建立逐條記錄的字典。個人支出以
+        ChartDataProcessor.person_weights 的權重加權，與 dict 方式一致。
+        """
+        columns = snapshot.columns
+        titles = snapshot.relation_titles
+        amount = np.asarray(columns['amount'])
+        groups = np.asarray(columns[group_column]).astype(np.int64)
+        person = np.asarray(columns['person'])
+        person_names = snapshot.dictionaries['person']
+        
+        in_group = groups >= 0
+        if target_groups is not None:
+            wanted = np.array([title in target_groups for title in titles], dtype=bool)
+            in_group[in_group] &= wanted[groups[in_group]]
+        selected = in_group & (amount != 0)
+        
+        # 與 aggregate_records 相同，有支出金額的分組即使沒有有效選項也保留
+        group_data = defaultdict(self._empty_group)
+        for code in np.unique(groups[selected]):
+            group_data[titles[code]]
+        
+        # 依人員代碼查表得到每列的 (廷, 雰) 權重，代碼 -1（空值）對應末尾的共同權重
+        processor = self._create_processor([], valid_attributes, valid_categories)
+        code_weights = np.array([processor.person_weights({'廷 | 雰': name}) for name in person_names]
+                                + [processor.shared_split], dtype=np.float64)
+        row_weights = code_weights[person]
+        person_weights = {'total': 1.0, 'ting': row_weights[:, 0], 'feng': row_weights[:, 1]}
+        
+        for dimension, valid in (('attribute', valid_attributes), ('category', valid_categories)):
+            names = snapshot.dictionaries[dimension]
+            if not names:
                 continue
+            codes = np.asarray(columns[dimension]).astype(np.int64)
+            valid_codes = np.array([name in valid for name in names] + [False], dtype=bool)
+            mask = selected & valid_codes[codes]  # 代碼 -1（空值）對應末尾的 False
+            keys = groups[mask] * len(names) + codes[mask]
+            amounts = amount[mask]
             
-            expense = processor.get_expense_amount(record)
-            if expense:
-                self._process_record_expenses(record, event_data[event_name], processor)
+            for key, weight in person_weights.items():
+                weights = amounts * (weight if np.isscalar(weight) else weight[mask])
+                sums = np.bincount(keys, weights=weights,
+                                   minlength=len(titles) * len(names)).reshape(len(titles), len(names))
+                for group_code, option_code in zip(*np.nonzero(sums)):
+                    group_data[titles[group_code]][key][dimension][names[option_code]] += float(sums[group_code, option_code])
+        
+        return group_data
+    
+    def draw_snapshot(self, snapshot: LedgerSnapshot, target_events: Set[str] = None):
+        """從列式快照繪製事件與月份圖表"""
+        valid_attributes, valid_categories = self._load_valid_options()
+        self.data = []  # 快照模式下沒有逐條記錄
+        
+        events, months = self._split_targets(target_events)
+        group_data = self.aggregate_columns(snapshot, valid_attributes, valid_categories, events, months)
+        self._generate_group_charts(group_data, events, months)
+    
+    def load_rollups(self) -> ChartRollups:
+        """讀取同步時維護的彙總表，停用或沒有本地賬本時返回 None
         
-        self._generate_event_charts(event_data)
+        彙總表保存的摘要與賬本不符（例如同步中斷或賬本被另外修改）時，先從賬本重建。
+        """
+        if not self.config.USE_ROLLUPS:
+            return None
+        store = self._open_ledger_store(quiet=True)
+        if store is None and os.path.exists(self.paths.FULL_ACCOUNT_DATA_PATH):
+            store = JsonLedgerStore(self.paths.FULL_ACCOUNT_DATA_PATH)
+        if store is None:
+            return None
+        
+        valid_attributes, valid_categories = self._load_valid_options()
+        with store:
+            rollups = store.attach_rollups(ChartRollups.open(self.paths.CHART_ROLLUP_PATH, valid_attributes,
+                                                             valid_categories, self.config.SHARED_SPLIT))
+        print(f"使用圖表彙總表：{self.paths.CHART_ROLLUP_PATH}")
+        return rollups
     
-    def process_months(self, data: List[Dict], valid_attributes: Set[str], 
-                      valid_categories: Set[str], target_months: Set[str] = None):
-        """處理月份圖表"""
-        print("\n開始處理月份支出圖表...")
+    def draw_rollups(self, rollups: ChartRollups, target_events: Set[str] = None):
+        """直接從彙總表繪製事件與月份圖表"""
+        self.data = []  # 彙總表模式下沒有逐條記錄
+        
+        events, months = self._split_targets(target_events)
+        self._generate_group_charts({
+            'event': rollups.group_data('event', events),
+            'month': rollups.group_data('month', months),
+        }, events, months)
+    
+    @staticmethod
+    def _split_targets(target_events: Set[str] = None) -> Tuple[Set[str], Set[str]]:
+        """把目標區分為事件與月份，未指定目標時兩者皆為 None（處理全部）"""
+        if not target_events:
+            return None, None
+        events = {event for event in target_events if '月' not in event}
+        months = {event for event in target_events if '月' in event}
+        return events, months
+    
+    def _generate_group_charts(self, group_data: Dict[str, Dict], events: Set[str] = None,
+                               months: Set[str] = None):
+        """繪製 aggregate_records 結構的事件與月份圖表，目標為空集合的一類略過
         
-        processor = ChartDataProcessor(data, valid_attributes, valid_categories)
-        month_data = defaultdict(lambda: {
+        事件與月份的渲染工作合併後一次交給 _render_chart_jobs，只需啟動一個進程池。
+        """
+        jobs = []
+        if events is None or events:
+            print("\n開始處理事件圖表...")
+            jobs.extend(self._event_chart_jobs(group_data['event']))
+        if months is None or months:
+            print("\n開始處理月份支出圖表...")
+            jobs.extend(self._month_chart_jobs(group_data['month']))
+        self._render_chart_jobs(jobs)
+        
+        # 指定的分組沒有數據（記錄全被刪除或移到別的分組），不會產生新圖表，移除舊圖表
+        drawn = {job['title'] for job in jobs}
+        self.clear_group_charts(((events or set()) | (months or set())) - drawn)
+    
+    def clear_group_charts(self, titles: Set[str]):
+        """移除分組在磁碟上的三種圓餅圖，並記錄到 emptied_groups"""
+        for title in sorted(titles):
+            save_dir = self.paths.MONTH_DIR if '月' in title else self.paths.EVENT_DIR
+            for suffix in ('', ' (廷)', ' (雰)'):
+                path = os.path.join(save_dir, f"{title}{suffix}.png")
+                if os.path.exists(path):
+                    os.remove(path)
+            print(f"分組已沒有支出數據，清除圖表：{title}")
+            self.emptied_groups.add(title)
+    
+    def _open_ledger_store(self, quiet: bool = False):
+        """依 LEDGER_BACKEND 開啟已存在的本地賬本，不存在或為 'json' 時返回 None（改讀 full_account_data.json）"""
+        backend = self.config.LEDGER_BACKEND
+        if backend in (None, 'sqlite') and os.path.exists(self.paths.LEDGER_DB_PATH):
+            if not quiet:
+                print(f"使用完整數據源：{self.paths.LEDGER_DB_PATH}")
+            return SqliteLedgerStore(self.paths.LEDGER_DB_PATH)
+        if backend in (None, 'segments') and os.path.isdir(self.paths.LEDGER_SEGMENT_DIR):
+            if not quiet:
+                print(f"使用完整數據源：{self.paths.LEDGER_SEGMENT_DIR}")
+            return SegmentLedgerStore(self.paths.LEDGER_SEGMENT_DIR)
+        return None
+    
+    def _create_processor(self, data: List[Dict], valid_attributes: Set[str],
+                          valid_categories: Set[str]) -> ChartDataProcessor:
+        return ChartDataProcessor(data, valid_attributes, valid_categories, shared_split=self.config.SHARED_SPLIT)
+    
+    @staticmethod
+    def _empty_group() -> Dict:
+        return {
             'total': {'attribute': defaultdict(float), 'category': defaultdict(float)},
             'ting': {'attribute': defaultdict(float), 'category': defaultdict(float)},
-            'feng': {'attribute': defaultdict(float), 'category': defaultdict(float)}
-        })
+            'feng': {'attribute': defaultdict(float), 'category': defaultdict(float)},
+        }
+    
+    def aggregate_records(self, data: List[Dict], valid_attributes: Set[str], valid_categories: Set[str],
+                          target_events: Set[str] = None, target_months: Set[str] = None) -> Dict[str, Dict]:
+        """一次掃描彙總所有事件與月份的支出
         
-        # 如果指定了 target_months，只處理這些月份
-        if target_months:
-            print(f"只處理指定月份：{', '.join(target_months)}")
-            month_titles = target_months
-        else:
-            # 否則收集所有月份
-            month_titles = set()
-            for record in data:
-                month_info = record.get('💵 單月支出列表')
-                if not month_info:
-                    continue
-                
-                month_title = month_info.get('title') if isinstance(month_info, dict) else str(month_info)
-                if month_title:
-                    month_titles.add(month_title)
-            
-            print(f"找到 {len(month_titles)} 個月份記錄")
-            print("月份列表:")
-            for title in sorted(month_titles):
-                print(f"- {title}")
+        target_events / target_months 為 None 時處理全部分組，為集合時只處理其中的分組
+        （空集合表示不處理該類）。
+        
+        Returns:
+            Dict[str, Dict]: {'event': {標題: 分組}, 'month': {標題: 分組}}，
+                分組為 {'total', 'ting', 'feng': {'attribute', 'category'}}，
+                與 process_events 相同只包含有支出金額的分組
+        """
+        processor = self._create_processor(data, valid_attributes, valid_categories)
+        group_data = {kind: defaultdict(self._empty_group) for kind in ChartRollups.KINDS}
+        charted = {kind: set() for kind in ChartRollups.KINDS}
+        kinds = [(prop, target_events if kind == 'event' else target_months, group_data[kind], charted[kind])
+                 for kind, prop in ChartRollups.KINDS.items()]
         
-        # 只處理指定的月份
+        # 支出直接累加到各分組預先建立的累加器，逐條記錄不建立新容器
         for record in data:
-            month_info = record.get('💵 單月支出列表')
-            if not month_info:
-                continue
-            
-            month_title = month_info.get('title') if isinstance(month_info, dict) else str(month_info)
-            if not month_title or month_title not in month_titles:
-                continue
-            
-            expense = processor.get_expense_amount(record)
-            if expense:
-                self._process_record_expenses(record, month_data[month_title], processor)
+            for prop, targets, groups, charted_titles in kinds:
+                title = ChartRollups._group_title(record, prop)
+                if not title or (targets is not None and title not in targets):
+                    continue
+                
+                if processor.accumulate(record, groups[title]):
+                    charted_titles.add(title)
         
-        self._generate_month_charts(month_data)
+        return {kind: {title: group for title, group in groups.items() if title in charted[kind]}
+                for kind, groups in group_data.items()}
+    
+    def process_events(self, data: List[Dict], valid_attributes: Set[str], 
+                      valid_categories: Set[str], target_events: Set[str] = None):
+        """處理事件圖表"""
+        print("\n開始處理事件圖表...")
+        group_data = self.aggregate_records(data, valid_attributes, valid_categories,
+                                            target_events=target_events, target_months=set())
+        self._generate_event_charts(group_data['event'])
+    
+    def process_months(self, data: List[Dict], valid_attributes: Set[str], 
+                      valid_categories: Set[str], target_months: Set[str] = None):
+        """處理月份圖表"""
+        print("\n開始處理月份支出圖表...")
+        group_data = self.aggregate_records(data, valid_attributes, valid_categories,
+                                            target_events=set(), target_months=target_months or None)
+        self._generate_month_charts(group_data['month'])
     
     def _process_record_expenses(self, record: Dict, data_dict: Dict, processor: ChartDataProcessor):
         """處理單條記錄的支出"""
-        expense = processor.get_expense_amount(record)
-        
-        # 處理總支出
-        attribute = record.get('屬性')
-        if attribute and attribute in processor.valid_attributes:
-            data_dict['total']['attribute'][attribute] += expense
-        
-        category = record.get('類別')
-        if category and category in processor.valid_categories:
-            data_dict['total']['category'][category] += expense
-        
-        # 處理個人支出
-        ting_exp, feng_exp = processor.process_expenses_by_person(record)
-        for attr, amount in ting_exp['attribute'].items():
-            data_dict['ting']['attribute'][attr] += amount
-        for cat, amount in ting_exp['category'].items():
-            data_dict['ting']['category'][cat] += amount
-        
-        for attr, amount in feng_exp['attribute'].items():
-            data_dict['feng']['attribute'][attr] += amount
-        for cat, amount in feng_exp['category'].items():
-            data_dict['feng']['category'][cat] += amount
+        processor.accumulate(record, data_dict)
     
     def _generate_event_charts(self, event_data: Dict):
         """生成事件圖表"""
-        attribute_colors = self.chart_generator.load_notion_colors('屬性')
-        category_colors = self.chart_generator.load_notion_colors('類別')
-        
-        for event_name, expenses in event_data.items():
-            if event_name and any(expenses.values()):
-                date_range = self._get_event_date_range(event_name)
-                base_title = f"{event_name}{date_range}"
-                
-                self._create_all_pie_charts(
-                    expenses['total'],
-                    expenses['ting'],
-                    expenses['feng'],
-                    attribute_colors,
-                    category_colors,
-                    base_title,
-                    self.paths.EVENT_DIR
-                )
+        self._render_chart_jobs(self._event_chart_jobs(event_data))
     
     def _generate_month_charts(self, month_data: Dict):
         """生成月份圖表"""
-        attribute_colors = self.chart_generator.load_notion_colors('屬性')
-        category_colors = self.chart_generator.load_notion_colors('類別')
-        
+        self._render_chart_jobs(self._month_chart_jobs(month_data))
+    
+    def _event_chart_jobs(self, event_data: Dict) -> List[Dict]:
+        """事件圖表的渲染工作"""
+        jobs = []
+        for event_name, expenses in event_data.items():
+            if event_name and any(expenses.values()):
+                jobs.append(self._chart_job(expenses, event_name, self.paths.EVENT_DIR))
+        return jobs
+    
+    def _month_chart_jobs(self, month_data: Dict) -> List[Dict]:
+        """月份圖表的渲染工作"""
         month_titles = sorted(month_data.keys())
         print(f"找到 {len(month_titles)} 個月份記錄")
         print("月份列表:")
         for title in month_titles:
             print(f"- {title}")
         
-        for month_title in month_titles:
-            try:
-                self._create_all_pie_charts(
-                    month_data[month_title]['total'],
-                    month_data[month_title]['ting'],
-                    month_data[month_title]['feng'],
-                    attribute_colors,
-                    category_colors,
-                    month_title,
-                    self.paths.MONTH_DIR
-                )
-            except Exception as e:
-                print(f"處理月份 {month_title} 時發生錯誤: {str(e)}")
-                import traceback
-                traceback.print_exc()
+        return [self._chart_job(month_data[month_title], month_title, self.paths.MONTH_DIR)
+                for month_title in month_titles]
+    
+    @staticmethod
+    def _chart_job(expenses: Dict, title: str, save_dir: str) -> Dict:
+        """一個分組的渲染工作，只包含可序列化的數據，供渲染進程使用"""
+        job = {'title': title, 'save_dir': save_dir}
+        for key in ('total', 'ting', 'feng'):
+            job[key] = {dimension: dict(expenses[key][dimension]) for dimension in ('attribute', 'category')}
+        return job
+    
+    def _render_chart_jobs(self, jobs: List[Dict]):
+        """渲染各分組的圖表，單一分組失敗不影響其他分組
+        
+        RENDER_WORKERS 大於 1、工作數達到 RENDER_POOL_MIN_JOBS 且有多個 CPU 核心時
+        分發到進程池，各進程的結果合併到 chart_generator.rendered / saved_paths，
+        供上傳階段使用。
+        """
+        if not jobs:
+            return
+        attribute_colors = self.chart_generator.load_notion_colors('屬性')
+        category_colors = self.chart_generator.load_notion_colors('類別')
+        # 進程數不超過工作數與 CPU 核心數，單核環境或工作太少時直接依序渲染
+        workers = min(self.config.RENDER_WORKERS, len(jobs), os.cpu_count() or 1)
+        
+        if workers <= 1 or len(jobs) < self.config.RENDER_POOL_MIN_JOBS:
+            for job in jobs:
+                try:
+                    self.chart_generator.create_group_charts(job, attribute_colors, category_colors)
+                except Exception as e:
+                    print(f"處理 {job['title']} 時發生錯誤: {str(e)}")
+                    traceback.print_exc()
+            return
+        
+        # 使用 spawn 啟動新進程，避免 fork 時複製主進程的執行緒與連線狀態
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_render_worker,
+                                 initargs=(self.config, self.paths, attribute_colors, category_colors)) as executor:
+            futures = {executor.submit(_render_chart_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    rendered, saved_paths = future.result()
+                except Exception as e:
+                    print(f"處理 {job['title']} 時發生錯誤: {str(e)}")
+                    traceback.print_exc()
+                    continue
+                self.chart_generator.rendered.update(rendered)
+                self.chart_generator.saved_paths.extend(saved_paths)
     
     def _create_all_pie_charts(self, total_expenses: Dict, ting_expenses: Dict,
                              feng_expenses: Dict, attribute_colors: Dict[str, str],
                              category_colors: Dict[str, str], base_title: str,
                              save_dir: str):
         """為同一組數據創建三種圓餅圖"""
-        self.chart_generator.create_combined_pie_charts(
-            total_expenses['attribute'],
-            total_expenses['category'],
-            attribute_colors,
-            category_colors,
-            base_title,
-            save_dir
-        )
-        
-        self.chart_generator.create_combined_pie_charts(
-            ting_expenses['attribute'],
-            ting_expenses['category'],
-            attribute_colors,
-            category_colors,
-            f"{base_title} (廷)",
-            save_dir
-        )
-        
-        self.chart_generator.create_combined_pie_charts(
-            feng_expenses['attribute'],
-            feng_expenses['category'],
-            attribute_colors,
-            category_colors,
-            f"{base_title} (雰)",
-            save_dir
-        )
-    
-    def _get_event_date_range(self, event_name: str) -> str:
-        """獲取事件的日期範圍"""
-        dates = []
-        for record in self.data:
-            if record.get('💥 重大事件支出列表') == event_name:
-                date = record.get('日期')
-                if date and isinstance(date, str):
-                    dates.append(date)
-        
-        if not dates:
-            return ""
-        
-        dates.sort()
-        start_date = dates[0]
-        end_date = dates[-1]
-        
-        return f" ({start_date})" if start_date == end_date else f" ({start_date} - {end_date})"
+        expenses = {'total': total_expenses, 'ting': ting_expenses, 'feng': feng_expenses}
+        self.chart_generator.create_group_charts(self._chart_job(expenses, base_title, save_dir),
+                                                 attribute_colors, category_colors)
     
     def draw_graph(self, target_events: Set[str] = None, source: str = 'affected'):
         """主要執行函數
@@ -472,27 +688,36 @@ class ChartManager:
         Args:
             target_events: 需要處理的事件集合
             source: 數據源，可以是 'affected' 或 'full'
+                （'full' 在列式快照存在時直接從快照繪製）
+                彙總表存在時兩種數據源都直接讀取彙總表
         """
         try:
+            rollups = self.load_rollups()
+            if rollups is not None:
+                self.draw_rollups(rollups, target_events)
+                return
+            
+            snapshot = self.load_snapshot() if source == 'full' else None
+            if snapshot is not None:
+                self.draw_snapshot(snapshot, target_events)
+                return
+            
             data, valid_attributes, valid_categories = self.load_data(source)
             print(f"總記錄數: {len(data)}")
             
-            if target_events:
-                # 區分事件和月份
-                events = {event for event in target_events if '月' not in event}
-                months = {event for event in target_events if '月' in event}
-                
-                if events:
-                    print(f"處理事件：{', '.join(events)}")
-                    self.process_events(data, valid_attributes, valid_categories, events)
-                
-                if months:
-                    print(f"處理月份：{', '.join(months)}")
-                    self.process_months(data, valid_attributes, valid_categories, months)
+            events, months = self._split_targets(target_events)
+            if events:
+                print(f"處理事件：{', '.join(events)}")
+            if months:
+                print(f"處理月份：{', '.join(months)}")
+            
+            # 一次掃描同時彙總事件與月份
+            if self.config.AGGREGATION_BACKEND == 'numpy':
+                group_data = self.aggregate_columns(self.encode_records(data), valid_attributes,
+                                                    valid_categories, events, months)
             else:
-                # 如果沒有指定事件，處理所有
-                self.process_events(data, valid_attributes, valid_categories)
-                self.process_months(data, valid_attributes, valid_categories)
+                group_data = self.aggregate_records(data, valid_attributes, valid_categories, events, months)
+            self._generate_group_charts(group_data, events, months)
             
         except Exception as e:
             print(f"執行過程中發生錯誤: {str(e)}")
@@ -0,0 +1,902 @@
+import hashlib
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+# 記錄中用來分組的關聯屬性
+EVENT_PROPERTY = '💥 重大事件支出列表'
+MONTH_PROPERTY = '💵 單月支出列表'
+
+
+def _title(value) -> str:
+    """關聯欄位在記錄中為 {'id': ..., 'title': ...}，其他欄位直接是值"""
+    if isinstance(value, dict):
+        return value.get('title')
+    return value or None
+
+
+def record_group_titles(record: Dict) -> List[str]:
+    """返回記錄所屬的事件與月份標題（沒有的略過）"""
+    return [title for title in (_title(record.get(EVENT_PROPERTY)), _title(record.get(MONTH_PROPERTY)))
+            if title]
+
+
+def _relation_id(value) -> str:
+    if isinstance(value, dict):
+        return value.get('id')
+    return None
+
+
+def record_group_keys(record: Dict) -> List[str]:
+    """返回記錄在分組索引中的鍵：事件與月份的標題及 relation 頁面 ID"""
+    keys = record_group_titles(record)
+    for prop in (EVENT_PROPERTY, MONTH_PROPERTY):
+        relation_id = _relation_id(record.get(prop))
+        if relation_id:
+            keys.append(relation_id)
+    return keys
+
+
+# 影響圖表的欄位；只有這些欄位變更時才需要重繪記錄所屬的分組
+CHART_FIELDS = ('支出NTD', '類別', '屬性', '廷 | 雰', '日期', EVENT_PROPERTY, MONTH_PROPERTY)
+CONTENT_HASH_KEY = 'content_hash'
+CHART_HASH_KEY = 'chart_hash'
+# 頁面在 Notion 的最後編輯時間，沒有同步狀態時用來重建增量同步的高水位
+EDITED_TIME_KEY = 'last_edited_time'
+
+
+def record_hash(record: Dict, fields: Iterable[str]) -> str:
+    """對記錄中指定欄位計算穩定的內容雜湊（與欄位順序、字典鍵順序無關）"""
+    values = {field: record.get(field) for field in fields}
+    payload = json.dumps(values, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def ledger_high_water_mark(store) -> str:
+    """賬本中記錄的最晚編輯時間，沒有記錄帶編輯時間時返回 None"""
+    return max((record[EDITED_TIME_KEY] for record in store.iter_records() if record.get(EDITED_TIME_KEY)),
+               default=None)
+
+
+def stamp_record_hashes(record: Dict, fields: Iterable[str]) -> Dict:
+    """在記錄上寫入內容雜湊（fields）與圖表雜湊（CHART_FIELDS）"""
+    record[CONTENT_HASH_KEY] = record_hash(record, fields)
+    record[CHART_HASH_KEY] = record_hash(record, CHART_FIELDS)
+    return record
+
+
+def _digest_entry(page_id: str, content_hash: str) -> int:
+    payload = f"{page_id}:{content_hash or ''}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(payload, digest_size=8).digest(), 'big')
+
+
+def ledger_digest(entries: Iterable[Tuple[str, str]]) -> int:
+    """(page_id, 內容雜湊) 集合的摘要，與順序無關，可以逐條以 XOR 加入或移除"""
+    digest = 0
+    for page_id, content_hash in entries:
+        digest ^= _digest_entry(page_id, content_hash)
+    return digest
+
+
+def valid_chart_options(select_options: Dict) -> Tuple[Set[str], Set[str]]:
+    """從 select_color.json 的內容取出有效的屬性與類別"""
+    valid_attributes = {opt['name'] for opt in select_options.get('屬性', {}).get('options', [])}
+    valid_categories = {opt['name'] for opt in select_options.get('類別', {}).get('options', [])}
+    return valid_attributes, valid_categories
+
+
+# 個人支出分配權重 (廷, 雰)；不在表中的付款人（共同、空值）使用 SHARED_SPLIT_WEIGHTS
+PERSON_SPLIT_WEIGHTS = {'廷': (1.0, 0.0), '雰': (0.0, 1.0)}
+SHARED_SPLIT_WEIGHTS = (0.5, 0.5)
+
+
+class ChartDataProcessor:
+    """處理圖表數據的類
+
+    個人支出依 '廷 | 雰' 欄位的權重 (廷, 雰) 分配：split_weights 指定各付款人的權重，
+    不在其中的值（共同支出、空值）使用 shared_split。
+    """
+
+    def __init__(self, data: List[Dict], valid_attributes: Set[str], valid_categories: Set[str],
+                 split_weights: Dict[str, Tuple[float, float]] = None,
+                 shared_split: Tuple[float, float] = SHARED_SPLIT_WEIGHTS):
+        self.data = data
+        self.valid_attributes = valid_attributes
+        self.valid_categories = valid_categories
+        self.split_weights = split_weights if split_weights is not None else PERSON_SPLIT_WEIGHTS
+        self.shared_split = tuple(shared_split)
+
+    def get_expense_amount(self, record: Dict) -> float:
+        """從記錄中獲取支出金額"""
+        expense = record.get('支出NTD')
+        if isinstance(expense, dict):
+            return expense.get('number', 0)
+        return float(expense) if isinstance(expense, (int, float)) else 0
+
+    def person_weights(self, record: Dict) -> Tuple[float, float]:
+        """記錄的支出分配給 (廷, 雰) 的權重"""
+        share_info = record.get('廷 | 雰')
+        if isinstance(share_info, dict):
+            share_info = share_info.get('title', '')
+        return self.split_weights.get(share_info, self.shared_split)
+
+    def accumulate(self, record: Dict, group: Dict, sign: float = 1) -> bool:
+        """把單條記錄的支出直接累加到分組的累加器，不建立中間容器
+
+        group 為 {'total' / 'ting' / 'feng': {'attribute': defaultdict(float), 'category': defaultdict(float)}}。
+
+        Returns:
+            bool: 記錄是否有支出金額
+        """
+        expense = self.get_expense_amount(record)
+        if not expense:
+            return False
+
+        expense *= sign
+        ting_weight, feng_weight = self.person_weights(record)
+        for dimension, value, valid in (('attribute', record.get('屬性'), self.valid_attributes),
+                                        ('category', record.get('類別'), self.valid_categories)):
+            if value and value in valid:
+                group['total'][dimension][value] += expense
+                if ting_weight:
+                    group['ting'][dimension][value] += expense * ting_weight
+                if feng_weight:
+                    group['feng'][dimension][value] += expense * feng_weight
+        return True
+
+    def process_expenses_by_person(self, record: Dict) -> Tuple[Dict, Dict]:
+        """處理單條記錄的支出數據，根據記錄的 '廷 | 雰' 欄位進行分類"""
+        group = {person: {'attribute': defaultdict(float), 'category': defaultdict(float)}
+                 for person in ('total', 'ting', 'feng')}
+        self.accumulate(record, group)
+        return group['ting'], group['feng']
+
+    def record_contributions(self, record: Dict) -> List[Tuple[str, str, str, float]]:
+        """單條記錄對圖表總和的貢獻 [(人員, 維度, 選項, 金額)]
+
+        人員為 'total'、'ting' 或 'feng'，維度為 'attribute' 或 'category'。
+        """
+        expense = self.get_expense_amount(record)
+        if not expense:
+            return []
+
+        contributions = []
+        weights = (('total', 1.0),) + tuple(zip(('ting', 'feng'), self.person_weights(record)))
+        for dimension, value, valid in (('attribute', record.get('屬性'), self.valid_attributes),
+                                        ('category', record.get('類別'), self.valid_categories)):
+            if value and value in valid:
+                for person, weight in weights:
+                    if weight:
+                        contributions.append((person, dimension, value, expense * weight))
+        return contributions
+
+
+class ChartRollups:
+    """持久化的圖表彙總表，以 (分組, 人員, 維度, 選項) 為鍵保存支出總和
+
+    掛在賬本上（見 RollupMaintainer.attach_rollups）時，賬本每次寫入都對新增、
+    編輯、移除的記錄套用 +/- 增量，繪圖時直接讀取總和，耗時與需要重繪的分組數
+    成正比，與賬本大小無關。彙總表保存已計入記錄的摘要（見 ledger_digest），
+    與賬本的摘要不符、有效的屬性與類別或共同支出的分配權重改變時，從賬本重建。
+    """
+
+    KINDS = {'event': EVENT_PROPERTY, 'month': MONTH_PROPERTY}
+    # 記錄貢獻的計算方式或保存的結構改變時遞增，舊版本的彙總表會被重建
+    VERSION = 4
+
+    def __init__(self, path: str, valid_attributes: Set[str], valid_categories: Set[str],
+                 shared_split: Tuple[float, float] = SHARED_SPLIT_WEIGHTS):
+        self.path = path
+        self.processor = ChartDataProcessor([], valid_attributes, valid_categories, shared_split=shared_split)
+        self.reset()
+
+    def reset(self):
+        """清空所有總和"""
+        self.records = 0  # 已計入的記錄數
+        self.digest = 0  # 已計入記錄的 page_id 與內容雜湊的摘要，與賬本的 digest() 比較
+        self.groups = {kind: {} for kind in self.KINDS}
+
+    @classmethod
+    def load(cls, path: str, valid_attributes: Set[str], valid_categories: Set[str],
+             shared_split: Tuple[float, float] = SHARED_SPLIT_WEIGHTS) -> 'ChartRollups':
+        """讀取彙總表，不存在、版本不符或有效選項、分配權重已改變時返回 None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        rollups = cls(path, valid_attributes, valid_categories, shared_split)
+        if data.get('version') != cls.VERSION or data.get('options') != rollups._options():
+            return None
+        rollups.records = data.get('records', 0)
+        rollups.digest = int(data.get('digest', '0'), 16)
+        for kind in cls.KINDS:
+            rollups.groups[kind] = data.get('groups', {}).get(kind, {})
+        return rollups
+
+    @classmethod
+    def rebuild(cls, path: str, records, valid_attributes: Set[str], valid_categories: Set[str],
+                shared_split: Tuple[float, float] = SHARED_SPLIT_WEIGHTS) -> 'ChartRollups':
+        """從完整記錄重新計算彙總表"""
+        rollups = cls(path, valid_attributes, valid_categories, shared_split)
+        rollups.apply(added=records)
+        return rollups
+
+    @classmethod
+    def open(cls, path: str, valid_attributes: Set[str], valid_categories: Set[str],
+             shared_split: Tuple[float, float] = SHARED_SPLIT_WEIGHTS) -> 'ChartRollups':
+        """讀取彙總表，無法使用時返回空的彙總表（掛到賬本時會因摘要不符而重建）"""
+        return (cls.load(path, valid_attributes, valid_categories, shared_split)
+                or cls(path, valid_attributes, valid_categories, shared_split))
+
+    def _options(self) -> Dict[str, List]:
+        return {
+            'attribute': sorted(self.processor.valid_attributes),
+            'category': sorted(self.processor.valid_categories),
+            'shared_split': list(self.processor.shared_split),
+        }
+
+    @staticmethod
+    def _group_title(record: Dict, prop: str) -> str:
+        info = record.get(prop)
+        if not info:
+            return None
+        return info.get('title') if isinstance(info, dict) else str(info)
+
+    def apply(self, removed=(), added=()) -> Set[str]:
+        """移除舊記錄的貢獻並加入新記錄的貢獻，返回受影響的分組"""
+        dirty = set()
+        for sign, records in ((-1, removed), (1, added)):
+            for record in records:
+                self.records += sign
+                self.digest ^= _digest_entry(record.get('page_id'), record.get(CONTENT_HASH_KEY))
+                charted = bool(self.processor.get_expense_amount(record))
+                contributions = self.processor.record_contributions(record)
+                for kind, prop in self.KINDS.items():
+                    title = self._group_title(record, prop)
+                    if title:
+                        self._apply_record(self.groups[kind], title, sign, charted, contributions)
+                        dirty.add(title)
+        return dirty
+
+    @staticmethod
+    def _apply_record(groups: Dict, title: str, sign: int, charted: bool, contributions: List):
+        group = groups.get(title)
+        if group is None:
+            group = groups[title] = {
+                'records': 0,
+                'charted': 0,  # 有支出金額的記錄數，與 process_events 相同只繪製這些分組
+                'sums': {person: {'attribute': {}, 'category': {}} for person in ('total', 'ting', 'feng')},
+            }
+
+        group['records'] += sign
+        if group['records'] <= 0:
+            del groups[title]
+            return
+        group['charted'] += sign * charted
+
+        for person, dimension, value, amount in contributions:
+            sums = group['sums'][person][dimension]
+            total = sums.get(value, 0) + sign * amount
+            if abs(total) > 1e-9:
+                sums[value] = total
+            else:
+                sums.pop(value, None)
+
+    def group_data(self, kind: str, titles: Set[str] = None) -> Dict:
+        """返回與 aggregate_records 相同結構的總和，titles 為 None 時返回全部分組"""
+        groups = self.groups[kind]
+        if titles is not None:
+            groups = {title: groups[title] for title in titles if title in groups}
+
+        group_data = {}
+        for title, group in groups.items():
+            if group['charted'] > 0:
+                group_data[title] = group['sums']
+        return group_data
+
+    def save(self):
+        """原子寫入彙總表"""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'options': self._options(),
+                       'records': self.records, 'digest': f"{self.digest:016x}", 'groups': self.groups},
+                      f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+class RollupMaintainer:
+    """讓賬本在寫入記錄的同時維護圖表彙總表
+
+    子類別以 _apply 實作實際的寫入；apply 先取出被覆蓋或刪除的舊記錄，
+    寫入後對彙總表套用增量並保存，與更新插入、刪除在同一個呼叫中完成。
+    """
+
+    rollups = None
+
+    def digest(self) -> int:
+        """目前所有記錄的摘要，見 ledger_digest"""
+        return ledger_digest(self._hash_items())
+
+    def attach_rollups(self, rollups: 'ChartRollups') -> 'ChartRollups':
+        """掛上彙總表，之後每次 apply 都會更新它；摘要與賬本不符時先從賬本重建"""
+        if rollups.digest != self.digest():
+            print("重建圖表彙總表...")
+            rollups.reset()
+            rollups.apply(added=self.iter_records())
+            rollups.save()
+        self.rollups = rollups
+        return rollups
+
+    def apply(self, upserts: Iterable[Dict] = (), deletes: Iterable[str] = ()):
+        """刪除與更新插入記錄，並對掛上的彙總表套用相同的變更"""
+        upserts = list(upserts)
+        deletes = list(deletes)
+        if self.rollups is None:
+            self._apply(upserts, deletes)
+            return
+        old_records = self.get_many([record['page_id'] for record in upserts] + deletes)
+        self._apply(upserts, deletes)
+        self.rollups.apply(removed=list(old_records.values()), added=upserts)
+        self.rollups.save()
+
+
+class GroupIndex:
+    """事件 / 月份（標題或 relation 頁面 ID）到 page_id 的倒排索引
+
+    記錄寫入或刪除時同步更新，取出受影響分組的記錄只需查表，
+    不需要掃描或序列化整個賬本。
+    """
+
+    def __init__(self):
+        self._pages = defaultdict(set)  # 鍵 -> page_id 集合
+        self._keys = {}  # page_id -> 該記錄的鍵
+
+    def set(self, page_id: str, keys: Iterable[str]):
+        """設定記錄的分組鍵（取代舊的鍵）"""
+        self.remove(page_id)
+        keys = tuple(keys)
+        self._keys[page_id] = keys
+        for key in keys:
+            self._pages[key].add(page_id)
+
+    def add_record(self, record: Dict):
+        self.set(record['page_id'], record_group_keys(record))
+
+    def remove(self, page_id: str):
+        for key in self._keys.pop(page_id, ()):
+            pages = self._pages[key]
+            pages.discard(page_id)
+            if not pages:
+                del self._pages[key]
+
+    def keys_for(self, page_id: str) -> tuple:
+        return self._keys.get(page_id, ())
+
+    def page_ids_for(self, keys: Iterable[str]) -> Set[str]:
+        """返回屬於任一分組鍵的 page_id"""
+        page_ids = set()
+        for key in keys:
+            page_ids |= self._pages.get(key, set())
+        return page_ids
+
+
+class JsonLedgerStore(RollupMaintainer):
+    """以單一 JSON 文件保存賬戶記錄（舊格式）
+
+    每次寫入都會重寫整個文件，僅作為相容用途；介面與 SqliteLedgerStore 相同。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records = None  # page_id -> 記錄，第一次使用時才載入
+        self._groups = GroupIndex()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._records is None:
+            records = []
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    records = json.load(f)
+            self._records = {record.get('page_id'): record for record in records}
+            self._groups = GroupIndex()
+            for record in records:
+                self._groups.add_record(record)
+        return self._records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._records = None
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __contains__(self, page_id: str) -> bool:
+        return page_id in self._load()
+
+    def get(self, page_id: str) -> Dict:
+        return self._load().get(page_id)
+
+    def content_hash(self, page_id: str) -> str:
+        """記錄保存的內容雜湊，記錄不存在或沒有雜湊時返回 None"""
+        record = self._load().get(page_id)
+        return record.get(CONTENT_HASH_KEY) if record else None
+
+    def get_many(self, page_ids: Iterable[str]) -> Dict[str, Dict]:
+        records = self._load()
+        return {page_id: records[page_id] for page_id in page_ids if page_id in records}
+
+    def page_ids(self) -> Set[str]:
+        return set(self._load())
+
+    def iter_records(self) -> Iterator[Dict]:
+        return iter(list(self._load().values()))
+
+    def records_for_groups(self, keys: Iterable[str]) -> List[Dict]:
+        """以分組索引取出屬於指定事件或月份（標題或 relation 頁面 ID）的記錄"""
+        records = self._load()
+        return [records[page_id] for page_id in sorted(self._groups.page_ids_for(keys))]
+
+    def _hash_items(self) -> Iterator[Tuple[str, str]]:
+        return ((page_id, record.get(CONTENT_HASH_KEY)) for page_id, record in self._load().items())
+
+    def _apply(self, upserts: List[Dict], deletes: List[str]):
+        """更新插入與刪除記錄後重寫整個文件"""
+        records = self._load()
+        for page_id in deletes:
+            records.pop(page_id, None)
+            self._groups.remove(page_id)
+        for record in upserts:
+            records[record['page_id']] = record
+            self._groups.add_record(record)
+
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(records.values()), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def upsert_many(self, records: Iterable[Dict]):
+        self.apply(upserts=records)
+
+    def delete_many(self, page_ids: Iterable[str]):
+        self.apply(deletes=page_ids)
+
+
+class SqliteLedgerStore(RollupMaintainer):
+    """以 SQLite 保存賬戶記錄
+
+    以 page_id 為主鍵更新插入，事件、月份、日期、類別與付款人各有索引，
+    批次寫入在單一交易中完成。啟動與同步的成本只與變更量有關，
+    不需要載入整個賬本。
+    """
+
+    _SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS records (
+            page_id TEXT PRIMARY KEY,
+            event TEXT,
+            month TEXT,
+            event_id TEXT,
+            month_id TEXT,
+            date TEXT,
+            category TEXT,
+            attribute TEXT,
+            person TEXT,
+            amount REAL,
+            content_hash TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_event ON records(event);
+        CREATE INDEX IF NOT EXISTS idx_records_month ON records(month);
+        CREATE INDEX IF NOT EXISTS idx_records_date ON records(date);
+        CREATE INDEX IF NOT EXISTS idx_records_category ON records(category);
+        CREATE INDEX IF NOT EXISTS idx_records_person ON records(person);
+    '''
+
+    _UPSERT = '''
+        INSERT INTO records (page_id, event, month, event_id, month_id, date, category, attribute, person,
+                             amount, content_hash, data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(page_id) DO UPDATE SET
+            event = excluded.event,
+            month = excluded.month,
+            event_id = excluded.event_id,
+            month_id = excluded.month_id,
+            date = excluded.date,
+            category = excluded.category,
+            attribute = excluded.attribute,
+            person = excluded.person,
+            amount = excluded.amount,
+            content_hash = excluded.content_hash,
+            data = excluded.data
+    '''
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 數據庫文件路徑
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._upgrade_schema()
+        self.conn.executescript(self._SCHEMA)
+        self.conn.executescript('''
+            CREATE INDEX IF NOT EXISTS idx_records_event_id ON records(event_id);
+            CREATE INDEX IF NOT EXISTS idx_records_month_id ON records(month_id);
+        ''')
+
+    # 後來加入的欄位與回填用的表達式
+    _ADDED_COLUMNS = {
+        'event_id': f'''json_extract(data, '$."{EVENT_PROPERTY}".id')''',
+        'month_id': f'''json_extract(data, '$."{MONTH_PROPERTY}".id')''',
+        'content_hash': f"json_extract(data, '$.{CONTENT_HASH_KEY}')",
+    }
+
+    def _upgrade_schema(self):
+        """為舊版數據庫補上後來加入的欄位並從記錄中回填"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(records)')}
+        if not columns:
+            return
+        with self.conn:
+            for column, expression in self._ADDED_COLUMNS.items():
+                if column not in columns:
+                    self.conn.execute(f'ALTER TABLE records ADD COLUMN {column} TEXT')
+                    self.conn.execute(f'UPDATE records SET {column} = {expression}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    @staticmethod
+    def _row(record: Dict) -> tuple:
+        """把記錄轉為資料表的一列，索引欄位取自記錄本身"""
+        amount = record.get('支出NTD')
+        if isinstance(amount, dict):
+            amount = amount.get('number')
+        return (
+            record['page_id'],
+            _title(record.get(EVENT_PROPERTY)),
+            _title(record.get(MONTH_PROPERTY)),
+            _relation_id(record.get(EVENT_PROPERTY)),
+            _relation_id(record.get(MONTH_PROPERTY)),
+            record.get('日期') or None,
+            _title(record.get('類別')),
+            _title(record.get('屬性')),
+            _title(record.get('廷 | 雰')),
+            amount if isinstance(amount, (int, float)) else None,
+            record.get(CONTENT_HASH_KEY),
+            json.dumps(record, ensure_ascii=False),
+        )
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def __contains__(self, page_id: str) -> bool:
+        return self.conn.execute(
+            'SELECT 1 FROM records WHERE page_id = ?', (page_id,)
+        ).fetchone() is not None
+
+    def get(self, page_id: str) -> Dict:
+        row = self.conn.execute('SELECT data FROM records WHERE page_id = ?', (page_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def content_hash(self, page_id: str) -> str:
+        """記錄保存的內容雜湊（不解析記錄），記錄不存在或沒有雜湊時返回 None"""
+        row = self.conn.execute('SELECT content_hash FROM records WHERE page_id = ?', (page_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, page_ids: Iterable[str]) -> Dict[str, Dict]:
+        rows = self.conn.execute(
+            'SELECT page_id, data FROM records WHERE page_id IN (SELECT value FROM json_each(?))',
+            (json.dumps(list(page_ids)),)
+        )
+        return {page_id: json.loads(data) for page_id, data in rows}
+
+    def page_ids(self) -> Set[str]:
+        return {row[0] for row in self.conn.execute('SELECT page_id FROM records')}
+
+    def iter_records(self) -> Iterator[Dict]:
+        """按寫入順序逐條讀取所有記錄"""
+        for (data,) in self.conn.execute('SELECT data FROM records ORDER BY rowid'):
+            yield json.loads(data)
+
+    def records_for_groups(self, keys: Iterable[str]) -> List[Dict]:
+        """以索引取出屬於指定事件或月份（標題或 relation 頁面 ID）的記錄"""
+        keys = json.dumps(list(keys), ensure_ascii=False)
+        rows = self.conn.execute(
+            '''SELECT data FROM records
+               WHERE event IN (SELECT value FROM json_each(?1))
+                  OR month IN (SELECT value FROM json_each(?1))
+                  OR event_id IN (SELECT value FROM json_each(?1))
+                  OR month_id IN (SELECT value FROM json_each(?1))
+               ORDER BY rowid''',
+            (keys,)
+        )
+        return [json.loads(data) for (data,) in rows]
+
+    def _hash_items(self) -> Iterator[Tuple[str, str]]:
+        return iter(self.conn.execute('SELECT page_id, content_hash FROM records'))
+
+    def _apply(self, upserts: List[Dict], deletes: List[str]):
+        """在單一交易中刪除與更新插入記錄"""
+        with self.conn:
+            self.conn.executemany('DELETE FROM records WHERE page_id = ?',
+                                  ((page_id,) for page_id in deletes))
+            self.conn.executemany(self._UPSERT, (self._row(record) for record in upserts))
+
+    def upsert_many(self, records: Iterable[Dict]):
+        self.apply(upserts=records)
+
+    def delete_many(self, page_ids: Iterable[str]):
+        self.apply(deletes=page_ids)
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """從 full_account_data.json 一次性匯入記錄（數據庫已有記錄時不動作）
+
+        Returns:
+            int: 匯入的記錄數
+        """
+        if len(self) or not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        self.upsert_many(records)
+        print(f"已從 {json_path} 匯入 {len(records)} 條記錄到 {self.path}")
+        return len(records)
+
+
+class SegmentLedgerStore(RollupMaintainer):
+    """以只追加的 JSONL 分段文件保存賬戶記錄
+
+    每次寫入產生一個新的分段文件：每行一條記錄（或刪除標記），
+    最後一行是 page_id → 行偏移量與分組鍵的索引。開啟時只讀取各分段的索引，
+    讀取記錄時直接定位到該行；寫入 n 條記錄的成本是 O(n)。
+    同一 page_id 以編號較大的分段為準，compact() 會合併分段並丟棄舊版本，
+    分段數達到 compact_threshold 時寫入後自動合併。
+    沒有索引行的分段視為寫入中斷，讀取時忽略。
+    """
+
+    SEGMENT_PREFIX = 'segment-'
+    SEGMENT_SUFFIX = '.jsonl'
+    FOOTER_KEY = '__footer__'
+
+    def __init__(self, directory: str, compact_threshold: int = 16):
+        """
+        Args:
+            directory: 分段文件所在目錄
+            compact_threshold: maybe_compact() 觸發合併的分段數
+        """
+        self.directory = directory
+        self.compact_threshold = compact_threshold
+        os.makedirs(directory, exist_ok=True)
+        self._segments = []  # 依編號排序的有效分段文件名
+        self._index = {}  # page_id -> (分段文件名, 行偏移量)
+        self._groups = GroupIndex()
+        self._hashes = {}  # page_id -> 內容雜湊
+        self._load_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+    def _path(self, segment: str) -> str:
+        return os.path.join(self.directory, segment)
+
+    def _segment_name(self, number: int) -> str:
+        return f"{self.SEGMENT_PREFIX}{number:06d}{self.SEGMENT_SUFFIX}"
+
+    def _next_segment(self) -> str:
+        last = self._segments[-1] if self._segments else self._segment_name(0)
+        number = int(last[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)])
+        return self._segment_name(number + 1)
+
+    @classmethod
+    def _read_footer(cls, path: str) -> Dict:
+        """從文件尾端往回讀取最後一行的索引，沒有有效索引時返回 None"""
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            tail = b''
+            position = end
+            while position > 0:
+                step = min(65536, position)
+                position -= step
+                f.seek(position)
+                tail = f.read(step) + tail
+                # 最後一個字元是行尾換行，再往前找到上一個換行即為索引行
+                if tail.rfind(b'\n', 0, len(tail) - 1) >= 0:
+                    break
+        line = tail[tail.rfind(b'\n', 0, len(tail) - 1) + 1:]
+        try:
+            footer = json.loads(line)
+        except ValueError:
+            return None
+        return footer.get(cls.FOOTER_KEY) if isinstance(footer, dict) else None
+
+    def _load_index(self):
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX))
+        for name in names:
+            footer = self._read_footer(self._path(name))
+            if footer is None:
+                print(f"忽略不完整的分段文件: {name}")
+                continue
+            self._segments.append(name)
+            for page_id in footer.get('deleted', []):
+                self._index.pop(page_id, None)
+                self._groups.remove(page_id)
+                self._hashes.pop(page_id, None)
+            groups = footer.get('groups')
+            hashes = footer.get('hashes')
+            for page_id, offset in footer.get('index', {}).items():
+                self._index[page_id] = (name, offset)
+                if groups is None or hashes is None:
+                    # 早期的分段沒有保存分組鍵與雜湊，讀取該行重建
+                    record = self._read_at(name, offset)
+                    keys, content_hash = record_group_keys(record), record.get(CONTENT_HASH_KEY)
+                else:
+                    keys, content_hash = groups.get(page_id, ()), hashes.get(page_id)
+                self._groups.set(page_id, keys)
+                self._hashes[page_id] = content_hash
+
+    def _write_segment(self, segment: str, upserts: Iterable[Dict], deletes: Iterable[str]) -> Dict:
+        """寫入一個分段文件，返回其索引；先寫暫存文件，完成後再改名"""
+        index = {}
+        groups = {}
+        hashes = {}
+        deleted = []
+        temp_path = f"{self._path(segment)}.tmp"
+        with open(temp_path, 'wb') as f:
+            for page_id in deletes:
+                deleted.append(page_id)
+                f.write(json.dumps({'page_id': page_id, 'deleted': True}, ensure_ascii=False).encode('utf-8') + b'\n')
+            for record in upserts:
+                index[record['page_id']] = f.tell()
+                groups[record['page_id']] = record_group_keys(record)
+                hashes[record['page_id']] = record.get(CONTENT_HASH_KEY)
+                f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+            footer = {self.FOOTER_KEY: {
+                'count': len(index), 'index': index, 'groups': groups, 'hashes': hashes,
+                'deleted': deleted,
+            }}
+            f.write(json.dumps(footer, ensure_ascii=False).encode('utf-8') + b'\n')
+        os.replace(temp_path, self._path(segment))
+        return footer[self.FOOTER_KEY]
+
+    def _read_at(self, segment: str, offset: int) -> Dict:
+        with open(self._path(segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, page_id: str) -> bool:
+        return page_id in self._index
+
+    def get(self, page_id: str) -> Dict:
+        location = self._index.get(page_id)
+        return self._read_at(*location) if location else None
+
+    def content_hash(self, page_id: str) -> str:
+        """記錄保存的內容雜湊（從索引讀取，不讀文件）"""
+        return self._hashes.get(page_id)
+
+    def get_many(self, page_ids: Iterable[str]) -> Dict[str, Dict]:
+        return {page_id: self.get(page_id) for page_id in page_ids if page_id in self._index}
+
+    def page_ids(self) -> Set[str]:
+        return set(self._index)
+
+    def iter_records(self) -> Iterator[Dict]:
+        """逐個分段串流讀取目前有效的記錄，不會一次載入所有記錄"""
+        for segment in list(self._segments):
+            with open(self._path(segment), 'rb') as f:
+                while True:
+                    offset = f.tell()
+                    line = f.readline()
+                    if not line:
+                        break
+                    record = json.loads(line)
+                    page_id = record.get('page_id')
+                    if page_id is not None and self._index.get(page_id) == (segment, offset):
+                        yield record
+
+    def records_for_groups(self, keys: Iterable[str]) -> List[Dict]:
+        """以分組索引定位記錄，按分段與偏移量順序讀取"""
+        locations = sorted(self._index[page_id] for page_id in self._groups.page_ids_for(keys))
+        records = []
+        handle = None
+        current = None
+        try:
+            for segment, offset in locations:
+                if segment != current:
+                    if handle is not None:
+                        handle.close()
+                    handle = open(self._path(segment), 'rb')
+                    current = segment
+                handle.seek(offset)
+                records.append(json.loads(handle.readline()))
+        finally:
+            if handle is not None:
+                handle.close()
+        return records
+
+    def _hash_items(self) -> Iterator[Tuple[str, str]]:
+        return iter(list(self._hashes.items()))
+
+    def _apply(self, upserts: List[Dict], deletes: List[str]):
+        """把變更寫成一個新的分段文件，分段數達到上限時順便合併"""
+        deletes = [page_id for page_id in deletes if page_id in self._index]
+        if not upserts and not deletes:
+            return
+
+        segment = self._next_segment()
+        footer = self._write_segment(segment, upserts, deletes)
+        self._segments.append(segment)
+        for page_id in deletes:
+            self._index.pop(page_id, None)
+            self._groups.remove(page_id)
+            self._hashes.pop(page_id, None)
+        for page_id, offset in footer['index'].items():
+            self._index[page_id] = (segment, offset)
+            self._groups.set(page_id, footer['groups'][page_id])
+            self._hashes[page_id] = footer['hashes'][page_id]
+        self.maybe_compact()
+
+    def upsert_many(self, records: Iterable[Dict]):
+        self.apply(upserts=records)
+
+    def delete_many(self, page_ids: Iterable[str]):
+        self.apply(deletes=page_ids)
+
+    def compact(self):
+        """把所有分段合併成一個，只保留每個 page_id 的最新版本"""
+        if len(self._segments) <= 1:
+            return
+
+        old_segments = list(self._segments)
+        segment = self._next_segment()
+        footer = self._write_segment(segment, self.iter_records(), ())
+        self._segments = [segment]
+        self._index = {page_id: (segment, offset) for page_id, offset in footer['index'].items()}
+        for name in old_segments:
+            os.remove(self._path(name))
+        print(f"已合併 {len(old_segments)} 個分段，共 {len(self._index)} 條記錄")
+
+    def maybe_compact(self):
+        """分段數達到 compact_threshold 時合併"""
+        if len(self._segments) >= self.compact_threshold:
+            self.compact()
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """從 full_account_data.json 一次性匯入記錄（已有記錄時不動作）"""
+        if self._segments or not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        self.upsert_many(records)
+        print(f"已從 {json_path} 匯入 {len(records)} 條記錄到 {self.directory}")
+        return len(records)
@@ -1,9 +1,17 @@
 from notion.api import NotionAPI
+from notion.async_api import AsyncNotionAPI
+from notion.extractors import ColumnarBatchExtractor
+from ledger_store import (JsonLedgerStore, SqliteLedgerStore, SegmentLedgerStore, ChartRollups, record_group_titles,
+                          record_hash, stamp_record_hashes, ledger_high_water_mark, valid_chart_options, CHART_FIELDS,
+                          CONTENT_HASH_KEY, CHART_HASH_KEY, EDITED_TIME_KEY, SHARED_SPLIT_WEIGHTS)
+from notion.handlers import NotionAPIError
+import asyncio
 import json
 import time
 import os
 import csv
 from datetime import datetime
+from itertools import islice
 from secrets import NOTION_TOKEN
 
 # 目錄常量
@@ -19,6 +27,53 @@ config = {
     "event": '85771a19b13941d9a3d9a8507c5d5345',
     "month": '0462f8e33dbe4635a266165e40e3527b',
 }
+
+# 是否使用 asyncio 客戶端並行發送請求（需要安裝 aiohttp）
+USE_ASYNC_CLIENT = False
+
+# 同步時預先請求的批數（每批 100 條），0 表示不預取
+PREFETCH_DEPTH = 2
+
+# 同步模式：
+#   'incremental' - 依 last_edited_time 高水位增量同步，處理新增、編輯與封存
+#   'head'        - 只獲取新增記錄，遇到第一筆已存在的 page_id 即停止
+SYNC_MODE = 'incremental'
+SYNC_STATE_PATH = os.path.join(BASE_DATA_DIR, 'sync_state.json')
+# 增量查詢看不到刪除，每隔這麼多小時完整掃描一次 page_id 以移除已刪除的記錄，0 表示不核對
+RECONCILE_INTERVAL_HOURS = 24
+
+# 本地賬本存放方式：
+#   'sqlite'   - data/ledger.db，以 page_id 更新插入，首次使用時自動匯入 full_account_data.json
+#   'segments' - data/ledger_segments/ 下只追加的 JSONL 分段文件，定期合併
+#   'json'     - 舊格式，每次同步重寫整個 full_account_data.json
+LEDGER_BACKEND = 'sqlite'
+LEDGER_DB_PATH = os.path.join(BASE_DATA_DIR, 'ledger.db')
+LEDGER_SEGMENT_DIR = os.path.join(BASE_DATA_DIR, 'ledger_segments')
+# 圖表彙總表，賬本寫入記錄時同步維護（需要先有 select_color.json）
+CHART_ROLLUP_PATH = os.path.join(BASE_DATA_DIR, 'chart_rollups.json')
+
+# 同步後寫出的列式快照（每列一個 .npy），ChartManager 以 mmap 開啟繪製完整圖表。
+# 每次同步都要重新編碼整個賬本，而繪圖時優先讀取圖表彙總表，只有停用彙總表
+# （Config.USE_ROLLUPS=False）時快照才會被用到，因此預設不寫出
+WRITE_LEDGER_SNAPSHOT = False
+LEDGER_SNAPSHOT_DIR = os.path.join(BASE_DATA_DIR, 'ledger_snapshot')
+FULL_DATA_PATH = os.path.join(BASE_DATA_DIR, 'full_account_data.json')
+AFFECTED_DATA_PATH = os.path.join(BASE_DATA_DIR, 'affected_charts_data.json')
+
+# 數據庫結構快取（與 select_color.json 放在一起）
+SCHEMA_CACHE_PATH = os.path.join(BASE_DATA_DIR, 'schema_cache.json')
+
+# 圖片內容雜湊 → Imgur URL 對照表，相同內容的圖表不會重複上傳
+IMGUR_CACHE_PATH = os.path.join(BASE_IMAGE_DIR, 'imgur_hashes.json')
+
+# 圖表渲染模式：
+#   'memory' - 渲染到記憶體後直接上傳並寫入圖片記錄，不需要重新掃描目錄
+#   'disk'   - 保存 PNG 文件後再由 scan_image_records 掃描上傳
+CHART_RENDER_MODE = 'memory'
+# memory 模式下是否同時保存 PNG 到 data/image（唯讀或 tmpfs 環境可關閉）
+SAVE_CHART_FILES = True
+# 並行渲染圖表的進程數，0 表示在主進程中依序渲染（多核環境且圖表很多時再開啟）
+CHART_RENDER_WORKERS = 0
 # ============= 工具函數 =============
 def time_it(func):
     """計時裝飾器"""
@@ -146,83 +201,31 @@ def get_database_properties(notion: NotionAPI, database_id: str):
 
 @time_it
 def get_event_pages(notion: NotionAPI, database_id: str, specific_props: list = None, limit: int = None):
-    """獲取數據庫中的頁面屬性"""
+    """獲取數據庫中的頁面屬性（邊獲取邊格式化，不保留原始頁面）"""
     query_start = time.time()
     page_size = min(100, limit) if limit else 100  # Notion API 限制每次最多 100 條
     
-    results = []
-    has_more = True
-    next_cursor = None
-    total_fetched = 0
-    
-    while has_more and (limit is None or total_fetched < limit):
-        print(f"正在獲取第 {total_fetched + 1} - {min(total_fetched + page_size, limit if limit else float('inf'))} 條記錄...")
-        
-        response = notion.query_database(
-            database_id=database_id,
-            page_size=page_size,
-            start_cursor=next_cursor
-        )
-        
-        if not response:
-            break
-            
-        batch_results = response.get('results', [])
-        remaining = limit - total_fetched if limit else None
-        
-        if remaining is not None and remaining < len(batch_results):
-            batch_results = batch_results[:remaining]
-            
-        results.extend(batch_results)
-        total_fetched += len(batch_results)
-        
-        has_more = response.get('has_more', False)
-        next_cursor = response.get('next_cursor')
-        
-        print(f"已獲取 {total_fetched} 條記錄")
-        print(f"是否還有更多: {has_more}")
-        print(f"下一頁游標: {next_cursor}")
-        
-        if limit and total_fetched >= limit:
-            print(f"已達到限制數量 {limit}，停止獲取")
-            break
+    records = notion.iter_query_database(
+        database_id=database_id,
+        page_size=page_size,
+        property_list=specific_props,
+        formatted=True,
+        filter_properties=specific_props,
+        formatter=notion.compile_page_formatter(database_id, specific_props)
+    )
+    pages_data = list(islice(records, limit))
     
     query_end = time.time()
     print(f"\n查詢統計:")
-    print(f"總獲取記錄數: {total_fetched}")
-    print(f"查詢耗時: {query_end - query_start:.2f} 秒")
-    
-    if not results:
-        return []
-        
-    pages_data = []
-    total_props_time = 0
-    
-    for page in results:
-        page_id = page['id']
-        prop_start = time.time()
-        props = notion.get_formatted_page_properties(
-            page_id,
-            specific_props,
-            raw_page_data=page
-        )
-        prop_end = time.time()
-        
-        prop_time = prop_end - prop_start
-        total_props_time += prop_time
-        
-        props['page_id'] = page_id
-        pages_data.append(props)
-        
-    print(f"屬性處理總時間: {total_props_time:.2f} 秒")
-    print(f"平均每條記錄處理時間: {total_props_time/len(pages_data):.2f} 秒")
+    print(f"總獲取記錄數: {len(pages_data)}")
+    print(f"查詢與處理耗時: {query_end - query_start:.2f} 秒")
     
     return pages_data
 
 def get_select_colors(notion: NotionAPI, database_id: str):
     """獲取數據庫中所有 select 類型屬性的所有可能選項及其顏色"""
-    # 獲取數據庫屬性
-    properties = notion.get_database_properties(database_id)
+    # 獲取數據庫屬性（完整結構來自快取，不重複請求）
+    properties = notion.get_database_schema(database_id).get('properties', {})
     
     # 打印調試信息
     print("\n數據庫屬性：")
@@ -279,7 +282,8 @@ def save_select_options(notion: NotionAPI, database_id: str, load_from_file: boo
             return json.load(f)
 
     print("\n=== 獲取 Select 選項信息 ===")
-    select_options = notion.get_database_select_options(database_id)
+    # 不讀文件時表示要取得最新的選項，略過結構快取（TTL 內新增的選項才不會遺漏）
+    select_options = notion.get_database_select_options(database_id, force_refresh=True)
     
     # 打印調試信息
     print("\n選項信息：")
@@ -295,7 +299,26 @@ def save_select_options(notion: NotionAPI, database_id: str, load_from_file: boo
     print(f"\n選項信息已保存到 {json_path}")
     return select_options
 
-def get_relation_table(notion: NotionAPI, load_from_file: bool = True):
+async def get_event_pages_async(api: AsyncNotionAPI, database_id: str, specific_props: list = None) -> list:
+    """異步獲取數據庫中的頁面屬性，返回格式同 get_event_pages"""
+    pages = await api.query_database_all(database_id, filter_properties=specific_props)
+    pages_data = []
+    for page in pages:
+        props = await api.get_formatted_page_properties(page['id'], specific_props, raw_page_data=page)
+        props['page_id'] = page['id']
+        pages_data.append(props)
+    return pages_data
+
+async def fetch_relation_pages_async(notion: NotionAPI) -> tuple:
+    """並行獲取事件與月份數據庫的頁面（與同步客戶端共用速率限制）"""
+    async with AsyncNotionAPI(config['token'], rate_limiter=notion.rate_limiter,
+                              imgur_uploader=notion.imgur_uploader) as api:
+        return await asyncio.gather(
+            get_event_pages_async(api, config['event'], ['Title', 'Date']),
+            get_event_pages_async(api, config['month'], ['月份']),
+        )
+
+def get_relation_table(notion: NotionAPI, load_from_file: bool = True, use_async: bool = None):
     """獲取並保存關聯表"""
     # 確保目錄存在
     os.makedirs(BASE_DATA_DIR, exist_ok=True)
@@ -305,21 +328,28 @@ def get_relation_table(notion: NotionAPI, load_from_file: bool = True):
         with open(json_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     
-    relation_table = {}
+    if use_async is None:
+        use_async = USE_ASYNC_CLIENT
     
-    # 獲取事件數據庫的頁面
-    event_pages = get_event_pages(
-        notion,
-        database_id=config['event'],
-        specific_props=['Title', 'Date']
-    )
+    relation_table = {}
     
-    # 獲取月份數據庫的頁面
-    month_pages = get_event_pages(
-        notion,
-        database_id=config['month'],
-        specific_props=['月份']
-    )
+    if use_async:
+        # 同時獲取事件與月份數據庫的頁面
+        event_pages, month_pages = asyncio.run(fetch_relation_pages_async(notion))
+    else:
+        # 獲取事件數據庫的頁面
+        event_pages = get_event_pages(
+            notion,
+            database_id=config['event'],
+            specific_props=['Title', 'Date']
+        )
+        
+        # 獲取月份數據庫的頁面
+        month_pages = get_event_pages(
+            notion,
+            database_id=config['month'],
+            specific_props=['月份']
+        )
     
     # 處理事件頁面
     for page in event_pages:
@@ -459,8 +489,12 @@ def save_records(records: dict, csv_path: str):
                 record['upload_notion_time']
             ])
 
-def process_file(file_name: str, file_path: str, records: dict, notion: NotionAPI, bypass_imgur: bool):
-    """處理單個文件的更新檢查和上傳"""
+def process_file(file_name: str, file_path: str, records: dict) -> tuple:
+    """檢查單個文件是否需要上傳
+    
+    Returns:
+        tuple: (是否需要上傳, 記錄是否有變更, 文件的修改時間)
+    """
     current_time = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
     record = records.get(file_name)
 
@@ -494,27 +528,38 @@ def process_file(file_name: str, file_path: str, records: dict, notion: NotionAP
             need_upload = True
             need_save = True
 
-    if need_upload and not bypass_imgur:
-        try:
-            imgur_url = notion.upload_to_imgur(file_path)
-            if imgur_url:
-                records[file_name].update({
-                    'url': imgur_url,
-                    'modification_time': current_time,
-                    'full_path': file_path
-                })
-                print(f"✓ {file_name}: {imgur_url}")
-                need_save = True  # 確保有新的 URL 時一定會保存
-            else:
-                print(f"✗ 上傳 {file_name} 到 Imgur 失敗")
-        except Exception as e:
-            print(f"✗ 上傳 {file_name} 到 Imgur 失敗: {str(e)}")
+    return need_upload, need_save, current_time
+
+def upload_pending_files(pending: dict, records: dict, notion: NotionAPI) -> bool:
+    """並行上傳待上傳的文件並更新記錄
     
-    if need_save:
-        save_records(records, os.path.join(BASE_IMAGE_DIR, 'image_records.csv'))
+    Args:
+        pending: {文件名: (文件路徑, 修改時間)}
+        
+    Returns:
+        bool: 是否有任何記錄取得新的 URL
+    """
+    urls = notion.upload_many_to_imgur({
+        file_name: file_path for file_name, (file_path, _) in pending.items()
+    })
+    
+    updated = False
+    for file_name, imgur_url in urls.items():
+        if not imgur_url:
+            print(f"✗ 上傳 {file_name} 到 Imgur 失敗")
+            continue
+        file_path, current_time = pending[file_name]
+        records[file_name].update({
+            'url': imgur_url,
+            'modification_time': current_time,
+            'full_path': file_path
+        })
+        print(f"✓ {file_name}: {imgur_url}")
+        updated = True
+    return updated
 
 def scan_image_records(notion: NotionAPI, bypass_imgur: bool = False):
-    """掃描圖片記錄並上傳到 Imgur"""
+    """掃描圖片記錄並上傳到 Imgur（並行上傳，內容未變的圖片直接沿用已記錄的 URL）"""
     print("\n掃描並更新圖片記錄...")
     
     try:
@@ -528,10 +573,21 @@ def scan_image_records(notion: NotionAPI, bypass_imgur: bool = False):
         # 讀取現有記錄
         records = read_image_records(csv_path)
         
-        # 收集並處理所有 PNG 文件
+        # 收集並檢查所有 PNG 文件
         png_files = collect_png_files()
+        pending = {}
+        need_save = False
         for file_name, file_path in png_files.items():
-            process_file(file_name, file_path, records, notion, bypass_imgur)
+            need_upload, changed, current_time = process_file(file_name, file_path, records)
+            need_save = need_save or changed
+            if need_upload:
+                pending[file_name] = (file_path, current_time)
+        
+        if pending and not bypass_imgur:
+            need_save = upload_pending_files(pending, records, notion) or need_save
+        
+        if need_save:
+            save_records(records, csv_path)
         
         return True
         
@@ -539,14 +595,57 @@ def scan_image_records(notion: NotionAPI, bypass_imgur: bool = False):
         print(f"✗ 掃描圖片記錄時發生錯誤: {str(e)}")
         return False
 
+def upload_rendered_charts(notion: NotionAPI, rendered: dict, bypass_imgur: bool = False):
+    """直接上傳記憶體中的圖表並更新圖片記錄，不重新掃描、讀取磁碟上的文件
+    
+    Args:
+        rendered: {文件名: {'data': PNG bytes, 'path': 磁碟副本路徑或 None}}
+    """
+    print(f"\n上傳 {len(rendered)} 張記憶體中的圖表...")
+    
+    os.makedirs(BASE_IMAGE_DIR, exist_ok=True)
+    csv_path = os.path.join(BASE_IMAGE_DIR, 'image_records.csv')
+    records = read_image_records(csv_path)
+    
+    pending = {}
+    for file_name, chart in rendered.items():
+        path = chart['path']
+        # 有磁碟副本時記錄其修改時間，下次 scan_image_records 才不會誤判為已修改
+        mtime = os.path.getmtime(path) if path else time.time()
+        current_time = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
+        
+        record = records.setdefault(file_name, {
+            'file_name': file_name,
+            'full_path': path or '',
+            'modification_time': current_time,
+            'url': '',
+            'upload_notion_time': ''
+        })
+        record['full_path'] = path or ''
+        pending[file_name] = (chart['data'], current_time)
+    
+    if not bypass_imgur:
+        urls = notion.upload_many_to_imgur({
+            file_name: data for file_name, (data, _) in pending.items()
+        })
+        for file_name, imgur_url in urls.items():
+            if not imgur_url:
+                print(f"✗ 上傳 {file_name} 到 Imgur 失敗")
+                continue
+            record = records[file_name]
+            # 內容與上次相同時 URL 不變，保留原修改時間以免重複更新 Notion 頁面
+            if imgur_url != record['url']:
+                record.update({'url': imgur_url, 'modification_time': pending[file_name][1]})
+                print(f"✓ {file_name}: {imgur_url}")
+    
+    save_records(records, csv_path)
+
 # ============= Notion 圖片上傳相關類和函數 =============
 class NotionImageUploader:
     """處理 Notion 圖片上傳的類"""
     
-    def __init__(self, notion_api, max_retries=5, retry_delay=30):
+    def __init__(self, notion_api):
         self.notion = notion_api
-        self.max_retries = max_retries
-        self.retry_delay = retry_delay
         
         # 確保目錄和 CSV 文件存在
         os.makedirs(BASE_IMAGE_DIR, exist_ok=True)
@@ -555,7 +654,10 @@ class NotionImageUploader:
             create_image_record(csv_path)
         
     def upload_with_retry(self, file_path: str) -> str:
-        """嘗試上傳圖片到 Imgur，帶重試機制
+        """上傳圖片到 Imgur
+        
+        重試與等待由上傳服務依 Imgur 的速率限制標頭與 Retry-After 處理，
+        相同內容的圖片會直接返回已記錄的 URL。
         
         Args:
             file_path: 圖片文件路徑
@@ -566,19 +668,11 @@ class NotionImageUploader:
         Raises:
             Exception: 上傳失敗時拋出異常
         """
-        retries_left = self.max_retries
-        
-        while retries_left > 0:
-            try:
-                print(f"嘗試上傳 {file_path}（剩餘重試次數：{retries_left}）")
-                return self.notion.upload_to_imgur(file_path)
-            except Exception as e:
-                retries_left -= 1
-                if "Too Many Requests" in str(e) and retries_left > 0:
-                    print(f"遇到請求限制，等待 {self.retry_delay} 秒後重試...")
-                    time.sleep(self.retry_delay)
-                else:
-                    raise Exception(f"上傳失敗：{str(e)}")
+        print(f"上傳 {file_path}")
+        try:
+            return self.notion.upload_to_imgur(file_path)
+        except Exception as e:
+            raise Exception(f"上傳失敗：{str(e)}")
     
     def get_graph_paths(self, event_name: str) -> dict:
         """獲取事件相關的圖表文件路徑，並確保目錄存在
@@ -688,9 +782,6 @@ class NotionImageUploader:
                         print(f"✗ {prop_name}")
                         success = False
                     
-                    # 添加延遲，避免連續請求
-                    time.sleep(5)
-                    
                 except Exception as e:
                     print(f"✗ {prop_name}")
                     success = False
@@ -817,35 +908,52 @@ def update_single_chart(notion: NotionAPI, page_id: str, prop_name: str,
         print(f"✗ 更新 {prop_name} 時發生錯誤: {str(e)}")
         return False
 
-def update_notion_pie_charts(notion: NotionAPI, relation_table: dict):
+def collect_pending_charts(relation_table: dict, image_records: dict) -> list:
+    """找出需要更新到 Notion 的圖表
+    
+    Returns:
+        list: [(page_id, event_title, {屬性名: 圖片文件名}), ...]
+    """
+    pending = []
+    for page_id, event_title in relation_table.items():
+        # 定義三種圖表的文件名和屬性名
+        charts = {
+            '總圓餅圖': f"{event_title}.png",
+            '廷圓餅圖': f"{event_title} (廷).png",
+            '雰圓餅圖': f"{event_title} (雰).png"
+        }
+        
+        # 檢查是否所有圖表都需要跳過
+        all_skipped = True
+        for prop_name, file_name in charts.items():
+            record = image_records.get(file_name)
+            if record and record['url']:
+                mod_time = record.get('modification_time', 0)
+                upload_time = record.get('upload_notion_time', 0)
+                if not (upload_time and upload_time > mod_time):
+                    all_skipped = False
+                    break
+        
+        if not all_skipped:
+            pending.append((page_id, event_title, charts))
+    
+    return pending
+
+def update_notion_pie_charts(notion: NotionAPI, relation_table: dict, use_async: bool = None):
     """根據 relation_table 更新 Notion 頁面的圓餅圖"""
+    if use_async is None:
+        use_async = USE_ASYNC_CLIENT
+    
     try:
         # 讀取圖片記錄
         image_records = read_image_records_for_update()
+        pending = collect_pending_charts(relation_table, image_records)
         
-        for page_id, event_title in relation_table.items():
-            # 定義三種圖表的文件名和屬性名
-            charts = {
-                '總圓餅圖': f"{event_title}.png",
-                '廷圓餅圖': f"{event_title} (廷).png",
-                '雰圓餅圖': f"{event_title} (雰).png"
-            }
-            
-            # 檢查是否所有圖表都需要跳過
-            all_skipped = True
-            for prop_name, file_name in charts.items():
-                record = image_records.get(file_name)
-                if record and record['url']:
-                    mod_time = record.get('modification_time', 0)
-                    upload_time = record.get('upload_notion_time', 0)
-                    if not (upload_time and upload_time > mod_time):
-                        all_skipped = False
-                        break
-            
-            if all_skipped:
-                # print(f"處理: {event_title} pass")
-                continue
-            
+        if use_async:
+            asyncio.run(update_pending_charts_async(notion, pending, image_records))
+            return True
+        
+        for page_id, event_title, charts in pending:
             print(f"\n處理事件: {event_title}")
             
             # 更新每個圓餅圖
@@ -855,9 +963,6 @@ def update_notion_pie_charts(notion: NotionAPI, relation_table: dict):
                     update_single_chart(notion, page_id, prop_name, file_name, record)
                 else:
                     print(f"! {prop_name} 找不到圖片記錄或 URL: {file_name}")
-            
-            # 添加延遲避免請求過快
-            time.sleep(1)
         
         return True
         
@@ -865,28 +970,79 @@ def update_notion_pie_charts(notion: NotionAPI, relation_table: dict):
         print(f"✗ 更新圓餅圖時發生錯誤: {str(e)}")
         return False
 
+async def update_single_chart_async(api: AsyncNotionAPI, page_id: str, prop_name: str,
+                                    file_name: str, record: dict) -> bool:
+    """異步更新單個圖表，邏輯同 update_single_chart"""
+    mod_time = record.get('modification_time', 0)
+    upload_time = record.get('upload_notion_time', 0)
+    if upload_time and upload_time > mod_time:
+        print(f"跳過 {prop_name}: 上傳時間晚於修改時間")
+        return True
+    
+    if await api.update_page_file(page_id, None, prop_name, record['url']):
+        print(f"✓ {prop_name}: {file_name}")
+        record['upload_notion_time'] = time.time()
+        save_single_record(file_name, record)
+        return True
+    
+    print(f"✗ 更新 {prop_name} 失敗: {file_name}")
+    return False
+
+async def update_pending_charts_async(notion: NotionAPI, pending: list, image_records: dict):
+    """並行更新所有待更新頁面的三種圓餅圖（與同步客戶端共用速率限制）"""
+    async with AsyncNotionAPI(config['token'], rate_limiter=notion.rate_limiter,
+                              imgur_uploader=notion.imgur_uploader) as api:
+        tasks = []
+        for page_id, event_title, charts in pending:
+            for prop_name, file_name in charts.items():
+                record = image_records.get(file_name)
+                if record and record['url']:
+                    tasks.append(update_single_chart_async(api, page_id, prop_name, file_name, record))
+                else:
+                    print(f"! {event_title} {prop_name} 找不到圖片記錄或 URL: {file_name}")
+        
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"✗ 更新圓餅圖時發生錯誤: {str(result)}")
+
 # ============= 數據處理相關函數 =============
-def read_old_data(full_data_path: str) -> list:
-    """讀取舊數據"""
-    old_data = []
-    if os.path.exists(full_data_path):
-        with open(full_data_path, 'r', encoding='utf-8') as f:
-            old_data = json.load(f)
-    return old_data
-
-def get_old_page_ids(old_data: list) -> set:
-    """獲取舊數據的 page_id 集合"""
-    return {record.get('page_id') for record in old_data}
-
-def process_page_properties(notion: NotionAPI, page: dict, specific_props: list, relation_table: dict) -> dict:
-    """處理單個頁面的屬性"""
+def open_ledger_store():
+    """依 LEDGER_BACKEND 開啟本地賬本，並掛上圖表彙總表"""
+    os.makedirs(BASE_DATA_DIR, exist_ok=True)
+    if LEDGER_BACKEND == 'json':
+        store = JsonLedgerStore(FULL_DATA_PATH)
+    else:
+        if LEDGER_BACKEND == 'segments':
+            store = SegmentLedgerStore(LEDGER_SEGMENT_DIR)
+        else:
+            store = SqliteLedgerStore(LEDGER_DB_PATH)
+        store.migrate_from_json(FULL_DATA_PATH)
+    
+    select_options = read_json_file(os.path.join(BASE_DATA_DIR, 'select_color.json'))
+    if select_options:
+        valid_attributes, valid_categories = valid_chart_options(select_options)
+        store.attach_rollups(ChartRollups.open(CHART_ROLLUP_PATH, valid_attributes, valid_categories,
+                                               SHARED_SPLIT_WEIGHTS))
+    return store
+
+def process_page_properties(notion: NotionAPI, page: dict, specific_props: list, relation_table: dict,
+                            formatter=None) -> dict:
+    """處理單個頁面的屬性
+    
+    formatter 為 notion.compile_page_formatter 編譯的格式化函數，
+    同步大量頁面時應預先編譯一次傳入。
+    """
     page_id = page['id']
     props = notion.get_formatted_page_properties(
         page_id,
         specific_props,
-        raw_page_data=page
+        raw_page_data=page,
+        formatter=formatter
     )
     props['page_id'] = page_id
+    if page.get('last_edited_time'):
+        props[EDITED_TIME_KEY] = page['last_edited_time']
     
     # 處理關聯數據
     for key, value in props.items():
@@ -899,135 +1055,101 @@ def process_page_properties(notion: NotionAPI, page: dict, specific_props: list,
     return props
 
 def collect_affected_events(new_records: list) -> set:
-    """收集受影響的事件"""
+    """收集受影響的事件與月份"""
     affected_events = set()
-    
     for record in new_records:
-        # 檢查重大事件支出列表
-        if record.get('💥 重大事件支出列表'):
-            event_data = record.get('💥 重大事件支出列表')
-            if isinstance(event_data, dict) and 'title' in event_data:
-                event_title = event_data['title']
-                affected_events.add(event_title)
-        
-        # 檢查單月支出列表
-        if record.get('💵 單月支出列表'):
-            month_data = record.get('💵 單月支出列表')
-            if isinstance(month_data, dict) and 'title' in month_data:
-                month_title = month_data['title']
-                affected_events.add(month_title)
-    
+        affected_events.update(record_group_titles(record))
     return affected_events
 
-def collect_affected_data(all_data: list, affected_events: set) -> list:
-    """收集受影響事件的完整數據"""
-    affected_data = set()
-    
-    for record in all_data:
-        # 檢查重大事件支出列表
-        if record.get('💥 重大事件支出列表'):
-            event_data = record.get('💥 重大事件支出列表')
-            if isinstance(event_data, dict) and 'title' in event_data:
-                event_title = event_data['title']
-                if event_title in affected_events:
-                    affected_data.add(json.dumps(record, ensure_ascii=False, sort_keys=True))
-        
-        # 檢查單月支出列表
-        if record.get('💵 單月支出列表'):
-            month_data = record.get('💵 單月支出列表')
-            if isinstance(month_data, dict) and 'title' in month_data:
-                month_title = month_data['title']
-                if month_title in affected_events:
-                    affected_data.add(json.dumps(record, ensure_ascii=False, sort_keys=True))
-    
-    return [json.loads(record) for record in affected_data]
-
-def save_data_to_files(full_data_path: str, affected_data_path: str, 
-                      new_records: list, old_data: list, affected_data: list):
-    """保存數據到文件"""
-    # 更新 full_account_data.json
-    if new_records:
-        updated_data = old_data + new_records
-        with open(full_data_path, 'w', encoding='utf-8') as f:
-            json.dump(updated_data, f, ensure_ascii=False, indent=2)
-        print(f"已更新 {full_data_path}")
-    
-    # 保存受影響的數據
-    if affected_data:
-        with open(affected_data_path, 'w', encoding='utf-8') as f:
-            json.dump(affected_data, f, ensure_ascii=False, indent=2)
-        print(f"已保存受影響的數據到 {affected_data_path}")
-
-def get_data_from_notion(notion, relation_table, specific_props, limit=None):
-    """從 Notion 獲取數據並處理"""
+def commit_ledger_changes(store, relation_table: dict, affected_events: set,
+                          upserts: list = (), deletes: list = ()):
+    """把變更寫入賬本（掛上的圖表彙總表同時更新），並輸出受影響事件的數據與列式快照"""
+    store.apply(upserts=upserts, deletes=deletes)
+    save_affected_data(AFFECTED_DATA_PATH, store.records_for_groups(affected_events))
+    if WRITE_LEDGER_SNAPSHOT:
+        try:
+            write_ledger_snapshot(store, relation_table)
+        except ImportError as e:
+            print(f"跳過列式快照: {str(e)}")
+
+def write_ledger_snapshot(store, relation_table: dict, chunk_size: int = 1000):
+    """以串流方式把整個賬本編碼為列式快照"""
+    select_options = read_json_file(os.path.join(BASE_DATA_DIR, 'select_color.json')) or {}
+    extractor = ColumnarBatchExtractor(select_options, relation_table, capacity=max(len(store), 1))
+    records = store.iter_records()
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        extractor.append_records(chunk)
+    
+    extractor.save_snapshot(LEDGER_SNAPSHOT_DIR)
+    print(f"已寫入列式快照 {LEDGER_SNAPSHOT_DIR}（{len(extractor)} 條記錄）")
+
+def save_affected_data(affected_data_path: str, affected_data: list):
+    """保存受影響事件的完整數據，供 ChartManager 以 'affected' 數據源繪圖
+    
+    沒有數據時（受影響的分組已全部清空）也寫入空列表，不留下上次同步的舊數據。
+    """
+    with open(affected_data_path, 'w', encoding='utf-8') as f:
+        json.dump(affected_data, f, ensure_ascii=False, indent=2)
+    print(f"已保存受影響的數據到 {affected_data_path}（{len(affected_data)} 條記錄）")
+
+def get_data_from_notion(notion, relation_table, specific_props, limit=None, prefetch=PREFETCH_DEPTH,
+                         sync_mode=None):
+    """從 Notion 獲取數據並處理
+    
+    prefetch 大於 0 時，處理當前批次的同時背景請求下一批；遇到重複記錄停止時，
+    最多只會多請求 prefetch 批。sync_mode 未指定時使用 SYNC_MODE。
+    """
+    if (sync_mode or SYNC_MODE) == 'incremental':
+        return sync_incremental(notion, relation_table, specific_props, prefetch=prefetch)
+    
     start_time = time.time()
     print("開始獲取數據...")
     
-    # 確保目錄存在
-    os.makedirs(BASE_DATA_DIR, exist_ok=True)
-    full_data_path = os.path.join(BASE_DATA_DIR, 'full_account_data.json')
-    affected_data_path = os.path.join(BASE_DATA_DIR, 'affected_charts_data.json')
+    with open_ledger_store() as store:
+        new_records, affected_events = fetch_new_records(
+            notion, store, relation_table, specific_props, limit, prefetch
+        )
+    
+    end_time = time.time()
+    total_time = end_time - start_time
     
-    # 讀取舊數據
-    old_data = read_old_data(full_data_path)
-    old_page_ids = get_old_page_ids(old_data)
+    print(f"\n執行完成！")
+    print(f"總執行時間: {total_time:.2f} 秒")
+    print(f"新增記錄數: {len(new_records)}")
     
-    # 獲取新數據
-    pages_data = []
+    return new_records, affected_events
+
+def fetch_new_records(notion, store, relation_table, specific_props, limit, prefetch) -> tuple:
+    """獲取賬本中還沒有的最新記錄並寫入賬本"""
+    # 獲取新數據（逐條處理，遇到重複記錄即停止，後續分頁不會被請求）
+    formatter = notion.compile_page_formatter(config['account'], specific_props)
     new_records = []
-    has_more = True
-    next_cursor = None
-    total_fetched = 0
     page_size = min(100, limit) if limit else 100
+    pages = notion.iter_query_database(
+        database_id=config['account'],
+        page_size=page_size,
+        prefetch=prefetch,
+        filter_properties=specific_props
+    )
     
-    while has_more and (limit is None or total_fetched < limit):
-        print(f"正在獲取第 {total_fetched + 1} - {min(total_fetched + page_size, limit if limit else float('inf'))} 條記錄...")
-        
-        response = notion.query_database(
-            database_id=config['account'],
-            page_size=page_size,
-            start_cursor=next_cursor
-        )
-        
-        if not response:
-            break
-            
-        batch_results = response.get('results', [])
-        remaining = limit - total_fetched if limit else None
-        
-        if remaining is not None and remaining < len(batch_results):
-            batch_results = batch_results[:remaining]
-        
-        # 處理每條記錄
-        for page in batch_results:
-            page_id = page['id']
-            
+    try:
+        for page in islice(pages, limit):
             # 如果遇到重複的 page_id，立即停止獲取
-            if page_id in old_page_ids:
+            if page['id'] in store:
                 print(f"遇到重複記錄，停止獲取")
-                has_more = False
                 break
             
             # 處理頁面屬性
-            props = process_page_properties(notion, page, specific_props, relation_table)
-            pages_data.append(props)
-            new_records.append(props)
-            total_fetched += 1
-        
-        # 如果已經遇到重複記錄，跳出外層循環
-        if not has_more:
-            break
-            
-        has_more = response.get('has_more', False)
-        next_cursor = response.get('next_cursor')
-        
-        print(f"已獲取 {total_fetched} 條記錄")
-        print(f"是否還有更多: {has_more}")
-        print(f"下一頁游標: {next_cursor}")
-        
-        if limit and total_fetched >= limit:
-            print(f"已達到限制數量 {limit}，停止獲取")
-            break
+            props = process_page_properties(notion, page, specific_props, relation_table, formatter)
+            new_records.append(stamp_record_hashes(props, specific_props))
+    finally:
+        pages.close()
+    
+    if limit and len(new_records) >= limit:
+        print(f"已達到限制數量 {limit}，停止獲取")
     
     # 處理受影響的圖表數據
     affected_events = set()
@@ -1035,27 +1157,211 @@ def get_data_from_notion(notion, relation_table, specific_props, limit=None):
         affected_events = collect_affected_events(new_records)
         print(f"受影響的事件: {', '.join(affected_events)}")
         
-        # 從所有數據中收集受影響事件的完整數據
-        all_data = old_data + new_records
-        affected_data = collect_affected_data(all_data, affected_events)
-        
-        # 保存數據到文件
-        save_data_to_files(full_data_path, affected_data_path, new_records, old_data, affected_data)
-        print(f"受影響的事件: {', '.join(affected_events)}")
+        # 寫入賬本後，以索引取出受影響事件的完整數據
+        commit_ledger_changes(store, relation_table, affected_events, upserts=new_records)
     
-    end_time = time.time()
-    total_time = end_time - start_time
+    return new_records, affected_events
+
+def read_sync_state() -> dict:
+    """讀取增量同步狀態（last_edited_time 高水位）"""
+    return read_json_file(SYNC_STATE_PATH) or {}
+
+def write_sync_state(state: dict):
+    """保存增量同步狀態"""
+    write_json_file(SYNC_STATE_PATH, state)
+
+def build_edited_since_query(high_water_mark: str = None) -> tuple:
+    """構建依 last_edited_time 升序、只取高水位之後記錄的查詢參數
+    
+    Notion 的 last_edited_time 精度為分鐘，所以使用 on_or_after，
+    邊界上重複取得的記錄會在比較後被視為未變更。
+    """
+    filter_params = None
+    if high_water_mark:
+        filter_params = {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": high_water_mark}
+        }
+    sort_params = [{"timestamp": "last_edited_time", "direction": "ascending"}]
+    return filter_params, sort_params
+
+def find_deleted_page_ids(notion: NotionAPI, known_page_ids: set) -> set:
+    """掃描數據庫中現存的 page_id，找出已被刪除或封存的記錄
     
-    print(f"\n執行完成！")
-    print(f"總執行時間: {total_time:.2f} 秒")
-    print(f"新增記錄數: {len(new_records)}")
+    Notion 的數據庫查詢不會返回已封存的頁面，增量查詢無法得知刪除，
+    需要時再以此完整掃描核對。
     
-    return new_records, affected_events
+    Returns:
+        set: 已刪除的 page_id；掃描沒有完整走到 has_more=False 時返回 None，
+            呼叫方不應據此刪除任何記錄
+    """
+    live_ids = set()
+    next_cursor = None
+    try:
+        while True:
+            # 只需要 page_id，投影到 title 屬性（ID 固定為 "title"）讓回應最小
+            response = notion.query_database(
+                database_id=config['account'],
+                start_cursor=next_cursor,
+                filter_properties=['title']
+            )
+            if not response:
+                print("刪除核對中止：查詢失敗")
+                return None
+            
+            live_ids.update(page['id'] for page in response.get('results', []))
+            if not response.get('has_more'):
+                break
+            next_cursor = response.get('next_cursor')
+            if not next_cursor:
+                print("刪除核對中止：回應缺少 next_cursor")
+                return None
+    except NotionAPIError as e:
+        print(f"刪除核對中止：{str(e)}")
+        return None
+    
+    return known_page_ids - live_ids
+
+def reconcile_due(state: dict) -> bool:
+    """依 RECONCILE_INTERVAL_HOURS 判斷這次同步是否需要核對刪除"""
+    if RECONCILE_INTERVAL_HOURS <= 0:
+        return False
+    last_reconciled = state.get('last_reconciled_at')
+    return last_reconciled is None or time.time() - last_reconciled >= RECONCILE_INTERVAL_HOURS * 3600
+
+def sync_incremental(notion: NotionAPI, relation_table: dict, specific_props: list,
+                     prefetch: int = PREFETCH_DEPTH, reconcile_deletions: bool = None):
+    """依 last_edited_time 增量同步賬戶數據庫
+    
+    只查詢高水位之後編輯過的記錄，以 page_id 更新或插入本地賬本；
+    封存的頁面會被移除。每條記錄帶有 specific_props 的內容雜湊，
+    與賬本中的雜湊相同即視為未變更，不需要讀取舊記錄。
+    只有影響圖表的欄位（見 ledger_store.CHART_FIELDS）變更時，
+    才把舊值與新值所屬的事件與月份標記為需要重繪。
+    沒有同步狀態但賬本已有記錄時，以賬本中最晚的編輯時間作為高水位。
+    
+    Args:
+        reconcile_deletions: 是否完整掃描一次數據庫以偵測已刪除的記錄；
+            None 時距離上次核對超過 RECONCILE_INTERVAL_HOURS 才掃描
+        
+    Returns:
+        tuple: (變更的記錄列表, 受影響的事件與月份集合)
+    """
+    start_time = time.time()
+    print("開始增量同步...")
+    
+    state = read_sync_state()
+    high_water_mark = state.get('last_edited_time')
+    if reconcile_deletions is None:
+        reconcile_deletions = reconcile_due(state)
+    
+    pending = {}  # page_id -> 新記錄，None 表示刪除；結束時一次寫入賬本
+    new_count = edited_count = unchanged_count = 0
+    removed_records = []
+    affected_events = set()
+    reconciled = False
+    
+    with open_ledger_store() as store:
+        if not high_water_mark and len(store):
+            # 同步狀態遺失（或從 'head' 模式切換）但已有賬本時，從賬本重建高水位，避免完整掃描
+            high_water_mark = ledger_high_water_mark(store)
+        print(f"上次同步高水位: {high_water_mark or '無（完整同步）'}")
+        new_high_water_mark = high_water_mark
+        
+        filter_params, sort_params = build_edited_since_query(high_water_mark)
+        formatter = notion.compile_page_formatter(config['account'], specific_props)
+        pages = notion.iter_query_database(
+            database_id=config['account'],
+            filter_params=filter_params,
+            sort_params=sort_params,
+            prefetch=prefetch,
+            filter_properties=specific_props
+        )
+        
+        # 提前離開（例如寫入失敗）時關閉生成器，預取的背景執行緒才會停止
+        try:
+            for page in pages:
+                page_id = page['id']
+                edited_time = page.get('last_edited_time')
+                if edited_time and (not new_high_water_mark or edited_time > new_high_water_mark):
+                    new_high_water_mark = edited_time
+                
+                if page.get('archived') or page.get('in_trash'):
+                    old_record = pending[page_id] if page_id in pending else store.get(page_id)
+                    if old_record:
+                        pending[page_id] = None
+                        removed_records.append(old_record)
+                        affected_events |= collect_affected_events([old_record])
+                    continue
+                
+                props = stamp_record_hashes(
+                    process_page_properties(notion, page, specific_props, relation_table, formatter),
+                    specific_props
+                )
+                if page_id in pending:
+                    old_hash = pending[page_id] and pending[page_id][CONTENT_HASH_KEY]
+                else:
+                    old_hash = store.content_hash(page_id)
+                if props[CONTENT_HASH_KEY] == old_hash:
+                    unchanged_count += 1
+                    continue
+                
+                # 內容有變更才讀取舊記錄，比較圖表雜湊決定是否重繪
+                old_record = pending[page_id] if page_id in pending else store.get(page_id)
+                if old_record is None:
+                    new_count += 1
+                    affected_events |= collect_affected_events([props])
+                else:
+                    edited_count += 1
+                    # 從 JSON 匯入的舊記錄沒有雜湊，現場計算
+                    old_chart_hash = old_record.get(CHART_HASH_KEY) or record_hash(old_record, CHART_FIELDS)
+                    if old_chart_hash != props[CHART_HASH_KEY]:
+                        affected_events |= collect_affected_events([old_record, props])
+                pending[page_id] = props
+        finally:
+            pages.close()
+        
+        if reconcile_deletions:
+            known_page_ids = (store.page_ids() | set(pending)) - {
+                page_id for page_id, record in pending.items() if record is None
+            }
+            deleted_ids = find_deleted_page_ids(notion, known_page_ids)
+            if deleted_ids is not None:
+                reconciled = True
+                for page_id, old_record in store.get_many(deleted_ids).items():
+                    pending[page_id] = None
+                    removed_records.append(old_record)
+                    affected_events |= collect_affected_events([old_record])
+        
+        changed_records = [record for record in pending.values() if record is not None]
+        if pending:
+            commit_ledger_changes(
+                store, relation_table, affected_events,
+                upserts=changed_records,
+                deletes=[page_id for page_id, record in pending.items() if record is None]
+            )
+            print(f"受影響的事件: {', '.join(affected_events)}")
+    
+    new_state = dict(state)
+    if new_high_water_mark:
+        new_state['last_edited_time'] = new_high_water_mark
+    if reconciled:
+        new_state['last_reconciled_at'] = time.time()
+    if new_state != state:
+        write_sync_state(new_state)
+    
+    print("\n增量同步完成！")
+    print(f"總執行時間: {time.time() - start_time:.2f} 秒")
+    print(f"新增記錄數: {new_count}，編輯記錄數: {edited_count}，未變更記錄數: {unchanged_count}")
+    print(f"移除記錄數: {len(removed_records)}")
+    
+    return changed_records + removed_records, affected_events
 
 # ============= 主要流程函數 =============
 def init_notion_api():
     """初始化 Notion API 和基本配置"""
-    notion = NotionAPI(config['token'])
+    notion = NotionAPI(config['token'], schema_cache_path=SCHEMA_CACHE_PATH,
+                       imgur_cache_path=IMGUR_CACHE_PATH)
     load_from_file = True
     update_mode = 'affected'
     return notion, load_from_file, update_mode
@@ -1067,10 +1373,20 @@ def setup_notion_data(notion: NotionAPI, load_from_file: bool):
     specific_props = ['品項','支出NTD', '類別', '日期', '廷 | 雰', '屬性', '💥 重大事件支出列表', '💵 單月支出列表', '折扣/抵']
     return relation_table, specific_props
 
-def process_charts(affected_events: set, update_mode: str):
-    """處理圖表生成"""
-    from draw_graph import ChartManager
-    chart_manager = ChartManager()
+def create_chart_manager():
+    """依 CHART_RENDER_MODE、CHART_RENDER_WORKERS 與 LEDGER_BACKEND 建立圖表管理器"""
+    from draw_graph import ChartManager, Config
+    return ChartManager(Config(RENDER_MODE=CHART_RENDER_MODE, SAVE_DISK_COPY=SAVE_CHART_FILES,
+                               RENDER_WORKERS=CHART_RENDER_WORKERS, LEDGER_BACKEND=LEDGER_BACKEND))
+
+def process_charts(affected_events: set, update_mode: str) -> tuple:
+    """處理圖表生成
+    
+    Returns:
+        tuple: (memory 模式下渲染的圖表 {文件名: {'data': bytes, 'path': str 或 None}}，
+            disk 模式下為空字典；已經沒有支出數據、圖表被清除的分組)
+    """
+    chart_manager = create_chart_manager()
     
     if update_mode == 'affected':
         log_info("使用受影響的數據源更新圖表...")
@@ -1078,6 +1394,46 @@ def process_charts(affected_events: set, update_mode: str):
     else:
         log_info("使用完整數據源更新圖表...")
         chart_manager.draw_graph(source='full')
+    return chart_manager.rendered_charts, chart_manager.emptied_groups
+
+def publish_charts(notion: NotionAPI, rendered: dict, bypass_imgur: bool = False):
+    """上傳圖表並更新圖片記錄
+    
+    有記憶體中的圖表時直接上傳 bytes，否則回到掃描目錄的流程。
+    """
+    if rendered:
+        upload_rendered_charts(notion, rendered, bypass_imgur=bypass_imgur)
+    else:
+        scan_image_records(notion, bypass_imgur=bypass_imgur)
+
+def clear_emptied_charts(notion: NotionAPI, relation_table: dict, titles: set):
+    """清除已經沒有支出數據的分組的圖表
+    
+    刪除其圖片記錄（之後不會再把舊的 Imgur 連結寫回頁面），並清空頁面的三個圓餅圖屬性。
+    """
+    if not titles:
+        return
+    
+    csv_path = os.path.join(BASE_IMAGE_DIR, 'image_records.csv')
+    records = read_image_records(csv_path)
+    charts = {}
+    for title in titles:
+        charts[title] = {
+            '總圓餅圖': f"{title}.png",
+            '廷圓餅圖': f"{title} (廷).png",
+            '雰圓餅圖': f"{title} (雰).png"
+        }
+        for file_name in charts[title].values():
+            records.pop(file_name, None)
+    if os.path.exists(csv_path):
+        save_records(records, csv_path)
+    
+    for page_id, title in relation_table.items():
+        if title in charts:
+            if notion.clear_page_files(page_id, list(charts[title])):
+                log_success(f"已清除圖表：{title}")
+            else:
+                log_error(f"清除圖表失敗：{title}")
 
 def update_notion_page(notion: NotionAPI, relation_table: dict) -> bool:
     """更新 Notion 頁面的圓餅圖"""
@@ -1093,46 +1449,48 @@ def process_new_records(notion: NotionAPI, relation_table: dict, specific_props:
     # 獲取新數據並處理受影響的圖表
     new_records, affected_events = get_data_from_notion(notion, relation_table, specific_props, limit=None)
     
-    if new_records:
+    if affected_events:
         # 生成圖表
-        process_charts(affected_events, update_mode)
+        rendered, emptied = process_charts(affected_events, update_mode)
 
-        # 掃描並更新圖片記錄
+        # 上傳圖表並更新圖片記錄
         bypass_imgur = False
-        scan_image_records(notion, bypass_imgur=bypass_imgur)
+        publish_charts(notion, rendered, bypass_imgur=bypass_imgur)
+        clear_emptied_charts(notion, relation_table, emptied)
 
         # 更新 Notion 頁面的圓餅圖
         update_notion_page(notion, relation_table)
     else:
         log_info("沒有新記錄，無需更新圖表")
 
-def redraw_charts(titles: list):
-    """重繪指定標題的圖表"""
-    from draw_graph import ChartManager
-    chart_manager = ChartManager()
+def redraw_charts(titles: list) -> tuple:
+    """重繪指定標題的圖表，返回值同 process_charts"""
+    chart_manager = create_chart_manager()
     
     log_info("使用完整數據源重繪圖表...")
     chart_manager.draw_graph(target_events=set(titles), source='full')
+    return chart_manager.rendered_charts, chart_manager.emptied_groups
 
 def redraw_single_title(titles: list):
     """重繪指定標題的圖表"""
     log_info(f"開始重繪標題：{', '.join(titles)}")
     
-    # 初始化 Notion API
-    notion = NotionAPI(config['token'])
-    
-    # 獲取關聯表
-    relation_table = get_relation_table(notion, load_from_file=True)
-    
-    # 生成圖表
-    redraw_charts(titles)
-    
-    # 掃描並更新圖片記錄
-    bypass_imgur = False
-    scan_image_records(notion, bypass_imgur=bypass_imgur)
-    
-    # 更新 Notion 頁面的圓餅圖
-    update_notion_page(notion, relation_table)
+    # 初始化 Notion API（共用一個連線池，結束時關閉）
+    with NotionAPI(config['token'], schema_cache_path=SCHEMA_CACHE_PATH,
+                   imgur_cache_path=IMGUR_CACHE_PATH) as notion:
+        # 獲取關聯表
+        relation_table = get_relation_table(notion, load_from_file=True)
+        
+        # 生成圖表
+        rendered, emptied = redraw_charts(titles)
+        
+        # 上傳圖表並更新圖片記錄
+        bypass_imgur = False
+        publish_charts(notion, rendered, bypass_imgur=bypass_imgur)
+        clear_emptied_charts(notion, relation_table, emptied)
+        
+        # 更新 Notion 頁面的圓餅圖
+        update_notion_page(notion, relation_table)
     log_success(f"完成重繪標題：{', '.join(titles)}")
 
 def process_normal_update():
@@ -1140,11 +1498,12 @@ def process_normal_update():
     # 初始化 Notion API 和配置
     notion, load_from_file, update_mode = init_notion_api()
     
-    # 設置 Notion 數據和屬性
-    relation_table, specific_props = setup_notion_data(notion, load_from_file)
-    
-    # 處理新記錄並更新圖表
-    process_new_records(notion, relation_table, specific_props, update_mode)
+    with notion:
+        # 設置 Notion 數據和屬性
+        relation_table, specific_props = setup_notion_data(notion, load_from_file)
+        
+        # 處理新記錄並更新圖表
+        process_new_records(notion, relation_table, specific_props, update_mode)
 
 def main():
     """主函數"""
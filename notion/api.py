@@ -1,34 +1,244 @@
-from .handlers import NotionRequestHandler
-from .builders import BlockBuilder
+from .handlers import NotionRequestHandler, NotionAPIError, BlockAppendError
+from .builders import BlockBuilder, ImgurUploader
 from .config import NotionConfig
 from .extractors import PropertyValueExtractor
-import requests
-from base64 import b64encode
+import json
 import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from urllib.parse import quote, unquote
+
+
+_PREFETCH_DONE = object()
+
+
+def prefetch_iterator(iterable, depth: int):
+    """在背景執行緒中提前取出最多 depth 個元素
+
+    適用於每次取值都需要網路請求的迭代器：消費方處理第 N 批時，
+    背景執行緒已在請求第 N+1 批。消費方提前停止（close 或被回收）時，
+    背景執行緒會在目前的請求完成後結束，不會再請求後續資料。
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if stop.is_set() or not put((item, None)):
+                    break
+            else:
+                put((_PREFETCH_DONE, None))
+        except Exception as e:
+            put((_PREFETCH_DONE, e))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close:
+                close()
+
+    worker = threading.Thread(target=produce, name="notion-prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _PREFETCH_DONE:
+                if error:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        worker.join()
 
 
 class NotionAPI(NotionRequestHandler):
-    def __init__(self, token: str):
-        super().__init__(token)
+    def __init__(self, token: str, schema_cache_path: str = None,
+                 schema_cache_ttl: float = NotionConfig.SCHEMA_CACHE_TTL,
+                 imgur_cache_path: str = None,
+                 **session_options):
+        """
+        Args:
+            token: Notion API token
+            schema_cache_path: 數據庫結構快取的 JSON 文件路徑（可選），
+                提供時快取會在多次執行之間保留
+            schema_cache_ttl: 快取的有效秒數
+            imgur_cache_path: 圖片內容雜湊 → Imgur URL 對照表的 JSON 文件路徑（可選）
+                上傳服務 imgur_uploader 使用自己的連線池，close() 時一併關閉
+            **session_options: 傳給 NotionRequestHandler 的連線池設定
+                （session、pool_connections、pool_maxsize、max_retries、timeout）
+        """
+        super().__init__(token, **session_options)
+        self.schema_cache_path = schema_cache_path
+        self.schema_cache_ttl = schema_cache_ttl
+        self._schema_lock = threading.Lock()
+        self._schemas = self._load_schema_cache()  # database_id -> {"fetched_at": 時間戳, "schema": 結構}
         self.imgur_client_id = NotionConfig.IMGUR_CLIENT_ID
-        self.block_builder = BlockBuilder()
+        self.imgur_uploader = ImgurUploader(self.imgur_client_id, cache_path=imgur_cache_path)
+        self.block_builder = BlockBuilder(imgur_uploader=self.imgur_uploader)
+
+    def close(self):
+        """關閉 Notion 與 Imgur 上傳服務的連線池"""
+        self.imgur_uploader.close()
+        super().close()
 
     def query_database(self, database_id: str, 
                       filter_params: dict = None,
                       sort_params: list = None,
                       page_size: int = 100,
-                      start_cursor: str = None) -> dict:
+                      start_cursor: str = None,
+                      filter_properties: list = None,
+                      raise_on_error: bool = False) -> dict:
         """改進的數據庫查詢方法，支援分頁
         
         Args:
             database_id: 數據庫ID
-            filter_params: 格式應為 {"property": "屬性名", "屬性類型": {"條件": "值"}}
+            filter_params: 格式應為 {"property": "屬性名", "屬性類型": {"條件": "值"}}，
+                也可以是 {"timestamp": "last_edited_time", ...} 或 {"and": [...]} / {"or": [...]}
             sort_params: 排序參數
             page_size: 每頁數量
             start_cursor: 分頁游標
+            filter_properties: 只返回這些屬性（屬性名稱或屬性 ID），
+                名稱會依數據庫結構自動轉為 ID，以減少傳輸與解析量
+            raise_on_error: 請求失敗時拋出 NotionAPIError 而不是返回 None
         """
         url = f"{NotionConfig.BASE_URL}/databases/{database_id}/query"
+        url = self.with_filter_properties(url, self.resolve_property_ids(database_id, filter_properties))
+        query_data = self.build_query_data(filter_params, sort_params, page_size, start_cursor)
+        return self._make_request("POST", url, query_data, raise_on_error=raise_on_error)
+
+    @staticmethod
+    def with_filter_properties(url: str, property_ids: list = None) -> str:
+        """在 URL 上附加 filter_properties 查詢參數
+        
+        Notion 返回的屬性 ID 有些已經是 URL 編碼過的形式（例如 %3AUPp），
+        先解碼再以 quote 編碼，兩種形式都只會編碼一次。
+        """
+        if not property_ids:
+            return url
+        query = "&".join(f"filter_properties={quote(unquote(property_id), safe='')}"
+                         for property_id in property_ids)
+        return f"{url}{'&' if '?' in url else '?'}{query}"
+
+    def _load_schema_cache(self) -> dict:
+        """從磁碟載入數據庫結構快取"""
+        if not self.schema_cache_path or not os.path.exists(self.schema_cache_path):
+            return {}
+        try:
+            with open(self.schema_cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"載入數據庫結構快取失敗: {e}")
+            return {}
+
+    def _save_schema_cache(self):
+        """將數據庫結構快取寫回磁碟"""
+        if not self.schema_cache_path:
+            return
+        try:
+            directory = os.path.dirname(self.schema_cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.schema_cache_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._schemas, f, ensure_ascii=False)
+            os.replace(temp_path, self.schema_cache_path)
+        except OSError as e:
+            print(f"保存數據庫結構快取失敗: {e}")
+
+    def get_database_schema(self, database_id: str, force_refresh: bool = False) -> dict:
+        """獲取數據庫完整結構，優先使用未過期的快取
+        
+        屬性名稱、類型、select 選項與屬性 ID 都由此結構推導，
+        同一次執行中每個數據庫最多只請求一次。
+        
+        Args:
+            database_id: 數據庫 ID
+            force_refresh: 忽略快取重新獲取
+            
+        Returns:
+            dict: 數據庫結構，獲取失敗時返回 {}
+        """
+        with self._schema_lock:
+            entry = self._schemas.get(database_id)
+            if (entry and not force_refresh
+                    and time.time() - entry.get('fetched_at', 0) < self.schema_cache_ttl):
+                return entry['schema']
+
+            url = f"{NotionConfig.BASE_URL}/databases/{database_id}"
+            schema = self._make_request("GET", url)
+            if not schema or 'properties' not in schema:
+                return entry['schema'] if entry else {}
+
+            self._schemas[database_id] = {'fetched_at': time.time(), 'schema': schema}
+            self._save_schema_cache()
+            return schema
+
+    def invalidate_schema(self, database_id: str = None):
+        """清除數據庫結構快取
+        
+        Args:
+            database_id: 要清除的數據庫 ID，None 表示全部清除
+        """
+        with self._schema_lock:
+            if database_id is None:
+                self._schemas.clear()
+            else:
+                self._schemas.pop(database_id, None)
+            self._save_schema_cache()
+
+    def get_property_ids(self, database_id: str) -> dict:
+        """獲取數據庫屬性名稱到屬性 ID 的映射"""
+        schema = self.get_database_schema(database_id)
+        return {
+            prop_name: prop_info['id']
+            for prop_name, prop_info in schema.get('properties', {}).items()
+        }
+
+    def resolve_property_ids(self, database_id: str, properties: list = None) -> list:
+        """將屬性名稱轉為屬性 ID（已經是 ID 的值保持不變）
+        
+        任何一個值既不是屬性名稱也不是屬性 ID 時返回 None，不使用 filter_properties，
+        寧可返回全部屬性，也不讓 Notion 拒絕請求或漏掉屬性。
+        """
+        if not properties:
+            return None
+        return self.match_property_ids(self.get_property_ids(database_id), properties)
+
+    @staticmethod
+    def match_property_ids(property_ids: dict, properties: list) -> list:
+        """依屬性名稱到 ID 的映射解析 properties，有無法解析的值時返回 None"""
+        known_ids = set(property_ids.values())
+        resolved = []
+        for prop in properties:
+            if prop in property_ids:
+                resolved.append(property_ids[prop])
+            elif prop in known_ids:
+                resolved.append(prop)
+            else:
+                print(f"無法解析屬性 {prop}，改為返回全部屬性")
+                return None
+        return resolved
+
+    @staticmethod
+    def build_query_data(filter_params: dict = None,
+                         sort_params: list = None,
+                         page_size: int = 100,
+                         start_cursor: str = None) -> dict:
+        """構建數據庫查詢的請求內容（同步與異步客戶端共用）"""
         query_data = {}
         
         # 驗證和格式化 filter_params
@@ -36,6 +246,9 @@ class NotionAPI(NotionRequestHandler):
             if isinstance(filter_params, dict):
                 if "property" in filter_params and len(filter_params) > 1:
                     query_data["filter"] = filter_params
+                elif any(key in filter_params for key in ("timestamp", "and", "or")):
+                    # 時間戳過濾與複合過濾直接使用
+                    query_data["filter"] = filter_params
                 else:
                     for prop_name, value in filter_params.items():
                         query_data["filter"] = {
@@ -52,26 +265,41 @@ class NotionAPI(NotionRequestHandler):
         if start_cursor:
             query_data["start_cursor"] = start_cursor
 
-        return self._make_request("POST", url, query_data)
+        return query_data
 
-    def query_database_all(self, database_id: str,
-                          filter_params: dict = None,
-                          sort_params: list = None,
-                          page_size: int = 100) -> list:
-        """獲取數據庫中的所有記錄
+    def iter_query_batches(self, database_id: str,
+                           filter_params: dict = None,
+                           sort_params: list = None,
+                           page_size: int = 100,
+                           prefetch: int = 0,
+                           filter_properties: list = None):
+        """逐批產出數據庫查詢結果，每次請求返回的一批頁面產出一次
         
         Args:
             database_id: 數據庫ID
             filter_params: 過濾參數
             sort_params: 排序參數
             page_size: 每頁數量
+            prefetch: 預先請求的批數；大於 0 時在處理當前批次的同時
+                於背景請求後續批次（仍經過同一個速率限制器）
+            filter_properties: 只返回這些屬性，見 query_database
             
-        Returns:
-            list: 所有查詢結果的列表
+        Yields:
+            list: 一批原始頁面數據（最多 page_size 條）
         """
-        all_results = []
+        # 先解析一次屬性 ID，之後每批直接使用
+        filter_properties = self.resolve_property_ids(database_id, filter_properties)
+        batches = self._query_batches(database_id, filter_params, sort_params, page_size, filter_properties)
+        if prefetch > 0:
+            batches = prefetch_iterator(batches, prefetch)
+        yield from batches
+
+    def _query_batches(self, database_id: str, filter_params: dict,
+                       sort_params: list, page_size: int, filter_properties: list = None):
+        """依序跟隨 next_cursor 請求每一批結果，任何一批失敗都拋出 NotionAPIError"""
         has_more = True
         next_cursor = None
+        total = 0
         
         while has_more:
             response = self.query_database(
@@ -79,52 +307,194 @@ class NotionAPI(NotionRequestHandler):
                 filter_params=filter_params,
                 sort_params=sort_params,
                 page_size=page_size,
-                start_cursor=next_cursor
+                start_cursor=next_cursor,
+                filter_properties=filter_properties,
+                raise_on_error=True
             )
             
-            if not response:
-                break
-            
             results = response.get('results', [])
-            all_results.extend(results)
-            
+            total += len(results)
             has_more = response.get('has_more', False)
             next_cursor = response.get('next_cursor')
             
             if has_more:
-                print(f"已獲取 {len(all_results)} 條記錄，繼續查詢...")
+                print(f"已獲取 {total} 條記錄，繼續查詢...")
+            
+            yield results
+
+    def iter_query_database(self, database_id: str,
+                            filter_params: dict = None,
+                            sort_params: list = None,
+                            page_size: int = 100,
+                            property_list: list = None,
+                            formatted: bool = False,
+                            prefetch: int = 0,
+                            filter_properties: list = None,
+                            formatter=None):
+        """逐條產出數據庫中的記錄，記憶體只保留當前一批
+        
+        呼叫方可以隨時停止迭代，之後的分頁不會再被請求。
+        
+        Args:
+            database_id: 數據庫ID
+            filter_params: 過濾參數
+            sort_params: 排序參數
+            page_size: 每頁數量
+            property_list: formatted 為 True 時要保留的屬性列表
+            formatted: 是否產出格式化後的記錄（包含 page_id）而非原始頁面
+            prefetch: 預先請求的批數，見 iter_query_batches
+            filter_properties: 只返回這些屬性，見 query_database
+            formatter: formatted 為 True 時使用的已編譯格式化函數（可選）
+            
+        Yields:
+            dict: 原始頁面數據或格式化後的記錄
+        """
+        for batch in self.iter_query_batches(database_id, filter_params, sort_params, page_size,
+                                             prefetch=prefetch, filter_properties=filter_properties):
+            for page in batch:
+                if not formatted:
+                    yield page
+                    continue
+                
+                record = self.get_formatted_page_properties(page['id'], property_list, raw_page_data=page,
+                                                            formatter=formatter)
+                record['page_id'] = page['id']
+                yield record
+
+    def query_database_all(self, database_id: str,
+                          filter_params: dict = None,
+                          sort_params: list = None,
+                          page_size: int = 100,
+                          filter_properties: list = None) -> list:
+        """獲取數據庫中的所有記錄
+        
+        Args:
+            database_id: 數據庫ID
+            filter_params: 過濾參數
+            sort_params: 排序參數
+            page_size: 每頁數量
+            filter_properties: 只返回這些屬性，見 query_database
+            
+        Returns:
+            list: 所有查詢結果的列表
+        """
+        all_results = list(self.iter_query_database(
+            database_id,
+            filter_params=filter_params,
+            sort_params=sort_params,
+            page_size=page_size,
+            filter_properties=filter_properties
+        ))
         
         print(f"總共獲取 {len(all_results)} 條記錄")
         return all_results
 
-    def get_page_properties(self, page_id: str, property_list: list = None) -> dict:
-        """獲取頁面屬性，支持選擇性獲取"""
+    def get_page_properties(self, page_id: str, property_list: list = None,
+                            database_id: str = None) -> dict:
+        """獲取頁面屬性，支持選擇性獲取
+        
+        提供 database_id 時，property_list 會轉為屬性 ID 並以 filter_properties
+        傳給 Notion，只返回需要的屬性。
+        """
         url = f"{NotionConfig.BASE_URL}/pages/{page_id}"
+        if database_id and property_list:
+            url = self.with_filter_properties(url, self.resolve_property_ids(database_id, property_list))
         response = self._make_request("GET", url)
-        
-        if not response:
+        return self.select_properties(response, property_list)
+
+    @staticmethod
+    def select_properties(page: dict, property_list: list = None) -> dict:
+        """從頁面數據中取出指定的屬性"""
+        if not page:
             return {}
             
+        properties = page.get("properties", {})
         if not property_list:
-            return response.get("properties", {})
+            return properties
             
         return {
-            prop: response.get("properties", {}).get(prop)
+            prop: properties.get(prop)
             for prop in property_list
-            if prop in response.get("properties", {})
+            if prop in properties
         }
 
     def get_block_children(self, block_id: str, 
                           start_cursor: str = None,
-                          page_size: int = 100) -> list:
-        """改進的獲取區塊內容方法"""
+                          page_size: int = 100,
+                          raise_on_error: bool = False) -> dict:
+        """改進的獲取區塊內容方法（單頁，返回包含 next_cursor 的原始回應）"""
         url = f"{NotionConfig.BASE_URL}/blocks/{block_id}/children"
         params = {"page_size": page_size}
         
         if start_cursor:
             params["start_cursor"] = start_cursor
             
-        return self._make_request("GET", url)
+        return self._make_request("GET", url, params=params, raise_on_error=raise_on_error)
+
+    def get_all_block_children(self, block_id: str, page_size: int = 100) -> list:
+        """跟隨 next_cursor 獲取區塊的全部直接子區塊，任何一頁失敗都拋出 NotionAPIError"""
+        children = []
+        next_cursor = None
+        
+        while True:
+            response = self.get_block_children(block_id, start_cursor=next_cursor, page_size=page_size,
+                                               raise_on_error=True)
+            children.extend(response.get('results', []))
+            if not response.get('has_more'):
+                break
+            next_cursor = response.get('next_cursor')
+        
+        return children
+
+    def get_block_tree(self, block_id: str,
+                       max_workers: int = NotionConfig.BLOCK_TREE_WORKERS,
+                       flat: bool = False,
+                       expand_child_pages: bool = False) -> list:
+        """遞迴獲取整個頁面（或區塊）的區塊樹
+        
+        每個 has_children 的區塊在發現後立即交給執行緒池獲取子區塊，
+        不同分支的請求並行進行（仍受同一個速率限制器約束），
+        同一層的順序與頁面中一致。
+        
+        Args:
+            block_id: 頁面或區塊 ID
+            max_workers: 最大並行請求數
+            flat: True 時按文件順序返回扁平列表，否則返回巢狀結構
+            expand_child_pages: 是否展開子頁面與子數據庫的內容
+            
+        Returns:
+            list: 巢狀結構時，每個有子區塊的區塊會帶有 "children" 列表
+        """
+        skipped_types = () if expand_child_pages else ('child_page', 'child_database')
+        root = []
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = {pool.submit(self.get_all_block_children, block_id): root}
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    target = pending.pop(future)
+                    children = future.result()
+                    target.extend(children)
+                    
+                    for block in children:
+                        if block.get('has_children') and block.get('type') not in skipped_types:
+                            block['children'] = []
+                            pending[pool.submit(self.get_all_block_children, block['id'])] = block['children']
+        
+        return self.flatten_blocks(root) if flat else root
+
+    @staticmethod
+    def flatten_blocks(blocks: list) -> list:
+        """將巢狀的區塊樹按文件順序展開為扁平列表"""
+        flat = []
+        stack = list(reversed(blocks))
+        while stack:
+            block = stack.pop()
+            flat.append(block)
+            stack.extend(reversed(block.get('children', [])))
+        return flat
 
     def create_page(self, database_id: str,
                    properties: dict,
@@ -156,14 +526,31 @@ class NotionAPI(NotionRequestHandler):
         }
         return self._make_request("POST", url, data)
 
-    def get_formatted_page_properties(self, page_id: str, property_list: list = None, raw_page_data: dict = None) -> dict:
+    def compile_page_formatter(self, database_id: str, property_list: list = None):
+        """依數據庫結構編譯頁面格式化函數（見 PropertyValueExtractor.compile）
+        
+        Returns:
+            Callable[[dict], dict]: 無法獲取數據庫結構時返回 None
+        """
+        property_types = self.get_database_properties(database_id)
+        if not property_types:
+            return None
+        return PropertyValueExtractor.compile(property_types, property_list)
+
+    def get_formatted_page_properties(self, page_id: str, property_list: list = None, raw_page_data: dict = None,
+                                      formatter=None) -> dict:
         """獲取格式化後的頁面屬性值
         
         Args:
             page_id: 頁面ID
             property_list: 指定要獲取的屬性列表
             raw_page_data: 頁面完整數據（如果有的話，避免重複請求）
+            formatter: compile_page_formatter 編譯的格式化函數（可選），
+                提供時直接用於 raw_page_data，property_list 已包含在其中
         """
+        if raw_page_data and formatter:
+            return formatter(raw_page_data)
+        
         if raw_page_data:
             raw_properties = raw_page_data.get("properties", {})
             if property_list:
@@ -175,18 +562,7 @@ class NotionAPI(NotionRequestHandler):
         else:
             raw_properties = self.get_page_properties(page_id, property_list)
         
-        formatted_properties = {}
-        
-        for prop_name, prop_data in raw_properties.items():
-            value = PropertyValueExtractor.extract_value(prop_data)
-            
-            # 特殊處理 relation 類型，只保留第一個關聯的 ID
-            if isinstance(value, list) and prop_data.get('type') == 'relation':
-                value = value[0] if value else None
-            
-            formatted_properties[prop_name] = value
-        
-        return formatted_properties
+        return PropertyValueExtractor.format_properties(raw_properties)
 
     def update_database(self, database_id: str, properties: dict = None, title: str = None) -> dict:
         """更新數據庫屬性或標題"""
@@ -198,7 +574,11 @@ class NotionAPI(NotionRequestHandler):
         if title:
             data["title"] = [{"type": "text", "text": {"content": title}}]
             
-        return self._make_request("PATCH", url, data)
+        result = self._make_request("PATCH", url, data)
+        if result:
+            # 結構已變更，舊快取作廢
+            self.invalidate_schema(database_id)
+        return result
 
     def append_blocks(self, page_id: str, blocks: list) -> dict:
         """向頁面添加多個區塊"""
@@ -208,6 +588,135 @@ class NotionAPI(NotionRequestHandler):
         }
         return self._make_request("PATCH", url, data)
 
+    def append_blocks_bulk(self, parent_id: str, blocks: list,
+                           max_workers: int = NotionConfig.BLOCK_TREE_WORKERS) -> list:
+        """批量添加任意數量、任意深度的區塊，並返回建立的頂層區塊 ID
+        
+        頂層區塊按順序每 100 個（且總數不超過 1000 個）一批發送；
+        只有一層子區塊的區塊連同子區塊在同一個請求中建立，
+        更深的子樹在父區塊建立後交給執行緒池並行添加，
+        與後續批次的請求重疊進行。
+        
+        子區塊可以放在 block["children"] 或 block[type]["children"]。
+        
+        Args:
+            parent_id: 頁面或區塊 ID
+            blocks: 區塊列表
+            max_workers: 添加子樹時的最大並行請求數
+            
+        Returns:
+            list: 依序建立的頂層區塊 ID
+            
+        Raises:
+            BlockAppendError: 任何一層有批次失敗時，在所有子樹任務結束後拋出，
+                帶有已建立的頂層區塊 ID 與每個失敗的父區塊
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            created_ids, child_futures, failures = self._append_block_chunks(parent_id, blocks, pool)
+            # 每個子樹任務返回它提交的更深層任務，逐一等待直到沒有未完成的任務
+            pending = deque(child_futures)
+            while pending:
+                _, child_futures, child_failures = pending.popleft().result()
+                pending.extend(child_futures)
+                failures.extend(child_failures)
+        
+        if failures:
+            raise BlockAppendError(f"{len(failures)} 個父區塊的子區塊添加失敗",
+                                   created_ids=created_ids, failures=failures)
+        return created_ids
+
+    def _append_block_chunks(self, parent_id: str, blocks: list, pool: ThreadPoolExecutor) -> tuple:
+        """依序分批添加同一父區塊下的區塊，並把延後的子樹提交到執行緒池
+        
+        Returns:
+            tuple: (建立的區塊 ID 列表, 子樹任務的 future 列表, 失敗記錄列表)
+        """
+        created_ids = []
+        child_futures = []
+        for chunk in self.chunk_blocks(blocks):
+            payload = []
+            deferred = []
+            for block in chunk:
+                body, children = self.split_block_children(block)
+                payload.append(body)
+                deferred.append(children)
+            
+            try:
+                response = self.append_blocks(parent_id, payload)
+                error = None if response else "API 請求失敗"
+            except NotionAPIError as e:
+                response, error = None, str(e)
+            if not response:
+                print(f"添加區塊失敗，已建立 {len(created_ids)}/{len(blocks)} 個區塊")
+                return created_ids, child_futures, [{
+                    'parent_id': parent_id, 'created': len(created_ids), 'total': len(blocks), 'error': error,
+                }]
+            
+            for created, children in zip(response.get('results', []), deferred):
+                created_ids.append(created['id'])
+                if children:
+                    child_futures.append(pool.submit(self._append_block_chunks, created['id'], children, pool))
+        
+        return created_ids, child_futures, []
+
+    @staticmethod
+    def block_children(block: dict) -> list:
+        """取出區塊的子區塊，支援 block["children"] 與 block[type]["children"] 兩種寫法"""
+        payload = block.get(block.get('type'))
+        return block.get('children') or (payload.get('children') if isinstance(payload, dict) else None) or []
+
+    @staticmethod
+    def split_block_children(block: dict) -> tuple:
+        """拆出需要延後添加的子區塊
+        
+        子區塊本身沒有子區塊、且不超過單次上限時直接內嵌發送，
+        否則整組子區塊延後到父區塊建立後再添加。
+        
+        Returns:
+            tuple: (可以直接發送的區塊, 需要在建立後再添加的子區塊列表)
+        """
+        block_type = block.get('type')
+        children = NotionAPI.block_children(block)
+        body = {key: value for key, value in block.items() if key != 'children'}
+        payload = body.get(block_type)
+        if isinstance(payload, dict):
+            body[block_type] = {key: value for key, value in payload.items() if key != 'children'}
+        
+        if not children:
+            return body, []
+        
+        # 沒有類型內容可以放子區塊時，區塊原樣發送，子區塊延後添加
+        inline = (
+            isinstance(payload, dict)
+            and len(children) <= NotionConfig.BLOCK_APPEND_LIMIT
+            and not any(NotionAPI.block_children(child) for child in children)
+        )
+        if not inline:
+            return body, children
+        
+        body[block_type]['children'] = [NotionAPI.split_block_children(child)[0] for child in children]
+        return body, []
+
+    @staticmethod
+    def chunk_blocks(blocks: list):
+        """將區塊切成符合 Notion 單次請求上限的批次（保持原順序）"""
+        chunk = []
+        chunk_size = 0
+        for block in blocks:
+            children = NotionAPI.block_children(block)
+            size = 1 + (len(children) if len(children) <= NotionConfig.BLOCK_APPEND_LIMIT else 0)
+            
+            if chunk and (len(chunk) >= NotionConfig.BLOCK_APPEND_LIMIT or
+                          chunk_size + size > NotionConfig.BLOCK_REQUEST_LIMIT):
+                yield chunk
+                chunk = []
+                chunk_size = 0
+            chunk.append(block)
+            chunk_size += size
+        
+        if chunk:
+            yield chunk
+
     def add_image_to_page(self, page_id: str, image_url: str, caption: str = None, local_image_path: str = None) -> dict:
         """向頁面添加圖片
         
@@ -243,26 +752,15 @@ class NotionAPI(NotionRequestHandler):
         return self.append_blocks(page_id, [image_block])
 
     def upload_to_imgur(self, image_path):
-        """上传图片到 Imgur 并返回链接"""
-        headers = {
-            'Authorization': f'Client-ID {self.imgur_client_id}'
-        }
-        
-        with open(image_path, 'rb') as image_file:
-            image_data = b64encode(image_file.read())
-        
-        response = requests.post(
-            'https://api.imgur.com/3/image',
-            headers=headers,
-            data={
-                'image': image_data
-            }
-        )
+        """上传图片到 Imgur 并返回链接（共用 Notion 請求的連線池，相同內容不重複上傳）
         
-        if response.status_code == 200:
-            return response.json()['data']['link']
-        else:
-            raise Exception(f"Imgur 上传失败: {response.text}")
+        image_path 也可以直接傳入圖片的 bytes。
+        """
+        return self.imgur_uploader.upload(image_path)
+
+    def upload_many_to_imgur(self, images: dict) -> dict:
+        """並行上傳多張圖片，返回 {鍵: URL}，失敗的項目為 None"""
+        return self.imgur_uploader.upload_many(images)
 
     def get_database_properties(self, database_id: str) -> dict:
         """獲取數據庫所有可過濾的屬性信息
@@ -280,24 +778,27 @@ class NotionAPI(NotionRequestHandler):
                 ...
             }
         """
-        url = f"{NotionConfig.BASE_URL}/databases/{database_id}"
-        response = self._make_request("GET", url)
-        
-        if not response or 'properties' not in response:
+        return self.parse_property_types(self.get_database_schema(database_id))
+
+    @staticmethod
+    def parse_property_types(schema: dict) -> dict:
+        """從數據庫結構中取出屬性名稱與類型的映射"""
+        if not schema or 'properties' not in schema:
             return {}
         
         properties = {}
-        for prop_name, prop_info in response['properties'].items():
+        for prop_name, prop_info in schema['properties'].items():
             prop_type = prop_info.get('type')
             properties[prop_name] = prop_type
         
         return properties
 
-    def get_database_select_options(self, database_id: str) -> dict:
+    def get_database_select_options(self, database_id: str, force_refresh: bool = False) -> dict:
         """獲取數據庫中所有 select 和 multi_select 類型屬性的選項信息
         
         Args:
             database_id: 數據庫 ID
+            force_refresh: 忽略結構快取，重新向 Notion 請求
             
         Returns:
             dict: 屬性名稱及其選項信息的映射，例如：
@@ -324,14 +825,16 @@ class NotionAPI(NotionRequestHandler):
                 }
             }
         """
-        url = f"{NotionConfig.BASE_URL}/databases/{database_id}"
-        response = self._make_request("GET", url)
-        
-        if not response or 'properties' not in response:
+        return self.parse_select_options(self.get_database_schema(database_id, force_refresh=force_refresh))
+
+    @staticmethod
+    def parse_select_options(schema: dict) -> dict:
+        """從數據庫結構中取出 select 和 multi_select 屬性的選項"""
+        if not schema or 'properties' not in schema:
             return {}
         
         select_options = {}
-        for prop_name, prop_info in response['properties'].items():
+        for prop_name, prop_info in schema['properties'].items():
             prop_type = prop_info.get('type')
             
             if prop_type in ['select', 'multi_select']:
@@ -494,17 +997,10 @@ class NotionAPI(NotionRequestHandler):
             # 準備更新的屬性
             update_properties = {
                 "properties": {
-                    property_name: {
-                        "files": [
-                            {
-                                "name": os.path.basename(file_path) if file_path else "image.png",
-                                "type": "external",
-                                "external": {
-                                    "url": image_url if image_url else self.upload_to_imgur(file_path)
-                                }
-                            }
-                        ]
-                    }
+                    property_name: self.create_file_property(
+                        os.path.basename(file_path) if file_path else "image.png",
+                        image_url if image_url else self.upload_to_imgur(file_path)
+                    )
                 }
             }
             
@@ -522,6 +1018,24 @@ class NotionAPI(NotionRequestHandler):
             print(f"更新頁面文件時發生錯誤: {str(e)}")
             return False
 
+    def clear_page_files(self, page_id: str, property_names: list) -> bool:
+        """清空頁面的文件屬性
+
+        Args:
+            page_id: Notion 頁面 ID
+            property_names: 要清空的屬性名稱
+
+        Returns:
+            bool: 是否成功
+        """
+        try:
+            update_properties = {"properties": {name: {"files": []} for name in property_names}}
+            url = f"{NotionConfig.BASE_URL}/pages/{page_id}"
+            return bool(self._make_request("PATCH", url, update_properties))
+        except Exception as e:
+            print(f"清空頁面文件時發生錯誤: {str(e)}")
+            return False
+
     def update_page(self, page_id: str, properties: dict) -> dict:
         """更新 Notion 頁面的屬性
         
@@ -0,0 +1,368 @@
+import asyncio
+import os
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp 為可選依賴，只有使用 AsyncNotionAPI 時才需要
+    aiohttp = None
+
+from .api import NotionAPI
+from .builders import ImgurUploader
+from .config import NotionConfig
+from .extractors import PropertyValueExtractor
+from .handlers import NotionAPIError, RateLimiter, RETRYABLE_STATUS_CODES, parse_retry_after, backoff_delay
+
+
+class AsyncNotionAPI:
+    """NotionAPI 的 asyncio 版本
+
+    以 aiohttp 的 keep-alive 連線池發送請求，並用 semaphore 限制同時進行中的
+    請求數。傳入同步客戶端的 rate_limiter 即可讓兩者共用同一個速率限制。
+
+    使用方式：
+        async with AsyncNotionAPI(token) as notion:
+            events, months = await asyncio.gather(
+                notion.query_database_all(event_db_id),
+                notion.query_database_all(month_db_id),
+            )
+    """
+
+    # 不涉及網路請求的輔助方法直接沿用同步版本
+    build_query_data = staticmethod(NotionAPI.build_query_data)
+    select_properties = staticmethod(NotionAPI.select_properties)
+    parse_property_types = staticmethod(NotionAPI.parse_property_types)
+    parse_select_options = staticmethod(NotionAPI.parse_select_options)
+    create_file_property = NotionAPI.create_file_property
+    create_page_properties = NotionAPI.create_page_properties
+    with_filter_properties = staticmethod(NotionAPI.with_filter_properties)
+    match_property_ids = staticmethod(NotionAPI.match_property_ids)
+
+    def __init__(self, token: str,
+                 max_concurrency: int = NotionConfig.ASYNC_MAX_CONCURRENCY,
+                 rate_limiter: RateLimiter = None,
+                 rate_limit_retries: int = NotionConfig.RATE_LIMIT_RETRIES,
+                 timeout: float = NotionConfig.REQUEST_TIMEOUT,
+                 imgur_uploader: ImgurUploader = None):
+        """
+        Args:
+            token: Notion API token
+            max_concurrency: 同時進行中的最大請求數
+            rate_limiter: 共用的速率限制器（可選），未提供時自行建立
+            rate_limit_retries: 429 / 5xx 時的最大重試次數
+            timeout: 單次請求的超時秒數
+            imgur_uploader: 共用的圖片上傳服務（可選），傳入同步客戶端的
+                imgur_uploader 可共用速率限制與內容雜湊對照表；提供時由呼叫方負責關閉
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncNotionAPI 需要安裝 aiohttp：pip install aiohttp")
+
+        self.token = token
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Notion-Version": NotionConfig.API_VERSION,
+        }
+        self._owns_uploader = imgur_uploader is None
+        self.imgur_uploader = imgur_uploader or ImgurUploader(NotionConfig.IMGUR_CLIENT_ID)
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.rate_limit_retries = rate_limit_retries
+        self.timeout = timeout
+        self.session = None
+        self._semaphore = None
+        self._property_ids = {}  # database_id -> {屬性名稱: 屬性 ID}
+
+    async def __aenter__(self):
+        self._ensure_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _ensure_session(self):
+        """在事件循環內延遲建立 aiohttp Session"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    async def close(self):
+        """關閉連線池（自行建立的圖片上傳服務一併關閉）"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        if self._owns_uploader:
+            self.imgur_uploader.close()
+
+    @property
+    def rate_limit_budget(self) -> float:
+        """目前速率限制器中可立即使用的請求數"""
+        return self.rate_limiter.budget
+
+    async def _make_request(self, method: str, url: str, data: dict = None, params: dict = None,
+                            raise_on_error: bool = False) -> dict:
+        """統一的異步請求處理方法，錯誤處理與同步版本一致（重試用盡或網路錯誤時拋出 NotionAPIError）"""
+        session = self._ensure_session()
+        try:
+            async with self._semaphore:
+                for attempt in range(self.rate_limit_retries + 1):
+                    wait = self.rate_limiter.reserve()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+
+                    async with session.request(method, url, headers=self.headers, params=params,
+                                               json=data if data else None) as response:
+                        if response.status in RETRYABLE_STATUS_CODES and attempt < self.rate_limit_retries:
+                            delay = parse_retry_after(response.headers.get("Retry-After"))
+                            if delay is None:
+                                delay = backoff_delay(attempt)
+                            print(f"API {response.status}，{delay:.1f} 秒後重試 "
+                                  f"({attempt + 1}/{self.rate_limit_retries})")
+                            if response.status == 429:
+                                self.rate_limiter.pause(delay)
+                            else:
+                                await asyncio.sleep(delay)
+                            continue
+
+                        if response.status >= 400:
+                            error_detail = (await response.text())[:500] or "No error details"
+                            print(f"API Error: {response.status}")
+                            print(f"URL: {url}")
+                            print(f"Request Data: {data}")
+                            print(f"Error Details: {error_detail}")
+                            if raise_on_error or response.status in RETRYABLE_STATUS_CODES:
+                                raise NotionAPIError(f"API Error: {response.status} {method} {url}",
+                                                     status_code=response.status, url=url, detail=error_detail)
+                            return None
+
+                        return await response.json()
+
+        except (aiohttp.ContentTypeError, ValueError) as e:
+            # ContentTypeError 同時是 ClientError，必須先於網路錯誤處理
+            print(f"JSON Parsing Error: {str(e)}")
+            if raise_on_error:
+                raise NotionAPIError(f"JSON Parsing Error: {str(e)}", url=url) from e
+            return None
+        except aiohttp.ClientError as e:
+            # 與同步版本相同，網路錯誤一律拋出
+            print(f"Network Error: {str(e)}")
+            raise NotionAPIError(f"Network Error: {str(e)}", url=url) from e
+        except asyncio.TimeoutError as e:
+            print(f"Network Error: 請求超時 {url}")
+            raise NotionAPIError(f"Network Error: 請求超時 {url}", url=url) from e
+
+    async def query_database(self, database_id: str,
+                             filter_params: dict = None,
+                             sort_params: list = None,
+                             page_size: int = 100,
+                             start_cursor: str = None,
+                             filter_properties: list = None,
+                             raise_on_error: bool = False) -> dict:
+        """異步查詢數據庫，參數同 NotionAPI.query_database"""
+        url = f"{NotionConfig.BASE_URL}/databases/{database_id}/query"
+        url = self.with_filter_properties(url, await self.resolve_property_ids(database_id, filter_properties))
+        query_data = self.build_query_data(filter_params, sort_params, page_size, start_cursor)
+        return await self._make_request("POST", url, query_data, raise_on_error=raise_on_error)
+
+    async def query_database_all(self, database_id: str,
+                                 filter_params: dict = None,
+                                 sort_params: list = None,
+                                 page_size: int = 100,
+                                 filter_properties: list = None) -> list:
+        """異步獲取數據庫中的所有記錄
+
+        單一數據庫的分頁必須依序進行，不同數據庫之間可以用 asyncio.gather 並行。
+        任何一頁失敗都拋出 NotionAPIError，不會返回被截斷的結果。
+        """
+        all_results = []
+        has_more = True
+        next_cursor = None
+        filter_properties = await self.resolve_property_ids(database_id, filter_properties)
+
+        while has_more:
+            response = await self.query_database(
+                database_id=database_id,
+                filter_params=filter_params,
+                sort_params=sort_params,
+                page_size=page_size,
+                start_cursor=next_cursor,
+                filter_properties=filter_properties,
+                raise_on_error=True
+            )
+
+            all_results.extend(response.get('results', []))
+            has_more = response.get('has_more', False)
+            next_cursor = response.get('next_cursor')
+
+        print(f"總共獲取 {len(all_results)} 條記錄")
+        return all_results
+
+    async def get_property_ids(self, database_id: str) -> dict:
+        """異步獲取數據庫屬性名稱到屬性 ID 的映射（每個數據庫只請求一次）"""
+        if database_id not in self._property_ids:
+            url = f"{NotionConfig.BASE_URL}/databases/{database_id}"
+            schema = await self._make_request("GET", url)
+            if not schema or 'properties' not in schema:
+                return {}
+            self._property_ids[database_id] = {
+                prop_name: prop_info['id']
+                for prop_name, prop_info in schema['properties'].items()
+            }
+        return self._property_ids[database_id]
+
+    async def resolve_property_ids(self, database_id: str, properties: list = None) -> list:
+        """將屬性名稱轉為屬性 ID，規則同 NotionAPI.resolve_property_ids"""
+        if not properties:
+            return None
+        return self.match_property_ids(await self.get_property_ids(database_id), properties)
+
+    async def get_page_properties(self, page_id: str, property_list: list = None,
+                                  database_id: str = None) -> dict:
+        """異步獲取頁面屬性，參數同 NotionAPI.get_page_properties"""
+        url = f"{NotionConfig.BASE_URL}/pages/{page_id}"
+        if database_id and property_list:
+            url = self.with_filter_properties(url, await self.resolve_property_ids(database_id, property_list))
+        response = await self._make_request("GET", url)
+        return self.select_properties(response, property_list)
+
+    async def get_formatted_page_properties(self, page_id: str, property_list: list = None,
+                                            raw_page_data: dict = None) -> dict:
+        """異步獲取格式化後的頁面屬性值"""
+        if raw_page_data:
+            raw_properties = self.select_properties(raw_page_data, property_list)
+        else:
+            raw_properties = await self.get_page_properties(page_id, property_list)
+        return PropertyValueExtractor.format_properties(raw_properties)
+
+    async def get_block_children(self, block_id: str,
+                                 start_cursor: str = None,
+                                 page_size: int = 100,
+                                 raise_on_error: bool = False) -> dict:
+        """異步獲取區塊內容"""
+        url = f"{NotionConfig.BASE_URL}/blocks/{block_id}/children"
+        params = {"page_size": page_size}
+
+        # 游標交給 aiohttp 編碼，與同步版本相同
+        if start_cursor:
+            params["start_cursor"] = start_cursor
+
+        return await self._make_request("GET", url, params=params, raise_on_error=raise_on_error)
+
+    async def get_all_block_children(self, block_id: str, page_size: int = 100) -> list:
+        """異步跟隨 next_cursor 獲取區塊的全部直接子區塊，任何一頁失敗都拋出 NotionAPIError"""
+        children = []
+        next_cursor = None
+
+        while True:
+            response = await self.get_block_children(block_id, start_cursor=next_cursor, page_size=page_size,
+                                                     raise_on_error=True)
+            children.extend(response.get('results', []))
+            if not response.get('has_more'):
+                break
+            next_cursor = response.get('next_cursor')
+
+        return children
+
+    async def get_block_tree(self, block_id: str, flat: bool = False,
+                             expand_child_pages: bool = False) -> list:
+        """異步遞迴獲取區塊樹，同一層的子區塊以 asyncio.gather 並行展開
+
+        參數與返回格式同 NotionAPI.get_block_tree，並行數由 semaphore 限制。
+        """
+        skipped_types = () if expand_child_pages else ('child_page', 'child_database')
+
+        async def expand(parent_id: str) -> list:
+            children = await self.get_all_block_children(parent_id)
+            branches = [block for block in children
+                        if block.get('has_children') and block.get('type') not in skipped_types]
+            subtrees = await asyncio.gather(*(expand(block['id']) for block in branches))
+            for block, subtree in zip(branches, subtrees):
+                block['children'] = subtree
+            return children
+
+        tree = await expand(block_id)
+        return NotionAPI.flatten_blocks(tree) if flat else tree
+
+    async def create_page(self, database_id: str, properties: dict, children: list = None) -> dict:
+        """異步創建新頁面"""
+        url = f"{NotionConfig.BASE_URL}/pages"
+        data = {
+            "parent": {"database_id": database_id},
+            "properties": properties
+        }
+        if children:
+            data["children"] = children
+        return await self._make_request("POST", url, data)
+
+    async def update_block(self, block_id: str, block_data: dict) -> dict:
+        """異步更新區塊內容"""
+        url = f"{NotionConfig.BASE_URL}/blocks/{block_id}"
+        return await self._make_request("PATCH", url, block_data)
+
+    async def append_blocks(self, page_id: str, blocks: list) -> dict:
+        """異步向頁面添加多個區塊"""
+        url = f"{NotionConfig.BASE_URL}/blocks/{page_id}/children"
+        return await self._make_request("PATCH", url, {"children": blocks})
+
+    async def update_database(self, database_id: str, properties: dict = None, title: str = None) -> dict:
+        """異步更新數據庫屬性或標題"""
+        url = f"{NotionConfig.BASE_URL}/databases/{database_id}"
+        data = {}
+        if properties:
+            data["properties"] = properties
+        if title:
+            data["title"] = [{"type": "text", "text": {"content": title}}]
+        return await self._make_request("PATCH", url, data)
+
+    async def get_database_properties(self, database_id: str) -> dict:
+        """異步獲取數據庫屬性名稱與類型"""
+        url = f"{NotionConfig.BASE_URL}/databases/{database_id}"
+        return self.parse_property_types(await self._make_request("GET", url))
+
+    async def get_database_select_options(self, database_id: str) -> dict:
+        """異步獲取數據庫 select / multi_select 屬性的選項"""
+        url = f"{NotionConfig.BASE_URL}/databases/{database_id}"
+        return self.parse_select_options(await self._make_request("GET", url))
+
+    async def upload_to_imgur(self, image_path) -> str:
+        """異步上傳圖片到 Imgur 並返回連結
+
+        上傳服務本身是同步的（負責節奏與去重），在執行緒中執行以免阻塞事件循環。
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.imgur_uploader.upload, image_path)
+
+    async def update_page_file(self, page_id: str, file_path: str = None,
+                               property_name: str = None, image_url: str = None) -> bool:
+        """異步更新頁面的文件屬性，參數同 NotionAPI.update_page_file"""
+        try:
+            if not property_name:
+                property_name = "File"
+
+            if not image_url:
+                image_url = await self.upload_to_imgur(file_path)
+
+            update_properties = {
+                "properties": {
+                    property_name: self.create_file_property(
+                        os.path.basename(file_path) if file_path else "image.png",
+                        image_url
+                    )
+                }
+            }
+
+            url = f"{NotionConfig.BASE_URL}/pages/{page_id}"
+            return bool(await self._make_request("PATCH", url, update_properties))
+
+        except Exception as e:
+            print(f"更新頁面文件時發生錯誤: {str(e)}")
+            return False
+
+    async def update_page(self, page_id: str, properties: dict) -> dict:
+        """異步更新 Notion 頁面的屬性，參數同 NotionAPI.update_page"""
+        url = f"{NotionConfig.BASE_URL}/pages/{page_id}"
+        return await self._make_request("PATCH", url, self.create_page_properties(properties))
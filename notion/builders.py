@@ -1,47 +1,242 @@
-import base64
+import hashlib
+import json
+import os
+import threading
+import time
 import requests
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from typing import Union
 from pathlib import Path
 from .config import NotionConfig
+from .handlers import create_session, parse_retry_after, backoff_delay, RETRYABLE_STATUS_CODES
 
 class ImgurUploader:
-    """處理圖片上傳到 Imgur 的類"""
-    API_URL = "https://api.imgur.com/3/image"
+    """處理圖片上傳到 Imgur 的類
     
-    def __init__(self, client_id: str):
+    所有上傳都經過同一個實例：以 multipart 直接發送二進位內容，
+    依 Imgur 回傳的速率限制標頭控制節奏，並以內容的 SHA-256
+    記錄已上傳的 URL，相同的圖片內容不會重複上傳。
+    """
+    API_URL = NotionConfig.IMGUR_API_URL
+    
+    def __init__(self, client_id: str, session: requests.Session = None,
+                 cache_path: Union[str, Path] = None,
+                 max_concurrency: int = NotionConfig.IMGUR_MAX_CONCURRENCY,
+                 max_retries: int = NotionConfig.RATE_LIMIT_RETRIES):
+        """
+        Args:
+            client_id: Imgur API 的 client ID
+            session: 共用的連線池 Session（可選），提供時由呼叫方負責關閉；
+                未提供時自行建立，由 close() 關閉
+            cache_path: 內容雜湊 → URL 對照表的 JSON 文件路徑（可選），
+                提供時對照表會在多次執行之間保留
+            max_concurrency: 同時進行中的最大上傳數
+            max_retries: 遇到 429 / 5xx 時的最大重試次數
+        """
         self.headers = {'Authorization': f'Client-ID {client_id}'}
+        self._owns_session = session is None
+        self.session = session or create_session()
+        self.cache_path = cache_path
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._resume_at = 0.0  # 速率限制用盡時，下一次可以上傳的時間（time.time()）
+        self._urls = self._load_cache()  # sha256 -> URL
+        self._inflight = {}  # sha256 -> 上傳中的 Future，相同內容的並行呼叫等待同一次上傳
+    
+    def close(self):
+        """關閉連線池（僅關閉自行建立的 Session）"""
+        if self._owns_session and self.session is not None:
+            self.session.close()
+        self.session = None
     
-    def upload(self, image_path: Union[str, Path]) -> str:
-        """上傳圖片到 Imgur 並返回 URL"""
+    def _load_cache(self) -> dict:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
         try:
-            # 讀取圖片文件
-            with open(image_path, 'rb') as image_file:
-                image_data = base64.b64encode(image_file.read())
-            
-            # 上傳到 Imgur
-            response = requests.post(
-                self.API_URL,
-                headers=self.headers,
-                data={'image': image_data}
-            )
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"讀取圖片雜湊對照表失敗，將重新建立: {str(e)}")
+            return {}
+    
+    def _save_cache(self):
+        """以暫存文件替換的方式寫入對照表（呼叫方需持有 self._lock）
+        
+        寫入失敗只印出警告：圖片已經上傳，對照表只是快取。
+        """
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._urls, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"警告: 寫入圖片雜湊對照表失敗: {str(e)}")
+    
+    @staticmethod
+    def read_image(image: Union[str, Path, bytes]) -> tuple:
+        """返回 (圖片內容, 文件名)，image 可以是路徑或已在記憶體中的 bytes"""
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return bytes(image), 'image.png'
+        with open(image, 'rb') as image_file:
+            return image_file.read(), os.path.basename(image)
+    
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+    
+    def cached_url(self, image: Union[str, Path, bytes]) -> str:
+        """返回相同內容已上傳過的 URL，沒有時返回 None"""
+        data, _ = self.read_image(image)
+        return self._urls.get(self.content_hash(data))
+    
+    def upload(self, image: Union[str, Path, bytes], file_name: str = None) -> str:
+        """上傳圖片到 Imgur 並返回 URL（相同內容直接返回已記錄的 URL）
+        
+        Args:
+            image: 圖片路徑或圖片內容
+            file_name: multipart 中使用的文件名（可選）
+        """
+        try:
+            data, default_name = self.read_image(image)
+            digest = self.content_hash(data)
+            # 查表與登記上傳中在同一個鎖內完成，相同內容同時只會有一次 _post
+            with self._lock:
+                if digest in self._urls:
+                    return self._urls[digest]
+                future = self._inflight.get(digest)
+                owner = future is None
+                if owner:
+                    future = self._inflight[digest] = Future()
+            if not owner:
+                return future.result()
             
-            if response.status_code == 200:
-                return response.json()['data']['link']
-            else:
-                raise Exception(f"上傳失敗: {response.json()['data']['error']}")
+            try:
+                url = self._post(data, file_name or default_name)
+            except Exception as e:
+                with self._lock:
+                    del self._inflight[digest]
+                future.set_exception(e)
+                raise
+            with self._lock:
+                self._urls[digest] = url
+                del self._inflight[digest]
+                self._save_cache()
+            future.set_result(url)
+            return url
                 
         except Exception as e:
             raise Exception(f"圖片上傳失敗: {str(e)}")
+    
+    def upload_many(self, images: dict) -> dict:
+        """並行上傳多張圖片
+        
+        Args:
+            images: {鍵: 圖片路徑或內容}
+            
+        Returns:
+            dict: {鍵: URL}，上傳失敗的項目值為 None
+        """
+        # 先按內容分組，批次內相同的圖片只上傳一次
+        groups = {}
+        for key, image in images.items():
+            try:
+                data, file_name = self.read_image(image)
+            except OSError as e:
+                print(f"✗ 讀取 {key} 失敗: {str(e)}")
+                continue
+            groups.setdefault(self.content_hash(data), (data, file_name, []))[2].append(key)
+        
+        results = dict.fromkeys(images)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = {
+                pool.submit(self.upload, data, file_name): keys
+                for data, file_name, keys in groups.values()
+            }
+            for future in as_completed(futures):
+                keys = futures[future]
+                try:
+                    url = future.result()
+                except Exception as e:
+                    print(f"✗ 上傳 {', '.join(map(str, keys))} 失敗: {str(e)}")
+                    continue
+                for key in keys:
+                    results[key] = url
+        
+        return results
+    
+    def _wait_for_quota(self):
+        """速率限制用盡時等到重置時間"""
+        with self._lock:
+            delay = self._resume_at - time.time()
+        if delay > 0:
+            if delay >= 1:
+                print(f"Imgur 上傳額度用盡，等待 {delay:.0f} 秒...")
+            time.sleep(delay)
+    
+    def _update_quota(self, headers):
+        """根據 Imgur 的速率限制標頭決定下一次可上傳的時間"""
+        resume_at = 0.0
+        now = time.time()
+        
+        # 上傳專用的限制（每小時 POST 次數），重置時間為剩餘秒數
+        if headers.get('X-Post-Rate-Limit-Remaining') == '0':
+            resume_at = now + float(headers.get('X-Post-Rate-Limit-Reset') or 0)
+        # 使用者限制，重置時間為 Unix 時間戳
+        if headers.get('X-RateLimit-UserRemaining') == '0':
+            resume_at = max(resume_at, float(headers.get('X-RateLimit-UserReset') or 0))
+        
+        with self._lock:
+            self._resume_at = max(self._resume_at, resume_at)
+    
+    def _post(self, data: bytes, file_name: str) -> str:
+        """以 multipart 發送圖片，遇到 429 / 5xx 依 Retry-After 或退避重試"""
+        with self._slots:
+            for attempt in range(self.max_retries + 1):
+                self._wait_for_quota()
+                response = self.session.post(
+                    self.API_URL,
+                    headers=self.headers,
+                    data={'type': 'file'},
+                    files={'image': (file_name, data, 'image/png')},
+                    timeout=NotionConfig.REQUEST_TIMEOUT
+                )
+                self._update_quota(response.headers)
+                
+                if response.status_code == 200:
+                    return response.json()['data']['link']
+                
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                    delay = parse_retry_after(response.headers.get('Retry-After'))
+                    if delay is None:
+                        delay = backoff_delay(attempt)
+                    print(f"Imgur {response.status_code}，{delay:.1f} 秒後重試 "
+                          f"({attempt + 1}/{self.max_retries})")
+                    with self._lock:
+                        self._resume_at = max(self._resume_at, time.time() + delay)
+                    continue
+                
+                raise Exception(f"上傳失敗: {response.status_code} {response.reason}: {response.text}")
+
 
 class BlockBuilder:
-    def __init__(self, imgur_client_id: str = None):
+    def __init__(self, imgur_client_id: str = None, session: requests.Session = None,
+                 imgur_uploader: ImgurUploader = None):
         """
         初始化 BlockBuilder
         
         Args:
             imgur_client_id: Imgur API 的 client ID，用於上傳本地圖片
+            session: 共用的連線池 Session（可選）
+            imgur_uploader: 共用的上傳服務（可選），提供時忽略 imgur_client_id
         """
-        self.imgur_uploader = ImgurUploader(imgur_client_id) if imgur_client_id else None
+        if imgur_uploader is None and imgur_client_id:
+            imgur_uploader = ImgurUploader(imgur_client_id, session=session)
+        self.imgur_uploader = imgur_uploader
 
     @staticmethod
     def text_block(content: str) -> dict:
@@ -53,6 +248,22 @@ class BlockBuilder:
             }
         }
 
+    @staticmethod
+    def heading_block(content: str, level: int = 2) -> dict:
+        """創建標題區塊，level 為 1 ~ 3"""
+        block_type = {
+            1: NotionConfig.BlockType.HEADING_1,
+            2: NotionConfig.BlockType.HEADING_2,
+            3: NotionConfig.BlockType.HEADING_3,
+        }[level]
+        return {
+            "object": "block",
+            "type": block_type,
+            block_type: {
+                "rich_text": [{"type": "text", "text": {"content": content}}]
+            }
+        }
+
     def image_block(self, image: Union[str, Path], caption: str = None) -> dict:
         """
         創建圖片區塊，支持 URL 或本地圖片路徑
@@ -70,7 +281,7 @@ class BlockBuilder:
         """
         # 判斷是 URL 還是本地路徑
         image_url = image
-        if not image.startswith(('http://', 'https://')):
+        if not str(image).startswith(('http://', 'https://')):
             if not self.imgur_uploader:
                 raise Exception("要上傳本地圖片需要提供 Imgur client ID")
             
@@ -9,6 +9,37 @@ class NotionConfig:
     BASE_URL = "https://api.notion.com/v1"
     NOTION_TOKEN = NOTION_TOKEN
     IMGUR_CLIENT_ID = IMGUR_CLIENT_ID
+    IMGUR_API_URL = "https://api.imgur.com/3/image"
+
+    # HTTP 連線池設定
+    POOL_CONNECTIONS = 4        # 每個 host 保留的連線池數量
+    POOL_MAXSIZE = 16           # 每個連線池的最大連線數
+    MAX_RETRIES = 3             # 連線層級的重試次數
+    RETRY_BACKOFF_FACTOR = 0.5  # 重試間隔的指數退避係數
+    REQUEST_TIMEOUT = 60        # 單次請求的超時秒數
+
+    # 速率限制設定（Notion 平均約每秒 3 個請求）
+    RATE_LIMIT_PER_SECOND = 3.0  # 令牌桶補充速率
+    RATE_LIMIT_BURST = 3         # 令牌桶容量（允許的瞬間突發請求數）
+    RATE_LIMIT_RETRIES = 5       # 429 / 5xx 時的最大重試次數
+    BACKOFF_BASE = 1.0           # 指數退避的基礎秒數
+    BACKOFF_MAX = 30.0           # 單次退避的最長秒數
+
+    # asyncio 客戶端同時進行中的最大請求數
+    ASYNC_MAX_CONCURRENCY = 16
+
+    # 數據庫結構快取的有效秒數
+    SCHEMA_CACHE_TTL = 24 * 60 * 60
+
+    # 遞迴獲取區塊樹時的最大並行請求數
+    BLOCK_TREE_WORKERS = 4
+
+    # 同時進行中的 Imgur 上傳數
+    IMGUR_MAX_CONCURRENCY = 4
+
+    # 單次 append 請求的子區塊上限與整個請求的區塊總數上限
+    BLOCK_APPEND_LIMIT = 100
+    BLOCK_REQUEST_LIMIT = 1000
 
     # 定義 property 類型枚舉
     class PropertyType:
@@ -1,4 +1,14 @@
+import json
+import os
+
 from .config import NotionConfig
+
+try:
+    import numpy as np
+except ImportError:  # numpy 只有列式提取需要
+    np = None
+
+
 class PropertyValueExtractor:
     @staticmethod
     def extract_rollup_value(rollup_data: dict) -> any:
@@ -71,20 +81,392 @@ class PropertyValueExtractor:
         if not prop_type:
             return None
 
-        extractors = {
-            NotionConfig.PropertyType.TITLE: lambda x: x['title'][0]['text']['content'] if x['title'] else '',
-            NotionConfig.PropertyType.RICH_TEXT: lambda x: x['rich_text'][0]['text']['content'] if x['rich_text'] else '',
-            NotionConfig.PropertyType.NUMBER: lambda x: x['number'],
-            NotionConfig.PropertyType.SELECT: lambda x: x['select']['name'] if x['select'] else '',
-            NotionConfig.PropertyType.MULTI_SELECT: lambda x: [option['name'] for option in x['multi_select']],
-            NotionConfig.PropertyType.DATE: lambda x: PropertyValueExtractor.format_date_range(x['date']),
-            NotionConfig.PropertyType.CHECKBOX: lambda x: x['checkbox'],
-            NotionConfig.PropertyType.URL: lambda x: x['url'],
-            NotionConfig.PropertyType.EMAIL: lambda x: x['email'],
-            NotionConfig.PropertyType.PHONE: lambda x: x['phone_number'],
-            NotionConfig.PropertyType.RELATION: lambda x: [rel['id'] for rel in x['relation']],
-            NotionConfig.PropertyType.ROLLUP: lambda x: PropertyValueExtractor.extract_rollup_value(x['rollup'])
+        extractor = _EXTRACTORS.get(prop_type)
+        return extractor(property_data) if extractor else property_data[prop_type]
+
+    @staticmethod
+    def compile(property_types: dict, property_list: list = None):
+        """依數據庫結構預先編譯一個頁面 -> 扁平記錄的提取函數
+        
+        每個屬性的類型分派在編譯時完成一次，之後每條記錄只需依序呼叫
+        已綁定的提取函數，不再建立分派字典或檢查類型。結果與
+        format_properties 相同（relation 只保留第一個關聯的 ID）。
+        
+        Args:
+            property_types: 屬性名稱到類型的映射（見 NotionAPI.get_database_properties）
+            property_list: 要保留的屬性列表，None 表示全部
+            
+        Returns:
+            Callable[[dict], dict]: 接收原始頁面數據，返回 {屬性名: 值}
+        """
+        names = property_list if property_list else list(property_types)
+        specs = tuple(
+            (name, _COMPILED_EXTRACTORS.get(property_types[name]) or _raw_extractor(property_types[name]))
+            for name in names
+            if name in property_types
+        )
+
+        def extract(page: dict) -> dict:
+            properties = page.get("properties", {})
+            record = {}
+            for name, extractor in specs:
+                property_data = properties.get(name)
+                if property_data is not None:
+                    record[name] = extractor(property_data)
+            return record
+
+        return extract
+
+    @staticmethod
+    def format_properties(raw_properties: dict) -> dict:
+        """將原始屬性字典轉為 {屬性名: 值}，relation 只保留第一個關聯的 ID"""
+        formatted_properties = {}
+        
+        for prop_name, prop_data in raw_properties.items():
+            value = PropertyValueExtractor.extract_value(prop_data)
+            
+            # 特殊處理 relation 類型，只保留第一個關聯的 ID
+            if isinstance(value, list) and prop_data.get('type') == 'relation':
+                value = value[0] if value else None
+            
+            formatted_properties[prop_name] = value
+        
+        return formatted_properties
+
+
+def _extract_relation_first(x):
+    relation = x['relation']
+    return relation[0]['id'] if relation else None
+
+
+def _raw_extractor(prop_type: str):
+    return lambda x: x.get(prop_type)
+
+
+# 類型 -> 提取函數，模組載入時建立一次
+_EXTRACTORS = {
+    NotionConfig.PropertyType.TITLE: lambda x: x['title'][0]['text']['content'] if x['title'] else '',
+    NotionConfig.PropertyType.RICH_TEXT: lambda x: x['rich_text'][0]['text']['content'] if x['rich_text'] else '',
+    NotionConfig.PropertyType.NUMBER: lambda x: x['number'],
+    NotionConfig.PropertyType.SELECT: lambda x: x['select']['name'] if x['select'] else '',
+    NotionConfig.PropertyType.MULTI_SELECT: lambda x: [option['name'] for option in x['multi_select']],
+    NotionConfig.PropertyType.DATE: lambda x: PropertyValueExtractor.format_date_range(x['date']),
+    NotionConfig.PropertyType.CHECKBOX: lambda x: x['checkbox'],
+    NotionConfig.PropertyType.URL: lambda x: x['url'],
+    NotionConfig.PropertyType.EMAIL: lambda x: x['email'],
+    NotionConfig.PropertyType.PHONE: lambda x: x['phone_number'],
+    NotionConfig.PropertyType.RELATION: lambda x: [rel['id'] for rel in x['relation']],
+    NotionConfig.PropertyType.ROLLUP: lambda x: PropertyValueExtractor.extract_rollup_value(x['rollup'])
+}
+
+# 編譯後的提取函數與 format_properties 的輸出一致：relation 只保留第一個 ID
+_COMPILED_EXTRACTORS = {
+    **_EXTRACTORS,
+    NotionConfig.PropertyType.RELATION: _extract_relation_first,
+}
+
+
+# 賬戶數據庫中各列對應的屬性名稱
+LEDGER_PROPERTIES = {
+    'amount': '支出NTD',
+    'category': '類別',
+    'attribute': '屬性',
+    'person': '廷 | 雰',
+    'event': '💥 重大事件支出列表',
+    'month': '💵 單月支出列表',
+    'date': '日期',
+}
+
+# 列名稱與 dtype；代碼列以 -1 表示空值，日期列以 NaT 表示空值
+LEDGER_COLUMNS = (
+    ('amount', 'float64'),
+    ('category', 'int16'),
+    ('attribute', 'int16'),
+    ('person', 'int16'),
+    ('event', 'int32'),
+    ('month', 'int32'),
+    ('date', 'datetime64[D]'),
+)
+
+
+class LedgerColumns:
+    """可追加的 NumPy 列緩衝區，容量不足時倍增"""
+
+    def __init__(self, capacity: int = 1024):
+        if np is None:
+            raise ImportError("列式提取需要安裝 numpy：pip install numpy")
+        self.size = 0
+        self._arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in LEDGER_COLUMNS}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def reserve(self, count: int) -> int:
+        """為 count 行預留空間，返回起始索引"""
+        start = self.size
+        needed = start + count
+        capacity = len(self._arrays['amount'])
+        if needed > capacity:
+            new_capacity = max(needed, capacity * 2)
+            for name, array in self._arrays.items():
+                grown = np.empty(new_capacity, dtype=array.dtype)
+                grown[:start] = array[:start]
+                self._arrays[name] = grown
+        self.size = needed
+        return start
+
+    def write(self, start: int, columns: dict):
+        """將各列的值列表寫入 [start, start + len) 區間"""
+        for name, values in columns.items():
+            self._arrays[name][start:start + len(values)] = values
+
+    @property
+    def columns(self) -> dict:
+        """已寫入部分的各列視圖（不複製）"""
+        return {name: array[:self.size] for name, array in self._arrays.items()}
+
+
+class ColumnarBatchExtractor:
+    """將 Notion 查詢返回的一批頁面直接轉為列式 NumPy 緩衝區
+
+    類別、屬性、人員依 select_color.json 的選項順序編碼為小整數，
+    不在選項中的值會追加到字典末尾；事件與月份以 relation 頁面 ID 編碼。
+
+    使用方式：
+        extractor = ColumnarBatchExtractor(select_options, relation_table)
+        for batch in notion.iter_query_batches(database_id):
+            extractor.append_pages(batch)
+        columns = extractor.columns
+    """
+
+    CODE_COLUMNS = ('category', 'attribute', 'person')
+
+    def __init__(self, select_options: dict = None, relation_table: dict = None,
+                 properties: dict = None, capacity: int = 1024):
+        """
+        Args:
+            select_options: select_color.json 的內容（見 NotionAPI.get_database_select_options）
+            relation_table: relation 頁面 ID 到標題的映射
+            properties: 列名稱到屬性名稱的映射，默認為 LEDGER_PROPERTIES
+            capacity: 初始容量
+        """
+        select_options = select_options or {}
+        self.properties = {**LEDGER_PROPERTIES, **(properties or {})}
+        self.relation_table = relation_table or {}
+        self.buffer = LedgerColumns(capacity)
+        self.page_ids = []
+
+        # 值 -> 代碼；dictionaries 保存代碼 -> 值
+        self.dictionaries = {}
+        self._codes = {}
+        for column in self.CODE_COLUMNS:
+            options = select_options.get(self.properties[column], {}).get('options', [])
+            names = [option['name'] for option in options]
+            self.dictionaries[column] = names
+            self._codes[column] = {name: code for code, name in enumerate(names)}
+        self.dictionaries['relation'] = []
+        self._codes['relation'] = {}
+        self._record_titles = {}  # 從已格式化記錄讀到的 relation 標題
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    @property
+    def columns(self) -> dict:
+        return self.buffer.columns
+
+    def relation_titles(self) -> list:
+        """relation 代碼對應的標題（找不到標題時為頁面 ID）"""
+        return [self.relation_table.get(page_id) or self._record_titles.get(page_id, page_id)
+                for page_id in self.dictionaries['relation']]
+
+    def _encode(self, column: str, value) -> int:
+        if not value:
+            return -1
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self.dictionaries[column].append(value)
+        return code
+
+    def append_pages(self, pages: list) -> int:
+        """將一批原始頁面追加到列緩衝區，返回追加的行數"""
+        props = self.properties
+        encode = self._encode
+        amounts, dates = [], []
+        codes = {column: [] for column in self.CODE_COLUMNS + ('event', 'month')}
+
+        for page in pages:
+            properties = page.get('properties', {})
+            amounts.append(_number_value(properties.get(props['amount'])))
+            dates.append(_date_start(properties.get(props['date'])))
+            for column in self.CODE_COLUMNS:
+                codes[column].append(encode(column, _select_name(properties.get(props[column]))))
+            for column in ('event', 'month'):
+                codes[column].append(encode('relation', _relation_first(properties.get(props[column]))))
+            self.page_ids.append(page['id'])
+
+        start = self.buffer.reserve(len(pages))
+        self.buffer.write(start, {
+            'amount': amounts,
+            'date': np.array(dates, dtype='datetime64[D]'),
+            **codes,
+        })
+        return len(pages)
+
+    def append_records(self, records: list) -> int:
+        """將已格式化的記錄（本地賬本中的格式）追加到列緩衝區，返回追加的行數"""
+        props = self.properties
+        encode = self._encode
+        amounts, dates = [], []
+        codes = {column: [] for column in self.CODE_COLUMNS + ('event', 'month')}
+
+        for record in records:
+            amounts.append(_record_number(record.get(props['amount'])))
+            dates.append(_record_date_start(record.get(props['date'])))
+            for column in self.CODE_COLUMNS:
+                value = record.get(props[column])
+                codes[column].append(encode(column, value.get('title') if isinstance(value, dict) else value))
+            for column in ('event', 'month'):
+                relation = record.get(props[column])
+                if isinstance(relation, dict):
+                    self._record_titles.setdefault(relation.get('id'), relation.get('title'))
+                    relation = relation.get('id')
+                codes[column].append(encode('relation', relation))
+            self.page_ids.append(record.get('page_id'))
+
+        start = self.buffer.reserve(len(records))
+        self.buffer.write(start, {
+            'amount': amounts,
+            'date': np.array(dates, dtype='datetime64[D]'),
+            **codes,
+        })
+        return len(records)
+
+    def save_snapshot(self, directory: str):
+        """將目前的列緩衝區保存為快照，見 LedgerSnapshot"""
+        LedgerSnapshot.write(directory, self.columns, self.dictionaries, self.relation_titles())
+
+
+class LedgerSnapshot:
+    """賬本的列式快照：每列一個 .npy 文件，加上代碼字典的 JSON 文件
+
+    以 np.load(mmap_mode='r') 開啟，載入時不需要解析記錄，
+    多個進程開啟同一快照時共用作業系統的頁面快取。
+
+    使用方式：
+        snapshot = LedgerSnapshot.load('data/ledger_snapshot')
+        amounts = snapshot.columns['amount']
+        titles = snapshot.relation_titles
+    """
+
+    DICTIONARY_FILE = 'dictionaries.json'
+
+    def __init__(self, columns: dict, dictionaries: dict, relation_titles: list):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.relation_titles = relation_titles
+
+    def __len__(self) -> int:
+        return len(self.columns['amount'])
+
+    @classmethod
+    def write(cls, directory: str, columns: dict, dictionaries: dict, relation_titles: list):
+        """寫入快照；各文件先寫暫存文件再替換，字典文件最後寫入作為完成標記"""
+        if np is None:
+            raise ImportError("列式快照需要安裝 numpy：pip install numpy")
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, cls.DICTIONARY_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name, _ in LEDGER_COLUMNS:
+            path = os.path.join(directory, f"{name}.npy")
+            temp_path = os.path.join(directory, f"{name}.tmp.npy")
+            np.save(temp_path, np.ascontiguousarray(columns[name]))
+            os.replace(temp_path, path)
+
+        meta = {
+            'rows': len(columns['amount']),
+            'dictionaries': dictionaries,
+            'relation_titles': relation_titles,
         }
+        with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(f"{meta_path}.tmp", meta_path)
 
-        extractor = extractors.get(prop_type)
-        return extractor(property_data) if extractor else property_data[prop_type]
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """開啟快照，不存在或不完整時返回 None"""
+        if np is None:
+            raise ImportError("列式快照需要安裝 numpy：pip install numpy")
+        path = os.path.join(directory, cls.DICTIONARY_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        columns = {}
+        for name, _ in LEDGER_COLUMNS:
+            try:
+                columns[name] = np.load(os.path.join(directory, f"{name}.npy"),
+                                        mmap_mode='r' if mmap else None)
+            except (OSError, ValueError):
+                return None
+            if len(columns[name]) != meta['rows']:
+                return None
+        return cls(columns, meta['dictionaries'], meta['relation_titles'])
+
+
+def _number_value(property_data) -> float:
+    """number / formula / rollup 屬性的數值，非數值返回 0"""
+    if not property_data:
+        return 0.0
+    value = property_data.get(property_data.get('type'))
+    if isinstance(value, dict):
+        value = value.get('number')
+    return float(value) if isinstance(value, (int, float)) else 0.0
+
+
+def _record_number(value) -> float:
+    """已格式化記錄中的數值（可能是數字或 {'number': ...}），非數值返回 0"""
+    if isinstance(value, dict):
+        value = value.get('number')
+    return float(value) if isinstance(value, (int, float)) else 0.0
+
+
+def _select_name(property_data):
+    if not property_data:
+        return None
+    value = property_data.get(property_data.get('type'))
+    if isinstance(value, dict):
+        return value.get('name')
+    if isinstance(value, list) and value:
+        first = value[0]
+        if isinstance(first, dict):
+            return first.get('name') or first.get('plain_text')
+    return value if isinstance(value, str) else None
+
+
+def _relation_first(property_data):
+    if not property_data:
+        return None
+    relation = property_data.get('relation')
+    return relation[0]['id'] if relation else None
+
+
+def _record_date_start(value) -> str:
+    """記錄中的日期為 format_date_range 的格式（如 2025_0308-0316），取開始日期"""
+    if not isinstance(value, str) or not value:
+        return 'NaT'
+    start = value.split('-', 1)[0] if '_' in value else value[:10]
+    if '_' in start and len(start) == 9:
+        return f"{start[:4]}-{start[5:7]}-{start[7:9]}"
+    return start
+
+
+def _date_start(property_data) -> str:
+    if not property_data or not property_data.get('date'):
+        return 'NaT'
+    start = property_data['date'].get('start')
+    return start[:10] if start else 'NaT'
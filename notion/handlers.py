@@ -1,43 +1,279 @@
 import requests
 import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from .config import NotionConfig
 
+# 需要由排程器退避重試的狀態碼
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# 請求可能已送達伺服器的讀取錯誤只對冪等方法重試，POST / PATCH 重送可能建立重複的頁面或區塊
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "DELETE"])
+
+
+class NotionAPIError(Exception):
+    """Notion API 請求失敗（重試次數用盡，或呼叫方要求失敗時拋出）"""
+
+    def __init__(self, message: str, status_code: int = None, url: str = None, detail=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.url = url
+        self.detail = detail
+
+
+class BlockAppendError(NotionAPIError):
+    """批量添加區塊時部分批次失敗，created_ids 為已建立的頂層區塊 ID，
+    failures 為每個失敗的父區塊 {'parent_id', 'created', 'total', 'error'}"""
+
+    def __init__(self, message: str, created_ids: list = None, failures: list = None):
+        super().__init__(message)
+        self.created_ids = created_ids or []
+        self.failures = failures or []
+
+
+def create_session(pool_connections: int = NotionConfig.POOL_CONNECTIONS,
+                   pool_maxsize: int = NotionConfig.POOL_MAXSIZE,
+                   max_retries: int = NotionConfig.MAX_RETRIES,
+                   backoff_factor: float = NotionConfig.RETRY_BACKOFF_FACTOR) -> requests.Session:
+    """建立帶連線池與重試機制的 keep-alive Session
+
+    連線層級的錯誤由 adapter 重試：連線失敗時請求尚未送出，所有方法都會重試；
+    讀取中斷時請求可能已被處理，只重試 IDEMPOTENT_METHODS。
+    429 / 5xx 狀態碼交給 NotionRequestHandler 的排程器處理。
+
+    Args:
+        pool_connections: 每個 host 保留的連線池數量
+        pool_maxsize: 每個連線池的最大連線數
+        max_retries: 連線失敗時的重試次數
+        backoff_factor: 重試間隔的指數退避係數
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=0,
+        backoff_factor=backoff_factor,
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def parse_retry_after(value: str) -> float:
+    """解析 Retry-After 標頭，支援秒數與 HTTP 日期兩種格式
+
+    Returns:
+        float: 需要等待的秒數，無法解析時返回 None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int,
+                  base: float = NotionConfig.BACKOFF_BASE,
+                  cap: float = NotionConfig.BACKOFF_MAX) -> float:
+    """帶抖動的指數退避（full jitter）"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateLimiter:
+    """執行緒安全的令牌桶速率限制器
+
+    令牌以 rate 個/秒補充，最多累積 capacity 個。令牌數可以為負，
+    代表已排隊等待的請求；收到 429 時以 pause() 一次性扣除，
+    讓所有共用此限制器的呼叫方一起等待。
+    """
+
+    def __init__(self, rate: float = NotionConfig.RATE_LIMIT_PER_SECOND,
+                 capacity: float = NotionConfig.RATE_LIMIT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def reserve(self) -> float:
+        """取出一個令牌，返回取得前需要等待的秒數（不會阻塞）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> float:
+        """取出一個令牌，必要時阻塞等待；返回實際等待的秒數"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float):
+        """暫停發放令牌至少 seconds 秒（用於 Retry-After）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    @property
+    def budget(self) -> float:
+        """目前可立即使用的令牌數（負數表示排隊中的請求）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
 class NotionRequestHandler:
-    def __init__(self, token: str):
+    def __init__(self, token: str, session: requests.Session = None,
+                 pool_connections: int = NotionConfig.POOL_CONNECTIONS,
+                 pool_maxsize: int = NotionConfig.POOL_MAXSIZE,
+                 max_retries: int = NotionConfig.MAX_RETRIES,
+                 timeout: float = NotionConfig.REQUEST_TIMEOUT,
+                 rate_limiter: RateLimiter = None,
+                 rate_limit_retries: int = NotionConfig.RATE_LIMIT_RETRIES):
+        """
+        Args:
+            token: Notion API token
+            session: 外部提供的 Session（可選），提供時由呼叫方負責關閉
+            pool_connections: 每個 host 保留的連線池數量
+            pool_maxsize: 每個連線池的最大連線數
+            max_retries: 連線層級的重試次數
+            timeout: 單次請求的超時秒數
+            rate_limiter: 共用的速率限制器（可選），未提供時自行建立
+            rate_limit_retries: 429 / 5xx 時的最大重試次數
+        """
         self.token = token
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
             "Notion-Version": NotionConfig.API_VERSION,
         }
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.rate_limit_retries = rate_limit_retries
+        self._owns_session = session is None
+        self.session = session or create_session(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=max_retries,
+        )
+
+    @property
+    def rate_limit_budget(self) -> float:
+        """目前速率限制器中可立即使用的請求數"""
+        return self.rate_limiter.budget
+
+    def close(self):
+        """關閉連線池（僅關閉自行建立的 Session）"""
+        if self._owns_session and self.session is not None:
+            self.session.close()
+        self.session = None
 
-    def _make_request(self, method: str, url: str, data: dict = None) -> dict:
-        """統一的請求處理方法，增強錯誤處理"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> float:
+        """計算重試前的等待秒數，優先使用 Retry-After"""
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        return delay if delay is not None else backoff_delay(attempt)
+
+    @staticmethod
+    def _error_detail(response: requests.Response):
+        """錯誤回應的內容；閘道返回的 HTML 等非 JSON 內容只保留前 500 個字元"""
+        if not response.content:
+            return "No error details"
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=self.headers,
-                json=data if data else None
-            )
-            
-            # 詳細的錯誤信息輸出
-            if not response.ok:
-                error_detail = response.json() if response.content else "No error details"
-                print(f"API Error: {response.status_code}")
-                print(f"URL: {url}")
-                print(f"Request Data: {data}")
-                print(f"Error Details: {error_detail}")
-                return None
-                
             return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Network Error: {str(e)}")
-            return None
+        except ValueError:
+            return response.text[:500]
+
+    def _make_request(self, method: str, url: str, data: dict = None, params: dict = None,
+                      raise_on_error: bool = False) -> dict:
+        """統一的請求處理方法，增強錯誤處理
+
+        每個請求先向令牌桶取得額度；遇到 429 或 5xx 時依 Retry-After
+        或帶抖動的指數退避重試。重試次數用盡（包括 adapter 的連線重試）時
+        拋出 NotionAPIError；其他失敗預設返回 None，raise_on_error 為 True 時
+        同樣拋出 NotionAPIError，供分頁迭代器使用，避免中途失敗被當成最後一頁。
+        """
+        try:
+            for attempt in range(self.rate_limit_retries + 1):
+                self.rate_limiter.acquire()
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    headers=self.headers,
+                    json=data if data else None,
+                    params=params,
+                    timeout=self.timeout
+                )
+
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.rate_limit_retries:
+                    delay = self._retry_delay(response, attempt)
+                    print(f"API {response.status_code}，{delay:.1f} 秒後重試 "
+                          f"({attempt + 1}/{self.rate_limit_retries})")
+                    if response.status_code == 429:
+                        # 速率限制是全域的，暫停整個令牌桶
+                        self.rate_limiter.pause(delay)
+                    else:
+                        time.sleep(delay)
+                    continue
+
+                # 詳細的錯誤信息輸出
+                if not response.ok:
+                    error_detail = self._error_detail(response)
+                    print(f"API Error: {response.status_code}")
+                    print(f"URL: {url}")
+                    print(f"Request Data: {data}")
+                    print(f"Error Details: {error_detail}")
+                    if raise_on_error or response.status_code in RETRYABLE_STATUS_CODES:
+                        raise NotionAPIError(f"API Error: {response.status_code} {method} {url}",
+                                             status_code=response.status_code, url=url, detail=error_detail)
+                    return None
+
+                return response.json()
+
+        except NotionAPIError:
+            raise
         except json.JSONDecodeError as e:
+            # requests 的 JSONDecodeError 同時是 RequestException，必須先於網路錯誤處理
             print(f"JSON Parsing Error: {str(e)}")
+            if raise_on_error:
+                raise NotionAPIError(f"JSON Parsing Error: {str(e)}", url=url) from e
             return None
+        except requests.exceptions.RequestException as e:
+            # adapter 已經重試過連線錯誤，走到這裡代表重試次數已用盡
+            print(f"Network Error: {str(e)}")
+            raise NotionAPIError(f"Network Error: {str(e)}", url=url) from e
         except Exception as e:
             print(f"Unexpected Error: {str(e)}")
-            return None
\ No newline at end of file
+            if raise_on_error:
+                raise NotionAPIError(f"Unexpected Error: {str(e)}", url=url) from e
+            return None
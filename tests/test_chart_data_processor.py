@@ -0,0 +1,212 @@
+"""ChartDataProcessor 的個人支出分配，以及 accumulate、record_contributions 與 ChartRollups 的總和一致性
+（包含賬本寫入時維護的彙總表）
+
+執行方式：
+    python -m pytest tests
+"""
+import os
+import sys
+from collections import defaultdict
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from draw_graph import ChartDataProcessor, ChartRollups
+from ledger_store import (EVENT_PROPERTY, MONTH_PROPERTY, JsonLedgerStore, SegmentLedgerStore, SqliteLedgerStore,
+                          stamp_record_hashes, CHART_FIELDS)
+
+ATTRIBUTES = {'必要花費', '娛樂'}
+CATEGORIES = {'食', '行'}
+PERSONS = ('total', 'ting', 'feng')
+
+
+def empty_group() -> dict:
+    return {person: {'attribute': defaultdict(float), 'category': defaultdict(float)} for person in PERSONS}
+
+
+def plain(group: dict) -> dict:
+    """去掉零值並四捨五入，方便比較"""
+    return {person: {dimension: {k: round(v, 6) for k, v in group[person][dimension].items() if round(v, 6)}
+                     for dimension in ('attribute', 'category')}
+            for person in PERSONS}
+
+
+def make_record(i: int, person='共同', amount: float = 100.0, event: str = '旅行') -> dict:
+    return {
+        'page_id': f'page-{i}',
+        '支出NTD': amount,
+        '屬性': '娛樂' if i % 2 else '必要花費',
+        '類別': '食' if i % 3 else '行',
+        '廷 | 雰': person,
+        '日期': f'2025_01{i % 28 + 1:02d}',
+        EVENT_PROPERTY: {'id': f'id-{event}', 'title': event} if event else None,
+        MONTH_PROPERTY: {'id': 'id-month', 'title': '2025, 01月'},
+    }
+
+
+@pytest.fixture
+def processor():
+    return ChartDataProcessor([], ATTRIBUTES, CATEGORIES)
+
+
+def person_amounts(processor: ChartDataProcessor, record: dict) -> tuple:
+    group = empty_group()
+    processor.accumulate(record, group)
+    assert group['total']['attribute'][record['屬性']] == record['支出NTD']
+    assert group['total']['category'][record['類別']] == record['支出NTD']
+    return (group['ting']['category'].get(record['類別'], 0.0),
+            group['feng']['category'].get(record['類別'], 0.0))
+
+
+@pytest.mark.parametrize('person', ['共同', None, '', {'title': '共同'}])
+def test_shared_expense_is_split_evenly(processor, person):
+    assert person_amounts(processor, make_record(0, person)) == (50.0, 50.0)
+
+
+@pytest.mark.parametrize('person, expected', [
+    ('廷', (100.0, 0.0)),
+    ('雰', (0.0, 100.0)),
+    ({'title': '廷'}, (100.0, 0.0)),
+    ({'title': '雰'}, (0.0, 100.0)),
+])
+def test_single_payer_gets_whole_expense(processor, person, expected):
+    assert person_amounts(processor, make_record(0, person)) == expected
+
+
+def test_single_payer_has_no_entry_for_other_person(processor):
+    ting, feng = processor.process_expenses_by_person(make_record(0, '廷'))
+    assert dict(ting['category']) == {'行': 100.0}
+    assert dict(feng['category']) == {}
+
+
+def test_custom_shared_split():
+    processor = ChartDataProcessor([], ATTRIBUTES, CATEGORIES, shared_split=(0.7, 0.3))
+    assert person_amounts(processor, make_record(0, '共同')) == pytest.approx((70.0, 30.0))
+    # 單人支出不受共同支出的權重影響
+    assert person_amounts(processor, make_record(0, '雰')) == (0.0, 100.0)
+
+
+def test_custom_split_weights():
+    processor = ChartDataProcessor([], ATTRIBUTES, CATEGORIES,
+                                   split_weights={'廷': (0.8, 0.2), '雰': (0.0, 1.0)})
+    assert person_amounts(processor, make_record(0, '廷')) == pytest.approx((80.0, 20.0))
+    assert person_amounts(processor, make_record(0, '共同')) == (50.0, 50.0)
+
+
+def test_invalid_options_and_empty_amounts_are_skipped(processor):
+    group = empty_group()
+    assert processor.accumulate({**make_record(0), '屬性': '未知', '類別': '未知'}, group)
+    assert plain(group) == plain(empty_group())
+    assert not processor.accumulate(make_record(0, amount=0), group)
+    assert processor.record_contributions(make_record(0, amount=0)) == []
+
+
+@pytest.mark.parametrize('shared_split', [(0.5, 0.5), (0.7, 0.3)])
+def test_record_contributions_match_accumulate(shared_split):
+    processor = ChartDataProcessor([], ATTRIBUTES, CATEGORIES, shared_split=shared_split)
+    for i, person in enumerate(['共同', '廷', '雰', None, {'title': '雰'}]):
+        record = make_record(i, person, amount=37.5 + i)
+        expected = empty_group()
+        processor.accumulate(record, expected)
+
+        actual = empty_group()
+        for person_key, dimension, value, amount in processor.record_contributions(record):
+            actual[person_key][dimension][value] += amount
+        assert plain(actual) == plain(expected)
+
+
+def accumulate_by_event(processor: ChartDataProcessor, records: list) -> dict:
+    groups = defaultdict(empty_group)
+    for record in records:
+        processor.accumulate(record, groups[record[EVENT_PROPERTY]['title']])
+    return {title: plain(group) for title, group in groups.items()}
+
+
+@pytest.mark.parametrize('shared_split', [(0.5, 0.5), (0.7, 0.3)])
+def test_rollups_match_accumulate(tmp_path, shared_split):
+    processor = ChartDataProcessor([], ATTRIBUTES, CATEGORIES, shared_split=shared_split)
+    persons = ['共同', '廷', '雰', None]
+    records = [make_record(i, persons[i % 4], amount=float(i % 7 + 1), event=('旅行', '搬家')[i % 2])
+               for i in range(40)]
+    path = str(tmp_path / 'chart_rollups.json')
+
+    rollups = ChartRollups.rebuild(path, records, ATTRIBUTES, CATEGORIES, shared_split)
+    assert {title: plain(group) for title, group in rollups.group_data('event').items()} == \
+        accumulate_by_event(processor, records)
+
+    # 編輯與刪除以增量套用後，仍與重新累加的結果相同
+    edited = {**records[0], '廷 | 雰': '雰', '支出NTD': 999.0}
+    rollups.apply(removed=[records[0], records[1]], added=[edited])
+    remaining = [edited] + records[2:]
+    assert {title: plain(group) for title, group in rollups.group_data('event').items()} == \
+        accumulate_by_event(processor, remaining)
+
+    rollups.save()
+    loaded = ChartRollups.load(path, ATTRIBUTES, CATEGORIES, shared_split)
+    assert loaded.records == len(remaining)
+    assert loaded.group_data('month') == rollups.group_data('month')
+
+
+def test_rollups_are_invalidated_when_shared_split_changes(tmp_path):
+    path = str(tmp_path / 'chart_rollups.json')
+    ChartRollups.rebuild(path, [make_record(0)], ATTRIBUTES, CATEGORIES, (0.5, 0.5)).save()
+    assert ChartRollups.load(path, ATTRIBUTES, CATEGORIES, (0.5, 0.5)) is not None
+    assert ChartRollups.load(path, ATTRIBUTES, CATEGORIES, (0.7, 0.3)) is None
+
+
+def open_store(backend: str, tmp_path):
+    if backend == 'json':
+        return JsonLedgerStore(str(tmp_path / 'full_account_data.json'))
+    if backend == 'segments':
+        return SegmentLedgerStore(str(tmp_path / 'ledger_segments'))
+    return SqliteLedgerStore(str(tmp_path / 'ledger.db'))
+
+
+def hashed_record(i: int, **changes) -> dict:
+    return stamp_record_hashes({**make_record(i, ('共同', '廷', '雰')[i % 3], amount=float(i + 1),
+                                              event=('旅行', '搬家')[i % 2]), **changes}, CHART_FIELDS)
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite', 'segments'])
+def test_store_maintains_attached_rollups(tmp_path, backend):
+    processor = ChartDataProcessor([], ATTRIBUTES, CATEGORIES)
+    path = str(tmp_path / 'chart_rollups.json')
+    records = [hashed_record(i) for i in range(12)]
+    with open_store(backend, tmp_path) as store:
+        store.upsert_many(records)
+        rollups = store.attach_rollups(ChartRollups.open(path, ATTRIBUTES, CATEGORIES))
+        assert rollups.digest == store.digest()
+
+        edited = hashed_record(0, **{'支出NTD': 999.0})
+        store.apply(upserts=[edited], deletes=[records[1]['page_id']])
+        remaining = [edited] + records[2:]
+        assert rollups.digest == store.digest()
+        assert {title: plain(group) for title, group in rollups.group_data('event').items()} == \
+            accumulate_by_event(processor, remaining)
+
+    loaded = ChartRollups.load(path, ATTRIBUTES, CATEGORIES)
+    assert loaded.records == len(remaining)
+    assert loaded.group_data('event') == rollups.group_data('event')
+
+
+def test_rollups_missing_an_edit_are_rebuilt(tmp_path):
+    """記錄數相同但漏掉一次編輯時，摘要不符而從賬本重建"""
+    processor = ChartDataProcessor([], ATTRIBUTES, CATEGORIES)
+    path = str(tmp_path / 'chart_rollups.json')
+    records = [hashed_record(i) for i in range(6)]
+    with open_store('sqlite', tmp_path) as store:
+        store.upsert_many(records)
+        store.attach_rollups(ChartRollups.open(path, ATTRIBUTES, CATEGORIES))
+
+    # 不經過彙總表直接修改賬本，記錄數不變
+    edited = hashed_record(0, **{'支出NTD': 500.0})
+    with open_store('sqlite', tmp_path) as store:
+        store.apply(upserts=[edited])
+        stale = ChartRollups.load(path, ATTRIBUTES, CATEGORIES)
+        assert stale.records == len(store) and stale.digest != store.digest()
+
+        rollups = store.attach_rollups(stale)
+        assert rollups.digest == store.digest()
+        assert {title: plain(group) for title, group in rollups.group_data('event').items()} == \
+            accumulate_by_event(processor, [edited] + records[1:])